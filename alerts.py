@@ -0,0 +1,272 @@
+"""
+Server-side alert / screener rules evaluated as NumPy array ops.
+
+Rules live in columnar arrays (instrument slot, field, operator, threshold,
+previous value, reference price, armed/active flags). ``evaluate()`` runs
+once per conflated batch: it selects the rules whose instrument ticked,
+gathers the field values per *field* (not per rule), applies every
+operator as a masked vector expression and only drops into Python for the
+handful of rules that actually fired.
+
+Rules are edge-triggered: a threshold rule fires when its condition turns
+true and re-arms once it turns false again; ``once`` rules retire after
+their first hit.
+"""
+import threading
+import time
+from collections import deque
+
+import numpy as np
+
+OPS = ("gt", "lt", "cross_above", "cross_below", "pct_move")
+TABLE_FIELDS = ("ltp", "open", "high", "low", "close", "cp", "vtt")
+DERIVED_FIELDS = ("change_pct",)
+
+
+class AlertEngine:
+    """Columnar rule store + vectorized evaluator over TickTable slots."""
+
+    def __init__(self, table, indicators=None, capacity: int = 1024, log_size: int = 1000, valid_key=None):
+        self.table = table
+        self.indicators = indicators
+        # Rules on keys this rejects raise ValueError (None = any key)
+        self.valid_key = valid_key
+        self.fields = list(TABLE_FIELDS) + list(DERIVED_FIELDS)
+        if indicators is not None:
+            from indicators import OUTPUTS
+            self.fields += list(OUTPUTS)
+        self.field_ids = {name: i for i, name in enumerate(self.fields)}
+        self.op_ids = {name: i for i, name in enumerate(OPS)}
+        # Guards rule arrays; evaluation also holds table.lock while reading columns
+        self.lock = threading.Lock()
+        self.size = 0
+        self.count = 0
+        self.free: list[int] = []
+        self.ids: list = []
+        self.owners: list = []
+        self.by_id: dict[str, int] = {}
+        self._seq = 0
+        self._alloc(max(int(capacity), 16))
+        self.touched = np.zeros(table.capacity, dtype=bool)
+        self.fired_log = deque(maxlen=log_size)
+        self.evaluations = 0
+        self.fired_total = 0
+        table.batch_hooks.append(self.on_ticks)
+
+    def _alloc(self, size: int):
+        fresh = {
+            "slot": np.zeros(size, dtype=np.int64),
+            "field": np.zeros(size, dtype=np.int16),
+            "op": np.zeros(size, dtype=np.int8),
+            "value": np.zeros(size, dtype=np.float64),
+            "prev": np.full(size, np.nan),
+            "ref": np.zeros(size, dtype=np.float64),
+            "once": np.zeros(size, dtype=bool),
+            "armed": np.zeros(size, dtype=bool),
+            "active": np.zeros(size, dtype=bool),
+        }
+        for name, arr in fresh.items():
+            old = getattr(self, name, None)
+            if old is not None:
+                arr[: self.size] = old
+            setattr(self, name, arr)
+        self.ids += [None] * (size - self.size)
+        self.owners += [None] * (size - self.size)
+        self.size = size
+
+    # 🧩 TickTable batch hook (called under table.lock)
+    def on_ticks(self, slots):
+        if self.table.capacity > len(self.touched):
+            touched = np.zeros(self.table.capacity, dtype=bool)
+            touched[: len(self.touched)] = self.touched
+            self.touched = touched
+        self.touched[slots] = True
+
+    # 📝 Rule management
+    def add(self, owner: str, rules: list) -> list[dict]:
+        """
+        Register rules for an owner. Each rule is
+        {"key", "field", "op", "value", "once": True}; raises ValueError on a bad rule.
+        Returns the stored rules with their ids.
+        """
+        parsed = []
+        for r in rules:
+            key = r.get("key")
+            field, op = r.get("field", "ltp"), r.get("op")
+            if not key:
+                raise ValueError("Rule needs an instrument key")
+            if self.valid_key is not None and not self.valid_key(key):
+                raise ValueError(f"Unknown instrument {key}")
+            if field not in self.field_ids:
+                raise ValueError(f"Unknown field {field}")
+            if op not in self.op_ids:
+                raise ValueError(f"Unknown op {op} (use one of {', '.join(OPS)})")
+            try:
+                value = float(r["value"])
+            except (KeyError, TypeError, ValueError):
+                raise ValueError("Rule needs a numeric value")
+            parsed.append((key, field, op, value, bool(r.get("once", True))))
+
+        out = []
+        with self.table.lock, self.lock:
+            for key, field, op, value, once in parsed:
+                s = self.table.slot(key)
+                i = self.free.pop() if self.free else self.count
+                if i >= self.size:
+                    self._alloc(self.size * 2)
+                if i == self.count:
+                    self.count += 1
+                self._seq += 1
+                rid = f"a{self._seq}"
+                fid = self.field_ids[field]
+                cur = self._gather(np.array([s]), np.array([fid]))[0]
+                self.slot[i] = s
+                self.field[i] = fid
+                self.op[i] = self.op_ids[op]
+                self.value[i] = value
+                self.prev[i] = cur if cur == cur and cur != 0 else np.nan
+                self.ref[i] = cur if cur == cur else 0.0
+                self.once[i] = once
+                self.armed[i] = True
+                self.active[i] = True
+                self.ids[i] = rid
+                self.owners[i] = owner
+                self.by_id[rid] = i
+                out.append({"id": rid, "key": key, "field": field, "op": op, "value": value, "once": once})
+        return out
+
+    def _drop(self, i: int):
+        self.active[i] = False
+        self.by_id.pop(self.ids[i], None)
+        self.ids[i] = None
+        self.owners[i] = None
+        self.free.append(i)
+
+    def remove(self, owner: str, rule_ids=None) -> list[str]:
+        """Remove an owner's rules (all of them when ``rule_ids`` is None)."""
+        removed = []
+        with self.lock:
+            if rule_ids is None:
+                idx = [i for i in np.flatnonzero(self.active[: self.count]).tolist() if self.owners[i] == owner]
+            else:
+                idx = [self.by_id[r] for r in rule_ids if r in self.by_id and self.owners[self.by_id[r]] == owner]
+            for i in idx:
+                removed.append(self.ids[i])
+                self._drop(i)
+        return removed
+
+    def rules(self, owner: str) -> list[dict]:
+        with self.lock:
+            idx = [i for i in np.flatnonzero(self.active[: self.count]).tolist() if self.owners[i] == owner]
+            return [self._describe(i) for i in idx]
+
+    def keys_for(self, owner: str) -> set:
+        with self.lock:
+            return {
+                self.table.keys[int(self.slot[i])]
+                for i in np.flatnonzero(self.active[: self.count]).tolist() if self.owners[i] == owner
+            }
+
+    def _describe(self, i: int) -> dict:
+        return {
+            "id": self.ids[i],
+            "key": self.table.keys[int(self.slot[i])],
+            "field": self.fields[int(self.field[i])],
+            "op": OPS[int(self.op[i])],
+            "value": float(self.value[i]),
+            "once": bool(self.once[i]),
+        }
+
+    # 🔍 Evaluation
+    def _column(self, name: str):
+        if name in TABLE_FIELDS:
+            return getattr(self.table, name)
+        if name == "change_pct":
+            cp = self.table.cp
+            return np.divide((self.table.ltp - cp) * 100.0, cp, out=np.full(len(cp), np.nan), where=cp != 0)
+        return getattr(self.indicators, name)
+
+    def _gather(self, slots, fids):
+        """Current field value per rule, gathered one field at a time."""
+        vals = np.full(len(slots), np.nan)
+        for f in np.unique(fids).tolist():
+            sel = fids == f
+            col = self._column(self.fields[f])
+            s = slots[sel]
+            ok = s < len(col)
+            v = np.full(len(s), np.nan)
+            v[ok] = col[s[ok]]
+            vals[sel] = v
+        return vals
+
+    def evaluate(self) -> tuple[list, list]:
+        """
+        Run every rule whose instrument ticked since the last call. Returns
+        ([(owner, [events])], [(owner, key)] of ``once`` rules that retired).
+        """
+        with self.table.lock, self.lock:
+            n = self.count
+            touched = self.touched
+            live_slots = self.slot[:n]
+            ok = live_slots < len(touched)
+            cand = np.flatnonzero(self.active[:n] & ok & touched[np.where(ok, live_slots, 0)])
+            touched[:] = False
+            self.evaluations += 1
+            if len(cand) == 0:
+                return [], []
+
+            slots = self.slot[cand]
+            cur = self._gather(slots, self.field[cand].astype(np.int64))
+            prev = self.prev[cand]
+            thr = self.value[cand]
+            op = self.op[cand]
+            have = cur == cur
+            has_prev = prev == prev
+
+            ref = self.ref[cand]
+            ref = np.where(ref == 0, cur, ref)
+            move = np.divide(np.abs(cur - ref) * 100.0, ref, out=np.zeros(len(cand)), where=have & (ref != 0))
+            cond = np.select(
+                [op == 0, op == 1, op == 2, op == 3, op == 4],
+                [cur > thr, cur < thr,
+                 has_prev & (prev <= thr) & (cur > thr),
+                 has_prev & (prev >= thr) & (cur < thr),
+                 move >= thr],
+                default=False,
+            ) & have
+            fire = cond & self.armed[cand]
+
+            self.armed[cand] = ~cond
+            self.prev[cand] = np.where(have, cur, prev)
+            self.ref[cand] = np.where(have & (self.ref[cand] == 0), cur, self.ref[cand])
+            hits = np.flatnonzero(fire)
+            if len(hits) == 0:
+                return [], []
+
+            now = time.time()
+            by_owner: dict[str, list] = {}
+            retired = []
+            for j in hits.tolist():
+                i = int(cand[j])
+                event = {**self._describe(i), "observed": round(float(cur[j]), 4), "ts": now,
+                         "ltt": int(self.table.ltt[slots[j]])}
+                by_owner.setdefault(self.owners[i], []).append(event)
+                self.fired_log.append({**event, "owner": self.owners[i]})
+                if self.once[i]:
+                    retired.append((self.owners[i], event["key"]))
+                    self._drop(i)
+            self.fired_total += len(hits)
+            return list(by_owner.items()), retired
+
+    def recent(self, owner: str = None, limit: int = 100) -> list[dict]:
+        with self.lock:
+            log = [e for e in self.fired_log if owner is None or e["owner"] == owner]
+        return log[-limit:]
+
+    def stats(self) -> dict:
+        with self.lock:
+            return {
+                "rules": int(self.active[: self.count].sum()),
+                "evaluations": self.evaluations,
+                "fired": self.fired_total,
+            }
@@ -1,3 +1,18 @@
+import os
+from early_env import early_env
+
+# Event-loop servers must patch the stdlib before anything else is imported. load_dotenv()
+# only runs further down, so .env is read here for this one key (a real env var still wins)
+UPSTOX_ASYNC_MODE = early_env(
+    "UPSTOX_ASYNC_MODE", "threading", os.path.dirname(os.path.abspath(__file__))
+).strip().lower()
+if UPSTOX_ASYNC_MODE == "eventlet":
+    import eventlet
+    eventlet.monkey_patch()
+elif UPSTOX_ASYNC_MODE == "gevent":
+    from gevent import monkey
+    monkey.patch_all()
+
 import talib
 import ta
 import tensorflow as tf
@@ -5,13 +20,9 @@ print(f"🔹 Using TensorFlow {tf.__version__}")
 
 import pytz
 from datetime import datetime, time as dtime
-from flask_socketio import SocketIO
-from google.protobuf.json_format import MessageToDict
-from flask import Flask, jsonify, send_from_directory, request, send_file, redirect, url_for
-import websocket  # websocket-client
+from flask_socketio import SocketIO, emit, join_room, leave_room
+from flask import Flask, Response, jsonify, send_from_directory, request, send_file, redirect, url_for
 import requests
-import queue
-import os
 import json
 import asyncio
 import ssl
@@ -148,21 +159,84 @@ UPSTOX_AUTHORIZE_URL = os.getenv(
     "https://api.upstox.com/v3/feed/market-data-feed/authorize"
 ).strip()
 UPSTOX_SUB_MODE = os.getenv("UPSTOX_SUB_MODE", "ltpc").strip()
+# 1 = connect regardless of NSE hours (offline runs against feed_simulator.py)
+UPSTOX_IGNORE_MARKET_HOURS = os.getenv("UPSTOX_IGNORE_MARKET_HOURS", "0").strip() == "1"
+UPSTOX_INDEX_SUB_MODE = os.getenv("UPSTOX_INDEX_SUB_MODE", "full").strip()
+UPSTOX_OPTION_SUB_MODE = os.getenv("UPSTOX_OPTION_SUB_MODE", "option_greeks").strip()
+# 1 = index keys ride on the shared UpstoxStreamer socket; 0 = legacy dedicated index_feed_loop
+UPSTOX_SHARED_INDEX_FEED = os.getenv("UPSTOX_SHARED_INDEX_FEED", "1").strip() == "1"
 UPSTOX_WS_RECONNECT_SECONDS = int(os.getenv("UPSTOX_WS_RECONNECT_SECONDS", "5"))
-
+# Reconnects back off exponentially with jitter from UPSTOX_WS_RECONNECT_SECONDS up to this cap
+UPSTOX_WS_BACKOFF_MAX_S = float(os.getenv("UPSTOX_WS_BACKOFF_MAX_S", "300"))
+UPSTOX_WS_OPEN_TIMEOUT_S = float(os.getenv("UPSTOX_WS_OPEN_TIMEOUT_S", "10"))
+# 1 = keep a second pre-authorized, idle socket open to fail over onto. Off by default: it uses
+# one more of the per-user connections Upstox allows (and a rotation briefly adds another)
+UPSTOX_WS_STANDBY = os.getenv("UPSTOX_WS_STANDBY", "0").strip() == "1"
+# Token rotation: max old/new socket overlap; ticks not newer than the stored ltt are dropped
+# during the overlap and for UPSTOX_WS_DEDUP_WINDOW_S after any swap
+UPSTOX_WS_OVERLAP_S = float(os.getenv("UPSTOX_WS_OVERLAP_S", "5"))
+UPSTOX_WS_DEDUP_WINDOW_S = float(os.getenv("UPSTOX_WS_DEDUP_WINDOW_S", "3"))
+# Streamer core: "asyncio" (one event loop per connection set, event-driven commands) or
+# "thread" (websocket-client). eventlet/gevent keep "thread": a native asyncio loop would block their hub.
+UPSTOX_STREAMER_CORE = os.getenv(
+    "UPSTOX_STREAMER_CORE", "asyncio" if UPSTOX_ASYNC_MODE == "threading" else "thread"
+).strip().lower()
+# Upstream connections to spread keys over (1 = single UpstoxStreamer), the broker's
+# per-connection key limit, and how often / how uneven before keys are moved
+UPSTOX_SHARDS = max(int(os.getenv("UPSTOX_SHARDS", "1")), 1)
+UPSTOX_SHARD_MAX_KEYS = int(os.getenv("UPSTOX_SHARD_MAX_KEYS", "5000" if UPSTOX_SUB_MODE == "ltpc" else "2000"))
+UPSTOX_SHARD_REBALANCE_S = float(os.getenv("UPSTOX_SHARD_REBALANCE_S", "30"))
+UPSTOX_SHARD_REBALANCE_SLACK = int(os.getenv("UPSTOX_SHARD_REBALANCE_SLACK", "100"))
+# Upstox caps market-data websockets per user: set this to your account's limit. The streamer
+# refuses to start when its steady-state sockets exceed it and warns when a token-rotation
+# overlap would (0 = unchecked)
+UPSTOX_MAX_CONNECTIONS = int(os.getenv("UPSTOX_MAX_CONNECTIONS", "2"))
+# Max instrument keys per sub/unsub frame sent upstream
+UPSTOX_SUB_CHUNK_SIZE = int(os.getenv("UPSTOX_SUB_CHUNK_SIZE", "100"))
+# "columnar" writes ticks into preallocated NumPy arrays; "dict" is the legacy per-tick dict path;
+# "pool" decodes in UPSTOX_DECODE_WORKERS processes and writes the same columns from shared memory
+UPSTOX_DECODE_MODE = os.getenv("UPSTOX_DECODE_MODE", "columnar").strip().lower()
+UPSTOX_DECODE_WORKERS = int(os.getenv("UPSTOX_DECODE_WORKERS", "2"))
+UPSTOX_DECODE_QUEUE = int(os.getenv("UPSTOX_DECODE_QUEUE", "4096"))
+# Opt-in raw frame recorder (empty = off): per-day segments under this directory
+UPSTOX_RECORD_DIR = os.getenv("UPSTOX_RECORD_DIR", "").strip()
+UPSTOX_RECORD_SEGMENT_MB = int(os.getenv("UPSTOX_RECORD_SEGMENT_MB", "256"))
+UPSTOX_RECORD_QUEUE = int(os.getenv("UPSTOX_RECORD_QUEUE", "65536"))
+# Warm streaming indicators from yfinance bars when a key is first subscribed (0 = off)
+UPSTOX_INDICATOR_SEED = os.getenv("UPSTOX_INDICATOR_SEED", "1").strip() == "1"
+UPSTOX_INDICATOR_SEED_BARS = int(os.getenv("UPSTOX_INDICATOR_SEED_BARS", "200"))
 print(f"🔁 Reconnection Time (seconds): {UPSTOX_WS_RECONNECT_SECONDS}")
 
 # ================================
 # 🧩 Protobuf Decoder
 # ================================
 try:
-    from MarketDataFeedV3_pb2 import FeedResponse
+    from MarketDataFeedV3_pb2 import FeedResponse, initial_feed, live_feed
     PROTO_MESSAGE_CLASS = FeedResponse
+    TICK_FRAME_TYPES = (initial_feed, live_feed)  # market_info carries no ticks
     print("🟢 Protobuf decoder loaded successfully (MarketDataFeedV3_pb2.FeedResponse)")
 except Exception as e:
     PROTO_MESSAGE_CLASS = None
     print("❌ Failed to import MarketDataFeedV3_pb2:", e)
 
+from tick_recorder import TickRecorder
+from feed_wiring import FeedWiring, INDEX_KEY_PREFIXES, pipeline_settings
+from feed_supervisor import AsyncFeedConnection, Backoff, FailoverLog, FeedConnection, FrameMeter
+from subscriptions import SubscriptionRegistry, SubscriptionCommandQueue
+
+# Pipeline knobs (UPSTOX_TICK_CAPACITY, UPSTOX_EMIT_INTERVAL_MS, UPSTOX_DEPTH_*, UPSTOX_BAR_*,
+# UPSTOX_CLIENT_*, UPSTOX_METRICS, ...) — shared with tick_replay.py
+PIPELINE_SETTINGS = pipeline_settings()
+
+tick_recorder = None
+if UPSTOX_RECORD_DIR:
+    tick_recorder = TickRecorder(
+        UPSTOX_RECORD_DIR, INDIA_TZ,
+        queue_size=UPSTOX_RECORD_QUEUE,
+        segment_bytes=UPSTOX_RECORD_SEGMENT_MB * 1024 * 1024,
+    )
+    tick_recorder.start()
+
 # ================================
 # 📁 PATH SETUP
 # ================================
@@ -170,7 +244,30 @@ BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 FRONTEND_DIR = os.path.join(BASE_DIR, "../frontend/dist")
 
 app = Flask(__name__, static_folder=FRONTEND_DIR, static_url_path="")
-socketio = SocketIO(app, cors_allowed_origins="*", async_mode="threading")
+socketio = SocketIO(app, cors_allowed_origins="*", async_mode=UPSTOX_ASYNC_MODE)
+
+def run_blocking(fn, *args, **kwargs):
+    """
+    Run heavy library calls (yfinance, TensorFlow, xlsxwriter) without stalling
+    the server. Under eventlet/gevent they go to the hub's native thread pool so
+    the greenlets emitting ticks keep running; in threading mode they run inline.
+    """
+    if UPSTOX_ASYNC_MODE == "eventlet":
+        from eventlet import tpool
+        return tpool.execute(fn, *args, **kwargs)
+    if UPSTOX_ASYNC_MODE == "gevent":
+        import gevent
+        return gevent.get_hub().threadpool.apply(fn, args, kwargs)
+    return fn(*args, **kwargs)
+
+def _eio_backlog(sid: str) -> int:
+    """Packets queued on a client's Engine.IO transport but not yet written."""
+    try:
+        server = socketio.server
+        eio_sid = server.manager.eio_sid_from_sid(sid, "/")
+        return server.eio.sockets[eio_sid].queue.qsize()
+    except Exception:
+        return 0
 
 # ================================
 # 🗓️ Safe Date Parser
@@ -194,8 +291,17 @@ def normalize_date(date_str):
 # ================================
 print("📦 Loading instrument file...")
 
-file_path = os.path.join(BASE_DIR, "upstox_instruments.json.gz")
+file_path = os.getenv("UPSTOX_INSTRUMENTS_FILE") or os.path.join(BASE_DIR, "upstox_instruments.json.gz")
 instruments, equities = [], []
+# Option contracts: instrument_key → static metadata, and "UNDERLYING|YYYY-MM-DD" chain → keys
+OPTION_META: Dict[str, dict] = {}
+OPTION_CHAINS: Dict[str, List[str]] = {}
+
+def _expiry_date(expiry) -> str:
+    """Upstox expiries come as epoch millis (or already as a date string)."""
+    if isinstance(expiry, (int, float)):
+        return datetime.fromtimestamp(expiry / 1000, INDIA_TZ).strftime("%Y-%m-%d")
+    return str(expiry or "")[:10]
 
 if os.path.exists(file_path):
     try:
@@ -214,7 +320,23 @@ if os.path.exists(file_path):
                     "name": i.get("name"),
                     "short_name": i.get("short_name"),
                 })
+            elif i.get("segment") in ("NSE_FO", "BSE_FO") and i.get("instrument_type") in ("CE", "PE"):
+                key = i.get("instrument_key")
+                underlying = i.get("underlying_symbol") or i.get("name")
+                if not key or not underlying:
+                    continue
+                meta = {
+                    "underlying": underlying,
+                    "underlying_key": i.get("underlying_key"),
+                    "expiry": _expiry_date(i.get("expiry")),
+                    "strike": float(i.get("strike_price") or 0),
+                    "is_call": i.get("instrument_type") == "CE",
+                    "lot_size": i.get("lot_size") or 1,
+                }
+                OPTION_META[key] = meta
+                OPTION_CHAINS.setdefault(f"{underlying}|{meta['expiry']}", []).append(key)
         print(f"✅ Loaded {len(equities)} NSE Equity instruments")
+        print(f"✅ Loaded {len(OPTION_META)} option contracts in {len(OPTION_CHAINS)} chains")
     except Exception as e:
         print("❌ Failed to load instruments file:", e)
 else:
@@ -227,139 +349,347 @@ for eq in equities:
     key = (eq.get("instrument_key") or "").strip()
     if sym and key:
         SYMBOL_TO_KEY[sym] = key
+KNOWN_KEYS = set(SYMBOL_TO_KEY.values()) | set(OPTION_META)
 
 def is_market_open():
     """Check if Indian market is open (NSE/BSE hours)."""
+    if UPSTOX_IGNORE_MARKET_HOURS:
+        return True
     now = datetime.now(INDIA_TZ).time()
     return dtime(9, 0) <= now <= dtime(15, 30)
 
+def default_sub_mode(key: str) -> str:
+    """
+    Upstream mode for a key group: ``full`` for indices, ``option_greeks`` for
+    option contracts, UPSTOX_SUB_MODE otherwise.
+    """
+    if key.startswith(INDEX_KEY_PREFIXES):
+        return UPSTOX_INDEX_SUB_MODE
+    if key in OPTION_META:
+        return UPSTOX_OPTION_SUB_MODE
+    return UPSTOX_SUB_MODE
+
+def is_known_key(key: str) -> bool:
+    """Instruments a client may name: loaded equities and option contracts, or an index."""
+    return key in KNOWN_KEYS or key.startswith(INDEX_KEY_PREFIXES)
+
+# ================================
+# 🧮 Tick Pipeline
+# ================================
+# Stores, conflator, periodic emitters and room / slow-client routing (see feed_wiring)
+pipeline = FeedWiring(
+    socketio,
+    PIPELINE_SETTINGS,
+    option_meta=OPTION_META,
+    valid_key=is_known_key,
+    backlog=_eio_backlog,
+    release_keys=lambda owner, keys: release_keys(owner, keys),
+)
+tick_table = pipeline.table
+order_books = pipeline.books
+tick_history = pipeline.history
+bar_builder = pipeline.bars
+indicators = pipeline.indicators
+alert_engine = pipeline.alerts
+option_greeks = pipeline.greeks
+tick_rooms = pipeline.rooms
+outbound = pipeline.outbound
+tick_conflator = pipeline.conflator
+feed_metrics = pipeline.metrics
+emit_ticks = pipeline.emit_ticks
+pipeline.start()
+print(f"🧮 Tick decode mode: {UPSTOX_DECODE_MODE} (capacity={PIPELINE_SETTINGS['tick_capacity']})")
+
+decode_pool = None
+if UPSTOX_DECODE_MODE == "pool":
+    from decode_pool import DecodePool
+    decode_pool = DecodePool(
+        tick_conflator,
+        workers=UPSTOX_DECODE_WORKERS,
+        queue_size=UPSTOX_DECODE_QUEUE,
+        frame_class=PROTO_MESSAGE_CLASS,
+        metrics=feed_metrics,
+    )  # workers start from a forkserver (spawn where unavailable), never a fork of this process
+    decode_pool.start()
+
+# =======================================
 # 📡 Upstox Streamer Class
 # =======================================
 class UpstoxStreamer(threading.Thread):
-    def __init__(self, access_token: str):
-        super().__init__(daemon=True)
+    """
+    Upstream feed supervisor. One socket is active; with UPSTOX_WS_STANDBY a
+    second, pre-authorized socket is kept open and idle so a drop is
+    recovered by subscribing on it instead of authorizing and handshaking
+    from scratch. ``rotate_token()`` brings up a socket on the new token,
+    overlaps it with the old one (ticks deduplicated by exchange ltt) and
+    swaps once it streams.
+
+    The supervisor sleeps on ``wake`` between events: a sub/unsub, a token
+    rotation, a socket closing and shutdown all set it, so nothing waits
+    for a poll interval. The decisions and bookkeeping live here once;
+    ``AsyncUpstoxStreamer`` only swaps the socket I/O for awaitables.
+    """
+
+    core = "thread"
+
+    def __init__(self, access_token: str, name: str = "main"):
+        super().__init__(daemon=True, name=f"upstox-{name}")
+        self.shard = name
         self.access_token = access_token
         self.connected = False
         self.stop_event = threading.Event()
+        self.wake = threading.Event()  # commands, socket closes, rotations, shutdown
+        self.standby_enabled = UPSTOX_WS_STANDBY  # ShardedStreamer shares one spare instead
+        self.on_down = None  # called on the supervisor when the active socket is lost
         self.subscribed_keys: set[str] = set()
-        self.ctrl_q = queue.Queue()
+        self.key_modes: dict[str, str] = {}
+        self.ctrl_q = SubscriptionCommandQueue(UPSTOX_SUB_CHUNK_SIZE)
         self.sub_lock = threading.Lock()
         self.ws = None
+        self._guid_seq = 0
+        self._conn_seq = 0
+        self.active: FeedConnection = None
+        self.standby: FeedConnection = None
+        self.incoming: FeedConnection = None  # new-token socket during a rotation overlap
+        self.pending_token = None
+        self.rotating = False  # from taking pending_token until the swap (or give-up)
+        self.warming = False
+        self.standby_retry_at = 0.0
+        self.dedup_until = 0.0
+        self.backoff = Backoff(UPSTOX_WS_RECONNECT_SECONDS, UPSTOX_WS_BACKOFF_MAX_S)
+        self.standby_backoff = Backoff(UPSTOX_WS_RECONNECT_SECONDS, UPSTOX_WS_BACKOFF_MAX_S)
+        self.failovers = FailoverLog()
+        self.meter = FrameMeter()
 
     # 🔑 Get a new authorized WS URL each time
-def _authorize_get_ws_url(self) -> str:
-    """
-    Authorize feed access via Upstox API v2 — returns a websocket URL.
-    """
-    if not self.access_token or len(self.access_token) < 20:
-        raise RuntimeError("Invalid or missing Upstox access token.")
-
-    headers = {
-        "Api-Key": UPSTOX_CLIENT_ID,  # ✅ include your API key here
-        "Authorization": f"Bearer {self.access_token}",
-        "Accept": "application/json",
-    }
-
-    try:
-        resp = requests.get(UPSTOX_AUTHORIZE_URL, headers=headers, timeout=10)
-        resp.raise_for_status()
-    except Exception as e:
-        print(f"⚠️ WS Authorization failed: {resp.status_code if resp else '??'} - {getattr(resp, 'text', e)}")
-        raise
-
-    data = resp.json()
-    ws_url = data.get("data", {}).get("authorized_redirect_uri")
-    if not ws_url:
-        raise RuntimeError(f"Missing authorized_redirect_uri in response: {data}")
-
-    print("🔑 Authorized WS URL received:", ws_url)
-    return ws_url
-
-
-    # 📡 Subscribe / Unsubscribe
-    def _send_subscribe(self, keys: list[str]):
-        if not self.connected or not self.ws or not keys:
-            print("⚠️ WebSocket not ready for subscription yet.")
-            return
-        payload = {
-            "guid": f"g_{int(time.time() * 1000)}",
-            "method": "sub",
-            "data": {"mode": UPSTOX_SUB_MODE, "instrumentKeys": keys},
+    def _authorize_get_ws_url(self, token: str = None) -> str:
+        """
+        Authorize feed access via Upstox API v2 — returns a websocket URL.
+        """
+        token = token or self.access_token
+        if not token or len(token) < 20:
+            raise RuntimeError("Invalid or missing Upstox access token.")
+
+        headers = {
+            "Api-Key": UPSTOX_CLIENT_ID,  # ✅ include your API key here
+            "Authorization": f"Bearer {token}",
+            "Accept": "application/json",
         }
-        try:
-            self.ws.send(json.dumps(payload))
-            print(f"📡 Sent SUB for {len(keys)} keys → {keys}")
-        except Exception as e:
-            print("❌ SUB send failed:", e)
 
-    def _send_unsubscribe(self, keys: list[str]):
-        if not self.connected or not self.ws or not keys:
-            print("⚠️ WebSocket not ready for unsubscribe yet.")
-            return
-        payload = {
-            "guid": f"g_{int(time.time() * 1000)}",
-            "method": "unsub",
-            "data": {"mode": UPSTOX_SUB_MODE, "instrumentKeys": keys},
-        }
+        resp = None
         try:
-            self.ws.send(json.dumps(payload))
-            print(f"📴 Sent UNSUB for {len(keys)} keys → {keys}")
+            resp = requests.get(UPSTOX_AUTHORIZE_URL, headers=headers, timeout=10)
+            resp.raise_for_status()
         except Exception as e:
-            print("❌ UNSUB send failed:", e)
+            print(f"⚠️ WS Authorization failed: {resp.status_code if resp else '??'} - {getattr(resp, 'text', e)}")
+            raise
+
+        data = resp.json()
+        ws_url = data.get("data", {}).get("authorized_redirect_uri")
+        if not ws_url:
+            raise RuntimeError(f"Missing authorized_redirect_uri in response: {data}")
+
+        print("🔑 Authorized WS URL received:", ws_url)
+        return ws_url
+
+    def _conn_name(self, role: str) -> str:
+        self._conn_seq += 1
+        return f"{self.shard}:{role}-{self._conn_seq}"
+
+    def _socket_closed(self, conn):
+        """Connection ``on_close``: wake the supervisor to fail over."""
+        self._kick()
+
+    def _connect(self, token: str, role: str):
+        """Authorize and open a socket; None if the handshake did not complete."""
+        url = self._authorize_get_ws_url(token)
+        conn = FeedConnection(self._conn_name(role), url, token, self._on_frame, on_close=self._socket_closed)
+        if not conn.start(UPSTOX_WS_OPEN_TIMEOUT_S):
+            print(f"⚠️ Upstox WS [{conn.name}] did not open within {UPSTOX_WS_OPEN_TIMEOUT_S}s")
+            return None
+        return conn
 
-    # 🧠 Public APIs
-    def subscribe(self, instrument_keys: list[str]):
-        if not instrument_keys:
-            print("⚠️ No instrument keys provided for subscription.")
-            return
+    # 📡 Subscribe / Unsubscribe
+    def _payloads(self, method: str, keys: list[str]):
+        """(chunk, JSON frame) pairs: keys grouped by mode, in chunks of UPSTOX_SUB_CHUNK_SIZE."""
+        by_mode: dict[str, list] = {}
         with self.sub_lock:
-            self.subscribed_keys.update(instrument_keys)
-        if self.connected and self.ws:
-            self._send_subscribe(instrument_keys)
+            for k in keys:
+                by_mode.setdefault(self.key_modes.get(k) or default_sub_mode(k), []).append(k)
+
+        for mode, group in by_mode.items():
+            for chunk in self.ctrl_q.chunks(group):
+                self._guid_seq += 1
+                yield chunk, json.dumps({
+                    "guid": f"g_{int(time.time() * 1000)}_{self._guid_seq}",
+                    "method": method,
+                    "data": {"mode": mode, "instrumentKeys": chunk},
+                })
+
+    @staticmethod
+    def _sent(conn: FeedConnection, method: str, chunk: list[str]):
+        if method == "sub":
+            conn.keys.update(chunk)
         else:
-            self.ctrl_q.put({"type": "sub", "keys": instrument_keys})
-            print("⏳ Queued keys for auto-subscription once connected.")
+            conn.keys.difference_update(chunk)
+
+    @staticmethod
+    def _log_sent(method: str, keys: list[str], frames: int):
+        if frames:
+            if method == "sub":
+                print(f"📡 Sent SUB for {len(keys)} keys in {frames} frame(s)")
+            else:
+                print(f"📴 Sent UNSUB for {len(keys)} keys in {frames} frame(s)")
+
+    def _send(self, method: str, keys: list[str], conn: FeedConnection = None) -> int:
+        """Send keys upstream on ``conn`` (default: the active socket). Returns the number of frames sent."""
+        conn = conn or self.active
+        if not conn or not conn.alive() or not keys:
+            return 0
+        frames = 0
+        for chunk, text in self._payloads(method, keys):
+            try:
+                conn.send(text)
+            except Exception as e:
+                print(f"❌ {method.upper()} send failed:", e)
+                break
+            frames += 1
+            self._sent(conn, method, chunk)
+        self._log_sent(method, keys, frames)
+        return frames
+
+    def _resync_plan(self, conn: FeedConnection):
+        """(stale, missing) keys that bring a socket's subscriptions in line with the wanted set."""
+        with self.sub_lock:
+            wanted = set(self.subscribed_keys)
+        stale, missing = list(conn.keys - wanted), list(wanted - conn.keys)
+        if missing:
+            print(f"📡 Restoring {len(missing)} subscriptions on [{conn.name}]...")
+        return stale, missing
+
+    def _resync(self, conn: FeedConnection):
+        stale, missing = self._resync_plan(conn)
+        self._send("unsub", stale, conn)
+        self._send("sub", missing, conn)
+
+    def _drain_commands(self) -> int:
+        """Send everything queued as one coalesced batch; never blocks. Returns frames sent."""
+        batch = self.ctrl_q.next_batch(timeout=0)
+        if batch is None:
+            return 0
+        subs, unsubs, enqueued_ts = batch
+        # Unsubscribe first so the connection stays under its key limit
+        frames = self._send("unsub", unsubs) + self._send("sub", subs)
+        self.ctrl_q.record_sent(enqueued_ts, frames)
+        return frames
 
-    def unsubscribe(self, instrument_keys: list[str]):
+    # 🧠 Public APIs
+    def _queue(self, op: str, instrument_keys: list[str], mode: str = None) -> bool:
         if not instrument_keys:
-            print("⚠️ No instrument keys provided for unsubscription.")
-            return
+            print(f"⚠️ No instrument keys provided for {'subscription' if op == 'sub' else 'unsubscription'}.")
+            return False
         with self.sub_lock:
-            for k in instrument_keys:
-                self.subscribed_keys.discard(k)
-        if self.connected and self.ws:
-            self._send_unsubscribe(instrument_keys)
-        else:
-            self.ctrl_q.put({"type": "unsub", "keys": instrument_keys})
-            print("⏳ Queued keys for auto-unsubscription once connected.")
+            if op == "sub":
+                self.subscribed_keys.update(instrument_keys)
+                for k in instrument_keys:
+                    self.key_modes[k] = mode or default_sub_mode(k)
+            else:
+                self.subscribed_keys.difference_update(instrument_keys)
+        self.ctrl_q.put(op, instrument_keys)
+        return True
+
+    def _kick(self):
+        """Wake the supervisor; safe from any thread."""
+        self.wake.set()
+
+    def subscribe(self, instrument_keys: list[str], mode: str = None):
+        """Subscribe keys; ``mode`` overrides the per-group default from default_sub_mode()."""
+        if self._queue("sub", instrument_keys, mode):
+            self._kick()
 
-    # ⚙️ WebSocket Callbacks
-    def _on_open(self, ws):
-        self.connected = True
-        print("✅ Upstox WS connected.")
-        with self.sub_lock:
-            keys = list(self.subscribed_keys)
-        if keys:
-            print(f"📡 Restoring {len(keys)} subscriptions...")
-            self._send_subscribe(keys)
+    def unsubscribe(self, instrument_keys: list[str]):
+        if self._queue("unsub", instrument_keys):
+            self._kick()
 
-    def _on_close(self, ws, code, reason):
-        self.connected = False
-        print(f"🔌 Upstox WS closed: code={code}, reason={reason}")
+    def rotate_token(self, access_token: str):
+        """Switch to a new token without a feed gap; the swap happens on the supervisor."""
+        self.pending_token = access_token
+        self._kick()
 
-    def _on_error(self, ws, error):
-        self.connected = False
-        print("⚠️ Upstox WS error:", error)
+    def stats(self) -> dict:
+        with self.sub_lock:
+            n = len(self.subscribed_keys)
+        return {
+            "connected": bool(self.active and self.active.alive()),
+            "subscribed_keys": n,
+            "commands": self.ctrl_q.stats(),
+            "active": self.active.stats() if self.active else None,
+            "standby": self.standby.stats() if self.standby else None,
+            "standby_enabled": self.standby_enabled,
+            "core": self.core,
+            "backoff_attempt": self.backoff.attempt,
+            "overlap_duplicates": tick_table.duplicates,
+            **self.meter.stats(),
+            **self.failovers.stats(),
+        }
 
     # 🧩 Message Handler
-    def _on_message(self, ws, message):
+    def _on_frame(self, conn: FeedConnection, message):
+        if conn is not self.active and conn is not self.incoming:
+            return  # idle standby or a socket already swapped out
+        now_ns = conn.mark_frame()
+        binary = isinstance(message, (bytes, bytearray))
+        if binary and (conn.data_frames or self._carries_ticks(conn, message)):
+            conn.mark_data(now_ns)
+            if conn is self.active:
+                self.failovers.frame(now_ns)
+            elif conn.data_frames == 1:
+                self._kick()  # the rotation overlap is waiting for this
+        if feed_metrics is not None and binary:
+            feed_metrics.received(len(message))
+        if conn is self.active and tick_recorder and binary:
+            tick_recorder.record(message, now_ns)
+        # Overlapping sockets (and a fresh socket's initial snapshot) repeat ticks
+        self._on_message(conn.ws, message, dedup=time.monotonic() < self.dedup_until)
+
+    @staticmethod
+    def _carries_ticks(conn: FeedConnection, message) -> bool:
+        """
+        First tick frame for keys subscribed on ``conn``. Only parsed until a
+        socket's first one, so the extra decode costs a frame or two per socket.
+        """
+        if PROTO_MESSAGE_CLASS is None:
+            return True
+        msg = PROTO_MESSAGE_CLASS()
+        try:
+            msg.ParseFromString(message)
+        except Exception:
+            return False
+        if msg.type not in TICK_FRAME_TYPES:
+            return False
+        return any(k in conn.keys for k in msg.feeds)
+
+    def _on_message(self, ws, message, dedup: bool = False):
         try:
             if isinstance(message, (bytes, bytearray)):
+                if decode_pool is not None:
+                    # Decode happens in the worker processes; only the hand-off runs here
+                    self.meter.frame()
+                    decode_pool.submit(message, dedup, self.meter)
+                    return
                 if PROTO_MESSAGE_CLASS is None:
                     print("❌ Protobuf not loaded; cannot decode binary.")
                     return
+                received_ns = time.time_ns()
                 msg = PROTO_MESSAGE_CLASS()
                 msg.ParseFromString(message)
+                self.meter.frame(msg.currentTs)
+
+                if UPSTOX_DECODE_MODE == "columnar":
+                    # No per-tick dicts or prints — the conflator emits from the arrays
+                    pipeline.apply(msg, dedup, received_ns)
+                    return
+
                 parsed_ticks = {}
 
                 for key, feed in msg.feeds.items():
@@ -368,23 +698,25 @@ def _authorize_get_ws_url(self) -> str:
                             ltp = feed.ltpc.ltp
                             parsed_ticks[key] = {"ltp": round(float(ltp), 2)}
                         elif feed.HasField("fullFeed"):
-                            if feed.fullFeed.HasField("marketFF"):
-                                ltp = feed.fullFeed.marketFF.ltpc.ltp
-                                ohlc = feed.fullFeed.marketFF.marketOHLC.ohlc
-                                if ltp:
-                                    parsed_ticks[key] = {"ltp": round(float(ltp), 2)}
-                                    if len(ohlc) > 0:
-                                        parsed_ticks[key].update({
-                                            "open": ohlc[0].open,
-                                            "high": ohlc[0].high,
-                                            "low": ohlc[0].low,
-                                            "close": ohlc[0].close,
-                                        })
+                            ff = feed.fullFeed
+                            # indexFF arrives here too when the index feed shares this socket
+                            body = ff.marketFF if ff.HasField("marketFF") else ff.indexFF
+                            ltp = body.ltpc.ltp
+                            ohlc = body.marketOHLC.ohlc
+                            if ltp:
+                                parsed_ticks[key] = {"ltp": round(float(ltp), 2)}
+                                if len(ohlc) > 0:
+                                    parsed_ticks[key].update({
+                                        "open": ohlc[0].open,
+                                        "high": ohlc[0].high,
+                                        "low": ohlc[0].low,
+                                        "close": ohlc[0].close,
+                                    })
                     except Exception as inner:
                         print(f"⚠️ Decode error for {key}:", inner)
 
                 if parsed_ticks:
-                    socketio.emit("tick_update", parsed_ticks, broadcast=True)
+                    emit_ticks(parsed_ticks)
                     print("📈 Tick update:", parsed_ticks)
                 return
 
@@ -397,108 +729,652 @@ def _authorize_get_ws_url(self) -> str:
         except Exception as e:
             print("⚠️ _on_message exception:", e)
 
-    # ✅ FIXED: now indented properly inside the class
-    def run(self):
-        """Main WebSocket connection loop."""
-        consecutive_403 = 0  # track repeated forbidden responses
+    # 🔁 Connection supervision (shared by both cores)
+    def _hold(self):
+        """Why not to stream right now: (seconds to wait, reason to close sockets or None), else None."""
+        # 🕒 Skip connection if market is closed
+        if not is_market_open():
+            print("⏸️ Market closed (after 3:30 PM). Waiting for next open window...")
+            return 600, "market closed"
+        # 🛡️ Check token validity
+        if not self.access_token or len(self.access_token) < 20:
+            print("⚠️ Missing or invalid access token. Skipping WS connect.")
+            return 60, None
+        return None
 
+    def _swap_in(self, conn: FeedConnection):
+        """Make ``conn`` the active socket; returns the one it replaces. The caller resyncs it next."""
+        old = self.active
+        self.active, self.ws = conn, conn.ws
+        self.dedup_until = time.monotonic() + UPSTOX_WS_DEDUP_WINDOW_S
+        # The full key set is resynced next, so anything still queued is redundant
+        self.ctrl_q.clear()
+        return old
+
+    def _swapped(self, old, conn: FeedConnection, reason: str, via: str):
+        """Record a finished swap; returns the replaced socket for the caller to close, if any."""
+        self.connected = True
+        print(f"🔀 Upstox WS [{conn.name}] active ({reason} via {via})")
+        if old is None:
+            return None
+        self.failovers.begin(reason, via, old.last_data_ns, conn.first_data_ns)
+        return old if old is not conn else None
+
+    def _failover_from(self):
+        """Mark the feed down; returns (reason, live standby to promote or None)."""
+        self.connected = False
+        reason = "startup" if self.active is None else (self.active.close_reason or "disconnect")
+        if self.active is not None and self.on_down is not None:
+            self.on_down(self)
+        standby, self.standby = self.standby, None
+        return reason, standby if standby is not None and standby.alive() else None
+
+    def _take_token(self):
+        """Adopt the pending token; returns it and the standby it invalidates (or None)."""
+        self.rotating = True
+        token, self.pending_token = self.pending_token, None
+        self.access_token = token
+        standby, self.standby = self.standby, None
+        return token, standby
+
+    def _begin_overlap(self, conn: FeedConnection) -> float:
+        """Start streaming ``conn`` alongside the active socket; returns the overlap deadline."""
+        self.incoming = conn
+        self.dedup_until = time.monotonic() + UPSTOX_WS_OVERLAP_S + UPSTOX_WS_DEDUP_WINDOW_S
+        return time.monotonic() + UPSTOX_WS_OVERLAP_S
+
+    def _overlapping(self, conn: FeedConnection, deadline: float) -> bool:
+        # market_info arrives on connect; wait for the resynced keys to actually stream
+        return (bool(conn.keys) and not conn.data_frames and time.monotonic() < deadline
+                and conn.alive() and not self.stop_event.is_set())
+
+    def _end_overlap(self, conn: FeedConnection):
+        self.incoming = None
+        if not conn.alive():
+            raise RuntimeError("rotation socket closed during overlap")
+
+    def _standby_due(self) -> bool:
+        if not self.standby_enabled or self.warming:
+            return False
+        if self.standby is not None:
+            if self.standby.alive():
+                return False
+            self.standby = None
+        return time.monotonic() >= self.standby_retry_at
+
+    def _adopt_standby(self, conn: FeedConnection) -> bool:
+        """Keep a freshly opened standby; False if shutdown began meanwhile and it must be closed."""
+        if self.stop_event.is_set():
+            return False
+        self.standby = conn
+        self.standby_backoff.reset()
+        return True
+
+    def _standby_failed(self, error: Exception = None):
+        if error is not None:
+            print("⚠️ Standby WS warm-up failed:", error)
+        self.standby_retry_at = time.monotonic() + self.standby_backoff.next()
+
+    def _reconnect_delay(self, error: Exception = None) -> float:
+        delay = self.backoff.next()
+        if error is None:
+            print(f"🔁 Upstox WS connect failed — retrying in {delay:.1f}s")
+        else:
+            print(f"❌ WS loop exception: {error} — retrying in {delay:.1f}s")
+        return delay
+
+    # 🔁 Thread core I/O
+    def _sleep(self, seconds: float):
+        """Sleep unless shutdown() is called first."""
+        self.stop_event.wait(seconds)
+
+    def _idle(self, seconds: float):
+        """Wait for a command, a socket closing, a rotation or shutdown — or ``seconds``."""
+        self.wake.wait(max(seconds, 0))
+        self.wake.clear()
+
+    def _promote(self, conn: FeedConnection, reason: str, via: str):
+        """Make ``conn`` the active socket and carry the subscriptions over."""
+        old = self._swap_in(conn)
+        self._resync(conn)
+        old = self._swapped(old, conn, reason, via)
+        if old is not None:
+            old.close(f"replaced ({reason})")
+
+    def _failover(self) -> bool:
+        """Replace a dead (or missing) active socket: warm standby first, else a fresh connect."""
+        reason, standby = self._failover_from()
+        if standby is not None:
+            self._promote(standby, reason, "standby")
+            return True
+        conn = self._connect(self.access_token, "active")
+        if conn is None:
+            return False
+        self._promote(conn, reason, "reconnect")
+        return True
+
+    def _rotate(self):
+        """Bring up a socket on the new token, overlap it with the old one, then swap."""
+        token, standby = self._take_token()
+        if standby is not None:
+            standby.close("token rotated")
+        if not (self.active and self.active.alive()):
+            return  # nothing streaming — the next failover connects with the new token
+        conn = self._connect(token, "active")
+        if conn is None:
+            raise RuntimeError("rotation socket did not open")
+        deadline = self._begin_overlap(conn)
+        self._resync(conn)
+        while self._overlapping(conn, deadline):
+            self._drain_commands()
+            self._idle(deadline - time.monotonic())
+        self._end_overlap(conn)
+        self._promote(conn, "token rotation", "overlap")
+
+    def _warm_standby(self):
+        try:
+            conn = self._connect(self.access_token, "standby")
+            if conn is not None:
+                if not self._adopt_standby(conn):
+                    conn.close("shutdown")
+                return
+            self._standby_failed()
+        except Exception as e:
+            self._standby_failed(e)
+        finally:
+            self.warming = False
+
+    def _keep_standby(self):
+        if self._standby_due():
+            self.warming = True
+            threading.Thread(target=self._warm_standby, daemon=True).start()
+
+    def _close_all(self, reason: str):
+        for conn in (self.active, self.standby, self.incoming):
+            if conn is not None:
+                conn.close(reason)
+        self.active = self.standby = self.incoming = None
+        self.connected = False
+
+    def run(self):
+        """Supervisor loop: keep one socket streaming (plus a warm standby) and swap on failure."""
         while not self.stop_event.is_set():
             try:
-                # 🕒 Skip connection if market is closed
-                if not is_market_open():
-                    print("⏸️ Market closed (after 3:30 PM). Waiting for next open window...")
-                    time.sleep(600)
+                hold = self._hold()
+                if hold:
+                    delay, reason = hold
+                    if reason:
+                        self._close_all(reason)
+                    self._sleep(delay)
                     continue
 
-                # 🛡️ Check token validity
-                if not self.access_token or len(self.access_token) < 20:
-                    print("⚠️ Missing or invalid access token. Skipping WS connect.")
-                    time.sleep(60)
-                    continue
+                if self.pending_token:
+                    try:
+                        self._rotate()
+                    finally:
+                        self.rotating = False
+
+                if not (self.active and self.active.alive()):
+                    if not self._failover():
+                        self._sleep(self._reconnect_delay())
+                        continue
+                    self.backoff.reset()
+
+                self._keep_standby()
+                self._drain_commands()
+                # Commands and socket closes wake this immediately; the timeout re-checks market hours
+                self._idle(5.0)
+
+            except Exception as e:
+                self._sleep(self._reconnect_delay(e))
 
-                # ✅ Fetch fresh WS URL
-                try:
-                    ws_url = self._authorize_get_ws_url()
-                    print("🔑 Authorized WS URL received:", ws_url)
-                except Exception as e:
-                    print(f"⚠️ WS Authorization failed: {e}")
-                    time.sleep(60)
+    # 🧹 Graceful shutdown
+    def shutdown(self):
+        self.stop_event.set()
+        self._kick()
+        self._close_all("shutdown")
+        print("🧹 WebSocket closed cleanly.")
+
+class AsyncUpstoxStreamer(UpstoxStreamer):
+    """
+    asyncio core for the upstream feed: one thread runs an event loop that
+    owns every socket (active, standby, rotation), in place of a
+    websocket-client thread per socket. Supervision is inherited; only the
+    socket I/O and the waits are awaited here.
+
+    ``subscribe()`` / ``unsubscribe()`` / ``rotate_token()`` stay
+    thread-safe for the Flask routes and Socket.IO handlers. Code on the
+    loop can ``await asubscribe()`` / ``aunsubscribe()`` instead.
+    """
+
+    core = "asyncio"
+
+    def __init__(self, access_token: str, name: str = "main"):
+        super().__init__(access_token, name)
+        self.loop: asyncio.AbstractEventLoop = None
+        self._wake: asyncio.Event = None
+        self._halt: asyncio.Event = None
+
+    # 🧵 Thread-safe facade
+    def _kick(self):
+        # run() publishes the loop only after creating the events
+        loop = self.loop
+        if loop is not None and not loop.is_closed():
+            try:
+                loop.call_soon_threadsafe(self._wake.set)
+            except RuntimeError:
+                pass  # loop shutting down
+
+    # ⏳ Awaitable API (on the streamer loop)
+    async def asubscribe(self, instrument_keys: list[str], mode: str = None) -> int:
+        """Subscribe and return once the frames are on the wire; returns frames sent."""
+        if not self._queue("sub", instrument_keys, mode):
+            return 0
+        return await self._adrain()
+
+    async def aunsubscribe(self, instrument_keys: list[str]) -> int:
+        if not self._queue("unsub", instrument_keys):
+            return 0
+        return await self._adrain()
+
+    # 📡 Subscribe / Unsubscribe
+    async def _asend(self, method: str, keys: list[str], conn: AsyncFeedConnection = None) -> int:
+        conn = conn or self.active
+        if not conn or not conn.alive() or not keys:
+            return 0
+        frames = 0
+        for chunk, text in self._payloads(method, keys):
+            try:
+                await conn.send(text)
+            except Exception as e:
+                print(f"❌ {method.upper()} send failed:", e)
+                break
+            frames += 1
+            self._sent(conn, method, chunk)
+        self._log_sent(method, keys, frames)
+        return frames
+
+    async def _aresync(self, conn: AsyncFeedConnection):
+        stale, missing = self._resync_plan(conn)
+        await self._asend("unsub", stale, conn)
+        await self._asend("sub", missing, conn)
+
+    async def _adrain(self) -> int:
+        batch = self.ctrl_q.next_batch(timeout=0)
+        if batch is None:
+            return 0
+        subs, unsubs, enqueued_ts = batch
+        frames = await self._asend("unsub", unsubs) + await self._asend("sub", subs)
+        self.ctrl_q.record_sent(enqueued_ts, frames)
+        return frames
+
+    # ⏳ Cancellable waits
+    async def _asleep(self, seconds: float):
+        try:
+            await asyncio.wait_for(self._halt.wait(), seconds)
+        except asyncio.TimeoutError:
+            pass
+
+    async def _aidle(self, seconds: float):
+        try:
+            await asyncio.wait_for(self._wake.wait(), max(seconds, 0))
+        except asyncio.TimeoutError:
+            pass
+        self._wake.clear()
+
+    # 🔁 Connection supervision
+    async def _aconnect(self, token: str, role: str):
+        url = await self.loop.run_in_executor(None, self._authorize_get_ws_url, token)
+        conn = AsyncFeedConnection(self._conn_name(role), url, token, self._on_frame, on_close=self._socket_closed)
+        if not await conn.start(UPSTOX_WS_OPEN_TIMEOUT_S):
+            print(f"⚠️ Upstox WS [{conn.name}] did not open: {conn.close_reason}")
+            return None
+        return conn
+
+    async def _apromote(self, conn: AsyncFeedConnection, reason: str, via: str):
+        old = self._swap_in(conn)
+        await self._aresync(conn)
+        old = self._swapped(old, conn, reason, via)
+        if old is not None:
+            await old.aclose(f"replaced ({reason})")
+
+    async def _afailover(self) -> bool:
+        reason, standby = self._failover_from()
+        if standby is not None:
+            await self._apromote(standby, reason, "standby")
+            return True
+        conn = await self._aconnect(self.access_token, "active")
+        if conn is None:
+            return False
+        await self._apromote(conn, reason, "reconnect")
+        return True
+
+    async def _arotate(self):
+        token, standby = self._take_token()
+        if standby is not None:
+            await standby.aclose("token rotated")
+        if not (self.active and self.active.alive()):
+            return
+        conn = await self._aconnect(token, "active")
+        if conn is None:
+            raise RuntimeError("rotation socket did not open")
+        deadline = self._begin_overlap(conn)
+        await self._aresync(conn)
+        while self._overlapping(conn, deadline):
+            await self._adrain()
+            await self._aidle(deadline - time.monotonic())
+        self._end_overlap(conn)
+        await self._apromote(conn, "token rotation", "overlap")
+
+    async def _awarm_standby(self):
+        try:
+            conn = await self._aconnect(self.access_token, "standby")
+            if conn is not None:
+                if not self._adopt_standby(conn):
+                    await conn.aclose("shutdown")
+                return
+            self._standby_failed()
+        except Exception as e:
+            self._standby_failed(e)
+        finally:
+            self.warming = False
+
+    def _keep_standby(self):
+        if self._standby_due():
+            self.warming = True
+            self.loop.create_task(self._awarm_standby())
+
+    async def _aclose_all(self, reason: str):
+        for conn in (self.active, self.standby, self.incoming):
+            if conn is not None:
+                await conn.aclose(reason)
+        self.active = self.standby = self.incoming = None
+        self.connected = False
+
+    async def _amain(self):
+        while not self.stop_event.is_set():
+            try:
+                hold = self._hold()
+                if hold:
+                    delay, reason = hold
+                    if reason:
+                        await self._aclose_all(reason)
+                    await self._asleep(delay)
                     continue
 
-                # ✅ Establish WebSocket connection
-                self.ws = websocket.WebSocketApp(
-                    ws_url,
-                    on_open=self._on_open,
-                    on_message=self._on_message,
-                    on_error=self._on_error,
-                    on_close=self._on_close,
-                )
-
-                ws_thread = threading.Thread(
-                    target=self.ws.run_forever,
-                    kwargs={"ping_interval": 20, "ping_timeout": 10},
-                    daemon=True,
-                )
-                ws_thread.start()
-
-                connected_once = False
-                while ws_thread.is_alive() and not self.stop_event.is_set():
-                    if self.connected:
-                        connected_once = True
+                if self.pending_token:
                     try:
-                        cmd = self.ctrl_q.get(timeout=0.2)
-                        if cmd["type"] == "sub":
-                            self._send_subscribe(cmd["keys"])
-                        elif cmd["type"] == "unsub":
-                            self._send_unsubscribe(cmd["keys"])
-                    except queue.Empty:
-                        continue
+                        await self._arotate()
+                    finally:
+                        self.rotating = False
 
-                if not connected_once:
-                    consecutive_403 += 1
-                    print("⚠️ Connection failed (403 or timeout). Waiting before retry...")
-
-                if not connected_once:
-                    if consecutive_403 >= 3:
-                        print("🚫 Too many 403 errors. Pausing for 15 minutes.")
-                        time.sleep(900)
-                        consecutive_403 = 0
-                    else:
-                        time.sleep(60)
-                    continue
+                if not (self.active and self.active.alive()):
+                    if not await self._afailover():
+                        await self._asleep(self._reconnect_delay())
+                        continue
+                    self.backoff.reset()
 
-                consecutive_403 = 0
-                print(f"🔁 Reconnecting in {UPSTOX_WS_RECONNECT_SECONDS}s...")
-                time.sleep(UPSTOX_WS_RECONNECT_SECONDS)
+                self._keep_standby()
+                await self._adrain()
+                await self._aidle(5.0)
 
             except Exception as e:
-                print("❌ WS loop exception:", e)
-                time.sleep(UPSTOX_WS_RECONNECT_SECONDS)
+                await self._asleep(self._reconnect_delay(e))
+        await self._aclose_all("shutdown")
+
+    def run(self):
+        loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+        self._wake = asyncio.Event()
+        self._halt = asyncio.Event()
+        # Published last: _kick() from another thread may use the events as soon as it sees the loop
+        self.loop = loop
+        try:
+            loop.run_until_complete(self._amain())
+        finally:
+            loop.close()
 
     # 🧹 Graceful shutdown
     def shutdown(self):
         self.stop_event.set()
-        try:
-            if self.ws:
-                self.ws.close()
-                print("🧹 WebSocket closed cleanly.")
-        except Exception:
-            pass
+        loop = self.loop
+        if loop is not None and not loop.is_closed():
+            try:
+                loop.call_soon_threadsafe(self._halt.set)
+                loop.call_soon_threadsafe(self._wake.set)
+            except RuntimeError:
+                pass
+        print("🧹 WebSocket closed cleanly.")
+
+
+def new_streamer(access_token: str, name: str = "main") -> UpstoxStreamer:
+    """Streamer core for one upstream connection (plus its standby)."""
+    if UPSTOX_STREAMER_CORE == "asyncio":
+        return AsyncUpstoxStreamer(access_token, name)
+    return UpstoxStreamer(access_token, name)
+
+class ShardedStreamer(threading.Thread):
+    """
+    Spreads subscribed keys over UPSTOX_SHARDS UpstoxStreamer connections.
+
+    Each key lives on exactly one shard (the least loaded one when it is
+    first subscribed), so every shard stays under UPSTOX_SHARD_MAX_KEYS and
+    decodes its frames on its own socket thread. All shards write into the
+    shared TickTable under its lock, and the conflator emits one merged
+    stream. When unsubscribes leave the shards uneven, the rebalancer moves
+    keys make-before-break: subscribe on the target, drop ticks already
+    seen while both deliver, then unsubscribe on the source.
+
+    With UPSTOX_WS_STANDBY the shards share one standby instead of holding
+    one each: an extra shard stays connected with no keys. When a shard's
+    socket drops, its keys move onto that spare, and the dropped shard
+    becomes the spare once it reconnects. A token rotation goes through the
+    shards one at a time, so only one overlap socket is open at once.
+    """
+
+    def __init__(self, access_token: str, shards: int):
+        super().__init__(daemon=True, name="upstox-shards")
+        n = max(int(shards), 1)
+        self.shards = [new_streamer(access_token, name=f"s{i}") for i in range(n + (1 if UPSTOX_WS_STANDBY else 0))]
+        self.spare = n if UPSTOX_WS_STANDBY else None  # index of the keyless standby shard
+        for shard in self.shards:
+            shard.standby_enabled = False
+            shard.on_down = self._shard_down
+        self.stop_event = threading.Event()
+        self.lock = threading.Lock()
+        self.owner: dict[str, int] = {}  # instrument key → shard index
+        self.counts = [0] * len(self.shards)
+        self.moving: list = []  # (due, source shard, keys) awaiting unsubscribe
+        self.rotating: list[int] = []  # shards still to rotate onto pending_token
+        self.pending_token = None
+        self.moves = 0
+        self.keys_moved = 0
+        self.takeovers = 0
+        self.over_limit = 0
+
+    def _serving(self) -> list[int]:
+        return [i for i in range(len(self.shards)) if i != self.spare]
+
+    def _pick(self) -> int:
+        i = min(self._serving(), key=self.counts.__getitem__)
+        if self.counts[i] >= UPSTOX_SHARD_MAX_KEYS:
+            self.over_limit += 1
+        return i
+
+    def _subscribe_on(self, dst: UpstoxStreamer, src: UpstoxStreamer, keys: list[str]):
+        """Subscribe ``keys`` on ``dst`` with the modes they had on ``src``."""
+        with src.sub_lock:
+            modes = {k: src.key_modes.get(k) for k in keys}
+        by_mode: dict = {}
+        for k, m in modes.items():
+            by_mode.setdefault(m, []).append(k)
+        for m, ks in by_mode.items():
+            dst.subscribe(ks, m)
+
+    # 🧠 Same public API as UpstoxStreamer
+    def subscribe(self, instrument_keys: list[str], mode: str = None):
+        if not instrument_keys:
+            print("⚠️ No instrument keys provided for subscription.")
+            return
+        by_shard: dict[int, list] = {}
+        with self.lock:
+            for k in instrument_keys:
+                i = self.owner.get(k)
+                if i is None:
+                    i = self.owner[k] = self._pick()
+                    self.counts[i] += 1
+                by_shard.setdefault(i, []).append(k)
+            # Queued under the lock so a key's commands reach its shard in ownership order
+            for i, keys in by_shard.items():
+                self.shards[i].subscribe(keys, mode)
+
+    def unsubscribe(self, instrument_keys: list[str]):
+        if not instrument_keys:
+            print("⚠️ No instrument keys provided for unsubscription.")
+            return
+        by_shard: dict[int, list] = {}
+        with self.lock:
+            for k in instrument_keys:
+                i = self.owner.pop(k, None)
+                if i is not None:
+                    self.counts[i] -= 1
+                    by_shard.setdefault(i, []).append(k)
+            for i, keys in by_shard.items():
+                self.shards[i].unsubscribe(keys)
+
+    def rotate_token(self, access_token: str):
+        with self.lock:
+            self.pending_token = access_token
+            self.rotating = list(range(len(self.shards)))
+
+    def _rotate_next(self):
+        """Hand the new token to the next shard once no other shard is mid-overlap."""
+        if any(s.pending_token or s.rotating for s in self.shards):
+            return
+        with self.lock:
+            if not self.rotating:
+                return
+            i = self.rotating.pop(0)
+            token = self.pending_token
+        self.shards[i].rotate_token(token)
+
+    # 🛟 Shared standby
+    def _shard_down(self, shard: UpstoxStreamer):
+        """A shard lost its socket: its keys move to the connected spare, and it becomes the spare."""
+        i = self.shards.index(shard)
+        with self.lock:
+            j = self.spare
+            if j is None or j == i or not self.shards[j].connected:
+                return
+            keys = [k for k, o in self.owner.items() if o == i]
+            for k in keys:
+                self.owner[k] = j
+            self.counts[j] += len(keys)
+            self.counts[i] -= len(keys)
+            self.spare = i
+            dst = self.shards[j]
+            dst.dedup_until = max(dst.dedup_until, time.monotonic() + UPSTOX_WS_DEDUP_WINDOW_S)
+            if keys:
+                self._subscribe_on(dst, shard, keys)
+                # Dropped from the wanted set, so the shard reconnects with nothing to resync
+                shard.unsubscribe(keys)
+            self.takeovers += 1
+        print(f"🛟 Shard s{j} took over {len(keys)} keys from s{i}; s{i} is the standby now")
+
+    # ⚖️ Rebalancing
+    def _rebalance(self):
+        with self.lock:
+            serving = self._serving()
+            hi = max(serving, key=self.counts.__getitem__)
+            lo = min(serving, key=self.counts.__getitem__)
+            n = (self.counts[hi] - self.counts[lo]) // 2
+            if n <= UPSTOX_SHARD_REBALANCE_SLACK // 2:
+                return
+            n = min(n, UPSTOX_SUB_CHUNK_SIZE * 10)
+            keys = [k for k, i in self.owner.items() if i == hi][:n]
+            for k in keys:
+                self.owner[k] = lo
+            self.counts[hi] -= len(keys)
+            self.counts[lo] += len(keys)
+            src, dst = self.shards[hi], self.shards[lo]
+            until = time.monotonic() + UPSTOX_WS_OVERLAP_S + UPSTOX_WS_DEDUP_WINDOW_S
+            src.dedup_until = max(src.dedup_until, until)
+            dst.dedup_until = max(dst.dedup_until, until)
+            # Still under the lock: an unsubscribe racing the move must queue after this subscribe
+            self._subscribe_on(dst, src, keys)
+        self.moving.append((time.monotonic() + UPSTOX_WS_OVERLAP_S, hi, keys))
+        self.moves += 1
+        self.keys_moved += len(keys)
+        print(f"⚖️ Moving {len(keys)} keys from shard s{hi} to s{lo}")
+
+    def _finish_moves(self):
+        now = time.monotonic()
+        due = [m for m in self.moving if m[0] <= now]
+        self.moving = [m for m in self.moving if m[0] > now]
+        for _, i, keys in due:
+            with self.lock:
+                # Skip keys that moved back or were unsubscribed meanwhile
+                gone = [k for k in keys if self.owner.get(k) != i]
+            if gone:
+                src = self.shards[i]
+                with src.sub_lock:
+                    gone = [k for k in gone if k in src.subscribed_keys]
+                if gone:
+                    src.unsubscribe(gone)
+
+    def run(self):
+        for s in self.shards:
+            s.start()
+        next_check = time.monotonic() + UPSTOX_SHARD_REBALANCE_S
+        while not self.stop_event.wait(0.5):
+            try:
+                self._finish_moves()
+                self._rotate_next()
+                if time.monotonic() >= next_check and not self.moving:
+                    self._rebalance()
+                    next_check = time.monotonic() + UPSTOX_SHARD_REBALANCE_S
+            except Exception as e:
+                print("⚠️ Shard rebalance error:", e)
+
+    def shutdown(self):
+        self.stop_event.set()
+        for s in self.shards:
+            s.shutdown()
+
+    def stats(self) -> dict:
+        per_shard = [s.stats() for s in self.shards]
+        with self.lock:
+            counts = list(self.counts)
+            n = len(self.owner)
+        return {
+            "connected": all(per_shard[i]["connected"] for i in self._serving()),
+            "subscribed_keys": n,
+            "shards": len(self.shards),
+            "max_keys_per_shard": UPSTOX_SHARD_MAX_KEYS,
+            "keys_per_shard": counts,
+            "over_limit": self.over_limit,
+            "rebalance_moves": self.moves,
+            "keys_moved": self.keys_moved,
+            "spare": f"s{self.spare}" if self.spare is not None else None,
+            "takeovers": self.takeovers,
+            "frames_per_s": round(sum(s["frames_per_s"] for s in per_shard), 1),
+            "per_shard": per_shard,
+        }
 
 # ================================
 # 🧠 SAFE INDEX FEED STARTUP HANDLER (CLEANED)
 # ================================
+INDEX_KEYS = [
+    "NSE_INDEX|Nifty 50",
+    "NSE_INDEX|Nifty Bank",
+    "NSE_INDEX|SENSEX",
+]
+
 async def index_feed_loop():
     """
     Continuously fetch live index prices (Nifty, BankNifty, Sensex)
     via Upstox WebSocket — runs only if access token is valid.
     """
-    INDEX_KEYS = [
-        "NSE_INDEX|Nifty 50",
-        "NSE_INDEX|Nifty Bank",
-        "NSE_INDEX|SENSEX",
-    ]
-
     while True:
         try:
             # 🕒 Skip connecting when market is closed
@@ -537,10 +1413,12 @@ async def index_feed_loop():
 
             print("🔑 (Index Feed) Authorized WS URL:", ws_url)
 
-            # ✅ Connect securely to WebSocket
-            ssl_ctx = ssl.create_default_context()
-            ssl_ctx.check_hostname = False
-            ssl_ctx.verify_mode = ssl.CERT_NONE
+            # ✅ Connect securely to WebSocket (plain ws:// only for the local simulator)
+            ssl_ctx = None
+            if ws_url.startswith("wss://"):
+                ssl_ctx = ssl.create_default_context()
+                ssl_ctx.check_hostname = False
+                ssl_ctx.verify_mode = ssl.CERT_NONE
 
             async with websockets.connect(ws_url, ssl=ssl_ctx) as ws:
                 print("✅ (Index Feed) Connected to Upstox")
@@ -549,7 +1427,7 @@ async def index_feed_loop():
                 sub_payload = {
                     "guid": "indexfeed",
                     "method": "sub",
-                    "data": {"mode": "full", "instrumentKeys": INDEX_KEYS},
+                    "data": {"mode": UPSTOX_INDEX_SUB_MODE, "instrumentKeys": INDEX_KEYS},
                 }
                 await ws.send(json.dumps(sub_payload))
                 print("📡 Subscribed to:", INDEX_KEYS)
@@ -558,6 +1436,8 @@ async def index_feed_loop():
                 while is_market_open():
                     try:
                         message = await asyncio.wait_for(ws.recv(), timeout=30)
+                        if tick_recorder and isinstance(message, (bytes, bytearray)):
+                            tick_recorder.record(message)
 
                         if PROTO_MESSAGE_CLASS is None:
                             print("❌ Protobuf not loaded; cannot decode index binary.")
@@ -565,26 +1445,8 @@ async def index_feed_loop():
 
                         feed_resp = PROTO_MESSAGE_CLASS()
                         feed_resp.ParseFromString(message)
-                        feed_dict = MessageToDict(feed_resp)
-
-                        parsed = {}
-                        for key, feed in (feed_dict.get("feeds") or {}).items():
-                            full_feed = feed.get("fullFeed", {})
-                            if "indexFF" in full_feed:
-                                idx = full_feed["indexFF"]
-                                ltpc = idx.get("ltpc", {})
-                                ohlc = idx.get("marketOHLC", {}).get("ohlc", [])
-                                parsed[key] = {
-                                    "ltp": round(float(ltpc.get("ltp", 0.0)), 2),
-                                    "open": ohlc[0].get("open") if ohlc else None,
-                                    "high": ohlc[0].get("high") if ohlc else None,
-                                    "low": ohlc[0].get("low") if ohlc else None,
-                                    "close": ohlc[0].get("close") if ohlc else None,
-                                }
-
-                        if parsed:
-                            socketio.emit("index_update", parsed, broadcast=True)
-                            print("📈 Index update:", parsed)
+                        # Same path as the streamer: last-value cache + conflated index_update
+                        tick_conflator.on_frame(feed_resp)
 
                     except asyncio.TimeoutError:
                         if not is_market_open():
@@ -598,13 +1460,27 @@ async def index_feed_loop():
 
 def start_index_feed():
     """
-    Start the index feed safely in a background thread.
+    Start the index feed: by default the index keys are added to the shared
+    streamer connection; with UPSTOX_SHARED_INDEX_FEED=0 the legacy
+    dedicated socket runs in a background thread.
     Only starts if a valid access token is present.
     """
     if not UPSTOX_ACCESS_TOKEN or len(UPSTOX_ACCESS_TOKEN) < 20:
         print("⏸️ Skipping index feed — invalid or missing Upstox token.")
         return
 
+    if UPSTOX_SHARED_INDEX_FEED:
+        # Multiplexed onto the streamer socket; emit_ticks() routes them to index_update
+        acquire_keys("index_feed", INDEX_KEYS)
+        print(f"📡 Index feed sharing the streamer connection ({UPSTOX_INDEX_SUB_MODE} mode)")
+        return
+
+    if UPSTOX_ASYNC_MODE != "threading":
+        # A private asyncio loop inside a monkey-patched green thread is not supported
+        print(f"⚠️ Dedicated index feed needs threading mode — sharing the streamer connection under {UPSTOX_ASYNC_MODE}")
+        acquire_keys("index_feed", INDEX_KEYS)
+        return
+
     def _runner():
         try:
             loop = asyncio.new_event_loop()
@@ -633,6 +1509,201 @@ def get_instruments():
         print("❌ Error loading instruments:", e)
         return jsonify({"error": str(e)}), 500
 
+# ================================
+# 📊 Feed Stats
+# ================================
+@app.route("/api/feed/stats", methods=["GET"])
+def feed_stats():
+    return jsonify({
+        "decode_mode": UPSTOX_DECODE_MODE,
+        "decode_pool": decode_pool.stats() if decode_pool else None,
+        "conflation": tick_conflator.stats(),
+        "latency": feed_metrics.stats() if feed_metrics else None,
+        "rooms": tick_rooms.stats(),
+        "outbound": outbound.stats(),
+        "subscriptions": subscriptions.stats(),
+        "streamer": sdk_streamer.stats() if sdk_streamer else None,
+        "history": tick_history.stats(),
+        "bar_timeframes": [tf.name for tf in bar_builder.frames],
+        "indicator_timeframe": indicators.timeframe,
+        "alerts": alert_engine.stats(),
+        "recorder": tick_recorder.stats() if tick_recorder else None,
+    })
+
+# ================================
+# 📈 Prometheus Metrics
+# ================================
+def _streamer_shards() -> list:
+    if sdk_streamer is None:
+        return []
+    return getattr(sdk_streamer, "shards", None) or [sdk_streamer]
+
+if feed_metrics is not None:
+    feed_metrics.add_collector(
+        "reconnects_total", "Active upstream socket swaps (standby, reconnect, token rotation).",
+        lambda: {s.shard: s.failovers.count for s in _streamer_shards()}, kind="counter", label="shard")
+    feed_metrics.add_collector(
+        "connected", "1 while the shard's active upstream socket is open.",
+        lambda: {s.shard: int(bool(s.active and s.active.alive())) for s in _streamer_shards()}, label="shard")
+    feed_metrics.add_collector(
+        "subscribed_keys", "Instrument keys subscribed upstream.",
+        lambda: {s.shard: len(s.subscribed_keys) for s in _streamer_shards()}, label="shard")
+    feed_metrics.add_collector(
+        "subscription_owners", "Clients holding at least one subscription.", lambda: len(subscriptions.owners))
+    feed_metrics.add_collector("clients", "Connected Socket.IO clients.", lambda: len(outbound.clients))
+    feed_metrics.add_collector(
+        "slow_clients", "Socket.IO clients currently on merged (deferred) delivery.",
+        lambda: sum(1 for o in list(outbound.clients.values()) if o.slow))
+    feed_metrics.add_collector(
+        "decode_dropped_frames_total", "Frames dropped because the decode pool queue was full.",
+        lambda: decode_pool.frames_dropped if decode_pool else None, kind="counter")
+
+@app.route("/metrics", methods=["GET"])
+def metrics():
+    if feed_metrics is None:
+        return Response("metrics disabled (UPSTOX_METRICS=0)\n", status=404, mimetype="text/plain")
+    return Response(feed_metrics.render(), mimetype="text/plain; version=0.0.4; charset=utf-8")
+
+def _request_keys() -> List[str]:
+    """Instrument keys from ?keys=a,b or ?symbols=X,Y query params."""
+    keys = [k.strip() for k in (request.args.get("keys") or "").split(",") if k.strip()]
+    symbols = [s for s in (request.args.get("symbols") or "").split(",") if s.strip()]
+    return keys + symbols_to_keys(symbols)
+
+# ================================
+# 💾 Last-Value Tick Snapshot
+# ================================
+@app.route("/api/ticks/snapshot", methods=["GET", "POST"])
+def ticks_snapshot():
+    """
+    Latest LTP/OHLC/exchange time per instrument from the in-memory cache.
+    GET ?keys=a,b or ?symbols=X,Y; POST {"instrument_keys": [...], "symbols": [...]}.
+    No keys → everything cached.
+    """
+    if request.method == "POST":
+        data = request.get_json(silent=True) or {}
+        keys = list(data.get("instrument_keys") or data.get("instrumentKeys") or [])
+        keys += symbols_to_keys(data.get("symbols") or [])
+    else:
+        keys = _request_keys()
+    with tick_table.lock:
+        ticks = tick_table.snapshot(keys or None)
+    return jsonify({"ticks": ticks, "count": len(ticks), "as_of": time.time()})
+
+@app.route("/api/ticks/history", methods=["GET"])
+def ticks_history():
+    """
+    Intraday ticks for one instrument as compact arrays (ts, ltp, ltq, vtt).
+    ?key= or ?symbol=, optional ?since=<exchange ms> and ?limit=N.
+    """
+    key = request.args.get("key") or SYMBOL_TO_KEY.get((request.args.get("symbol") or "").strip().upper())
+    if not key:
+        return jsonify({"error": "Pass key= or a known symbol="}), 400
+    since = request.args.get("since", type=int)
+    limit = request.args.get("limit", type=int)
+    with tick_table.lock:
+        hist = tick_history.read(key, since=since, limit=limit)
+    if hist is None:
+        return jsonify({"error": f"No history for {key}"}), 404
+    return jsonify(hist)
+
+@app.route("/api/bars", methods=["GET"])
+def bars_history():
+    """
+    Closed OHLCV bars for one instrument plus the bar still forming.
+    ?key= or ?symbol=, ?tf=1s|1m|5m|15m (default 1m), optional ?limit=N.
+    """
+    key = request.args.get("key") or SYMBOL_TO_KEY.get((request.args.get("symbol") or "").strip().upper())
+    if not key:
+        return jsonify({"error": "Pass key= or a known symbol="}), 400
+    tf = request.args.get("tf", "1m")
+    if tf not in bar_builder.by_name:
+        return jsonify({"error": f"Unknown tf {tf}", "timeframes": list(bar_builder.by_name)}), 400
+    limit = request.args.get("limit", type=int)
+    with tick_table.lock:
+        bars = bar_builder.read(key, tf, limit=limit)
+    if bars is None:
+        return jsonify({"error": f"No bars for {key}"}), 404
+    return jsonify(bars)
+
+@app.route("/api/indicators", methods=["GET"])
+def indicators_snapshot():
+    """Live RSI/EMA/SMA/MACD/ADX/BB per instrument (?keys= or ?symbols=)."""
+    keys = _request_keys()
+    if not keys:
+        return jsonify({"error": "Pass keys= or symbols="}), 400
+    with tick_table.lock:
+        values = indicators.snapshot(keys)
+    return jsonify({"tf": indicators.timeframe, "indicators": values, "count": len(values)})
+
+# ================================
+# 📚 Order Book Depth
+# ================================
+@app.route("/api/depth/snapshot", methods=["GET"])
+def depth_snapshot():
+    keys = _request_keys()
+    if not keys:
+        return jsonify({"error": "Pass keys= or symbols="}), 400
+    levels = request.args.get("levels", type=int)
+    with tick_table.lock:
+        depth = order_books.snapshot(keys, levels)
+    return jsonify({"levels": order_books.levels, "depth": depth})
+
+# ================================
+# 🧮 Option Greeks / OI
+# ================================
+def _match_chains(underlying: str, expiry: str = None) -> List[str]:
+    underlying = (underlying or "").strip().upper()
+    return [
+        c for c in OPTION_CHAINS
+        if c.split("|", 1)[0].upper() == underlying and (not expiry or c.endswith(f"|{expiry}"))
+    ]
+
+@app.route("/api/options/greeks", methods=["GET"])
+def options_greeks():
+    """Precomputed chain aggregates (net delta/gamma, PCR, IV smile) for an underlying."""
+    underlying = request.args.get("underlying")
+    if not underlying:
+        return jsonify({"error": "Missing underlying"}), 400
+    try:
+        expiry = normalize_date(request.args.get("expiry"))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    chains = _match_chains(underlying, expiry)
+    snaps = {c: option_greeks.snapshots[c] for c in chains if c in option_greeks.snapshots}
+    return jsonify({"chains": snaps, "available": chains})
+
+@socketio.on("subscribe_option_chain")
+def sio_subscribe_option_chain(payload):
+    """Subscribe every contract of an underlying/expiry in option_greeks mode."""
+    payload = payload or {}
+    try:
+        expiry = normalize_date(payload.get("expiry"))
+    except ValueError as e:
+        emit("option_chain_error", {"error": str(e)})
+        return
+    chains = _match_chains(payload.get("underlying"), expiry)
+    for chain in chains:
+        join_room(f"oc:{chain}")
+        acquire_keys(request.sid, OPTION_CHAINS[chain])
+        if chain in option_greeks.snapshots:
+            emit("greeks_update", {chain: option_greeks.snapshots[chain]})
+    emit("option_chain_subscribed", {"chains": chains})
+
+@socketio.on("unsubscribe_option_chain")
+def sio_unsubscribe_option_chain(payload):
+    payload = payload or {}
+    try:
+        expiry = normalize_date(payload.get("expiry"))
+    except ValueError as e:
+        emit("option_chain_error", {"error": str(e)})
+        return
+    chains = _match_chains(payload.get("underlying"), expiry)
+    for chain in chains:
+        leave_room(f"oc:{chain}")
+        release_keys(request.sid, OPTION_CHAINS[chain])
+    emit("option_chain_unsubscribed", {"chains": chains})
+
 # ================================
 # 🟢 Dynamic Subscribe/Unsubscribe via REST (optional) + SocketIO
 # ================================
@@ -645,6 +1716,127 @@ def symbols_to_keys(symbols: List[str]) -> List[str]:
             keys.append(k)
     return keys
 
+# ================================
+# 🌱 Indicator warm-up from yfinance
+# ================================
+KEY_TO_SYMBOL = {key: sym for sym, key in SYMBOL_TO_KEY.items()}
+YF_INDEX_TICKERS = {
+    "NSE_INDEX|Nifty 50": "^NSEI",
+    "NSE_INDEX|Nifty Bank": "^NSEBANK",
+    "NSE_INDEX|SENSEX": "^BSESN",
+    "BSE_INDEX|SENSEX": "^BSESN",
+}
+# Indicator timeframe → (yfinance interval, longest period Yahoo serves at that interval)
+YF_INTERVALS = {
+    "1m": ("1m", "5d"), "2m": ("2m", "1mo"), "5m": ("5m", "1mo"),
+    "15m": ("15m", "1mo"), "30m": ("30m", "1mo"), "60m": ("60m", "3mo"), "1h": ("60m", "3mo"),
+}
+
+def yf_ticker(key: str):
+    if key in YF_INDEX_TICKERS:
+        return YF_INDEX_TICKERS[key]
+    sym = KEY_TO_SYMBOL.get(key)
+    return f"{sym}.NS" if sym else None
+
+def seed_indicators(keys: List[str]):
+    """
+    Background task for newly subscribed keys: download recent bars of the
+    indicator timeframe and replay them into IndicatorEngine, so RSI / MACD /
+    ADX / bands have values from the first live tick instead of after their
+    warm-up. Keys that already committed a live bar (or have no Yahoo
+    ticker, e.g. option contracts) are skipped.
+    """
+    spec = YF_INTERVALS.get(indicators.timeframe)
+    if spec is None:
+        return
+    interval, period = spec
+    todo = {}
+    with tick_table.lock:
+        for key in keys:
+            s = tick_table.slots.get(key)
+            if s is not None and s < indicators.capacity and indicators.count[s]:
+                continue
+            ticker = yf_ticker(key)
+            if ticker:
+                todo[key] = ticker
+    if not todo:
+        return
+    try:
+        df = run_blocking(
+            yf.download, sorted(set(todo.values())), period=period, interval=interval,
+            group_by="ticker", auto_adjust=False, progress=False, threads=False,
+        )
+    except Exception as e:
+        print(f"⚠️ Indicator seed download failed for {len(todo)} key(s):", e)
+        return
+    if df is None or df.empty:
+        return
+    series = {}
+    for key, ticker in todo.items():
+        try:
+            bars = df[ticker] if isinstance(df.columns, pd.MultiIndex) else df
+            bars = bars.dropna(subset=["High", "Low", "Close"]).tail(UPSTOX_INDICATOR_SEED_BARS)
+        except KeyError:
+            continue
+        if bars.empty:
+            continue
+        t_ms = np.array([ts.value // 1_000_000 for ts in bars.index], dtype=np.int64)  # bar start, UTC epoch ms
+        series[key] = (t_ms, bars["High"].to_numpy(), bars["Low"].to_numpy(), bars["Close"].to_numpy())
+    if not series:
+        return
+    # Replayed off the lock, all keys at once; tick_table.lock is only taken to copy the state in
+    counts = indicators.seed_many(series)
+    seeded = sum(1 for n in counts.values() if n)
+    if seeded:
+        print(f"🌱 Seeded {indicators.timeframe} indicators for {seeded}/{len(todo)} key(s) from yfinance")
+
+# Upstream sub/unsub only happens when a key's watcher count crosses zero
+subscriptions = SubscriptionRegistry()
+
+def _upstream_sub(keys: List[str]):
+    if sdk_streamer:
+        sdk_streamer.subscribe(keys)
+
+def _upstream_unsub(keys: List[str]):
+    if sdk_streamer:
+        sdk_streamer.unsubscribe(keys)
+
+# The upstream command is queued under the registry lock: a key dropped to 0 and
+# taken back to 1 by two callers reaches the streamer as unsub, then sub
+def acquire_keys(owner: str, keys: List[str]) -> List[str]:
+    added = subscriptions.acquire(owner, keys, on_added=_upstream_sub)
+    if added and UPSTOX_INDICATOR_SEED:
+        socketio.start_background_task(seed_indicators, added)
+    return added
+
+def release_keys(owner: str, keys: List[str] = None) -> List[str]:
+    if keys is None:
+        return subscriptions.release_owner(owner, on_removed=_upstream_unsub)
+    return subscriptions.release(owner, keys, on_removed=_upstream_unsub)
+
+def _http_owner(data: dict) -> str:
+    """HTTP callers are identified by an optional client_id, else their address."""
+    return f"http:{data.get('client_id') or request.remote_addr}"
+
+# Socket.IO sid → HTTP owner that first named it on /api/alerts
+alert_sid_callers: Dict[str, str] = {}
+
+def _alerts_owner(data: dict) -> str:
+    """
+    Rule owner for an /api/alerts call: the caller's HTTP owner, or a
+    connected Socket.IO sid, which stays bound to the first caller that
+    named it. Raises PermissionError for any other sid.
+    """
+    caller = _http_owner(data)
+    sid = data.get("sid")
+    if not sid:
+        return caller
+    if sid not in outbound:
+        raise PermissionError("Unknown Socket.IO session")
+    if alert_sid_callers.setdefault(sid, caller) != caller:
+        raise PermissionError("Socket.IO session is bound to another caller")
+    return sid
+
 @app.route("/api/subscribe", methods=["POST"])
 def subscribe_http():
     if not sdk_streamer:
@@ -657,8 +1849,8 @@ def subscribe_http():
     if not keys:
         return jsonify({"error": "No valid instrument keys"}), 400
 
-    sdk_streamer.subscribe(keys)
-    print(f"📡 HTTP subscribe: {keys}")
+    added = acquire_keys(_http_owner(data), keys)
+    print(f"📡 HTTP subscribe: {len(keys)} keys ({len(added)} new upstream)")
     return jsonify({"ok": True, "subscribed": keys}), 200
 
 @app.route("/api/unsubscribe", methods=["POST"])
@@ -673,18 +1865,123 @@ def unsubscribe_http():
     if not keys:
         return jsonify({"error": "No valid instrument keys"}), 400
 
-    sdk_streamer.unsubscribe(keys)
-    print(f"📴 HTTP unsubscribe: {keys}")
-    return jsonify({"ok": True, "unsubscribed": keys}), 200
+    removed = release_keys(_http_owner(data), keys)
+    print(f"📴 HTTP unsubscribe: {len(keys)} keys ({len(removed)} released upstream)")
+    return jsonify({"ok": True, "unsubscribed": keys, "released": removed}), 200
+
+# ================================
+# 🚨 Alerts / Screener Rules
+# ================================
+def _alert_rules(rules: list) -> list:
+    """Resolve "symbol" → "key" on incoming rule specs."""
+    out = []
+    for r in rules or []:
+        r = dict(r or {})
+        if not r.get("key") and r.get("symbol"):
+            r["key"] = SYMBOL_TO_KEY.get(str(r["symbol"]).strip().upper())
+        out.append(r)
+    return out
+
+def register_alerts(owner: str, rules: list) -> list:
+    """Store rules and keep their instruments subscribed under an "alerts:" owner."""
+    added = alert_engine.add(owner, _alert_rules(rules))
+    acquire_keys(f"alerts:{owner}", [r["key"] for r in added])
+    return added
+
+def remove_alerts(owner: str, rule_ids: list = None) -> list:
+    removed = alert_engine.remove(owner, rule_ids)
+    held = subscriptions.owned(f"alerts:{owner}")
+    release_keys(f"alerts:{owner}", list(held - alert_engine.keys_for(owner)))
+    return removed
+
+@app.route("/api/alerts", methods=["GET", "POST", "DELETE"])
+def alerts_http():
+    """
+    POST {"rules": [{"symbol"|"key", "field", "op", "value", "once"}], "sid"?, "client_id"?}
+    GET  ?client_id= → active rules + recently fired; DELETE {"ids": [...]} (no ids → all).
+    Passing a Socket.IO "sid" delivers alert_fired to that session; the sid
+    must be connected and is bound to the first client_id (or address) using it.
+    """
+    data = request.get_json(silent=True) or {}
+    if request.method == "GET":
+        data = {"client_id": request.args.get("client_id"), "sid": request.args.get("sid")}
+    try:
+        owner = _alerts_owner(data)
+    except PermissionError as e:
+        return jsonify({"error": str(e)}), 403
+    if request.method == "POST":
+        try:
+            added = register_alerts(owner, data.get("rules") or [])
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+        return jsonify({"ok": True, "rules": added}), 200
+    if request.method == "DELETE":
+        return jsonify({"ok": True, "removed": remove_alerts(owner, data.get("ids"))}), 200
+    return jsonify({
+        "rules": alert_engine.rules(owner),
+        "fired": alert_engine.recent(owner, request.args.get("limit", 100, type=int)),
+    })
+
+@socketio.on("register_alerts")
+def sio_register_alerts(payload):
+    rules = payload if isinstance(payload, list) else (payload or {}).get("rules", [])
+    try:
+        added = register_alerts(request.sid, rules)
+    except ValueError as e:
+        emit("alert_error", {"error": str(e)})
+        return
+    emit("alerts_registered", {"rules": added})
+
+@socketio.on("remove_alerts")
+def sio_remove_alerts(payload):
+    ids = payload if isinstance(payload, list) else (payload or {}).get("ids")
+    emit("alerts_removed", {"ids": remove_alerts(request.sid, ids)})
+
+def _move_room(old_room, new_room):
+    """Switch the current Socket.IO session between watchlist rooms."""
+    if old_room and old_room != new_room:
+        leave_room(old_room)
+    if new_room and new_room != old_room:
+        join_room(new_room)
 
 # Socket.IO: dynamic subs from React
 @socketio.on("subscribe_symbols")
 def sio_subscribe_symbols(payload):
     symbols = payload if isinstance(payload, list) else payload.get("symbols", [])
     keys = symbols_to_keys(symbols)
-    if keys and sdk_streamer:
-        sdk_streamer.subscribe(keys)
-    socketio.emit("subscribed", {"keys": keys})
+    if keys:
+        _move_room(*tick_rooms.add_keys(request.sid, keys))
+        acquire_keys(request.sid, keys)
+    emit("subscribed", {"keys": keys})
+    if keys:
+        # Hydrate from the last-value cache instead of waiting for the next frame
+        with tick_table.lock:
+            snapshot = tick_table.snapshot(keys)
+        if snapshot:
+            emit("tick_update", snapshot)
+
+@socketio.on("unsubscribe_symbols")
+def sio_unsubscribe_symbols(payload):
+    symbols = payload if isinstance(payload, list) else payload.get("symbols", [])
+    keys = symbols_to_keys(symbols)
+    if keys:
+        _move_room(*tick_rooms.remove_keys(request.sid, keys))
+        release_keys(request.sid, keys)
+    emit("unsubscribed", {"keys": keys})
+
+@socketio.on("connect")
+def sio_connect():
+    outbound.add(request.sid)
+
+@socketio.on("disconnect")
+def sio_disconnect():
+    outbound.drop(request.sid)
+    tick_rooms.drop(request.sid)
+    alert_sid_callers.pop(request.sid, None)
+    alert_engine.remove(request.sid)
+    released = release_keys(request.sid) + release_keys(f"alerts:{request.sid}")
+    if released:
+        print(f"🔌 Client {request.sid} left — released {len(released)} upstream keys")
 
 @app.route("/api/history/download", methods=["GET"])
 def download_history_excel():
@@ -711,7 +2008,8 @@ def download_history_excel():
         buffered_end = end_dt + timedelta(days=2)
 
         # ✅ Fetch data
-        df = yf.download(
+        df = run_blocking(
+            yf.download,
             ticker,
             start=buffered_start.strftime("%Y-%m-%d"),
             end=buffered_end.strftime("%Y-%m-%d"),
@@ -848,26 +2146,30 @@ def download_history_excel():
         print(f"🕯️ {len(candle_funcs)} candlestick columns added.")
 
         # === Excel Export ===
-        output = BytesIO()
-        with pd.ExcelWriter(output, engine="xlsxwriter") as writer:
-            df.to_excel(writer, index=False, sheet_name="StockData")
-            workbook = writer.book
-            worksheet = writer.sheets["StockData"]
-
-            header_format = workbook.add_format({
-                "bold": True,
-                "text_wrap": True,
-                "valign": "top",
-                "fg_color": "#007ACC",
-                "font_color": "white",
-                "border": 1
-            })
-
-            for col_num, value in enumerate(df.columns.values):
-                worksheet.write(0, col_num, value, header_format)
-                worksheet.set_column(col_num, col_num, 14)
-
-        output.seek(0)
+        def build_workbook() -> BytesIO:
+            output = BytesIO()
+            with pd.ExcelWriter(output, engine="xlsxwriter") as writer:
+                df.to_excel(writer, index=False, sheet_name="StockData")
+                workbook = writer.book
+                worksheet = writer.sheets["StockData"]
+
+                header_format = workbook.add_format({
+                    "bold": True,
+                    "text_wrap": True,
+                    "valign": "top",
+                    "fg_color": "#007ACC",
+                    "font_color": "white",
+                    "border": 1
+                })
+
+                for col_num, value in enumerate(df.columns.values):
+                    worksheet.write(0, col_num, value, header_format)
+                    worksheet.set_column(col_num, col_num, 14)
+
+            output.seek(0)
+            return output
+
+        output = run_blocking(build_workbook)
         filename = f"{symbol}_{start}_to_{end}_TechnicalData.xlsx"
 
         return send_file(
@@ -951,7 +2253,7 @@ def predict_lstm():
             data = request.get_json()
             start = data.get("start")
             end = data.get("end")
-            df = yf.download(f"{symbol}.NS", start=start, end=end, auto_adjust=True)
+            df = run_blocking(yf.download, f"{symbol}.NS", start=start, end=end, auto_adjust=True)
 
         df.dropna(subset=["Open", "High", "Low", "Close", "Volume"], inplace=True)
         df.reset_index(drop=True, inplace=True)
@@ -959,16 +2261,16 @@ def predict_lstm():
         # Load or train model
         if os.path.exists(model_path) and os.path.exists(scaler_path):
             print(f"📦 Loading existing model and scaler for {symbol}...")
-            model = load_model(model_path)
+            model = run_blocking(load_model, model_path)
             scaler = joblib.load(scaler_path)
         else:
-            model, scaler = train_and_save_model(symbol, df)
+            model, scaler = run_blocking(train_and_save_model, symbol, df)
 
         # Predict next day's open
         scaled = scaler.transform(df[["Open", "High", "Low", "Close", "Volume"]])
         last_60 = scaled[-60:]
         next_input = np.expand_dims(last_60, axis=0)
-        predicted_scaled = model.predict(next_input, verbose=0)
+        predicted_scaled = run_blocking(model.predict, next_input, verbose=0)
         predicted_open = scaler.inverse_transform(
             np.concatenate([predicted_scaled, np.zeros((1, 4))], axis=1)
         )[0, 0]
@@ -1062,7 +2364,7 @@ def predict_transformer():
             symbol = data.get("symbol", "CUSTOM")
             start = data.get("start", "1925-01-01")
             end = data.get("end", datetime.now().strftime("%Y-%m-%d"))
-            df = yf.download(f"{symbol}.NS", start=start, end=end, auto_adjust=True)
+            df = run_blocking(yf.download, f"{symbol}.NS", start=start, end=end, auto_adjust=True)
 
         df = df.dropna(subset=["Open", "High", "Low", "Close", "Volume"])
         df.reset_index(drop=True, inplace=True)
@@ -1072,16 +2374,16 @@ def predict_transformer():
 
         if os.path.exists(model_path) and os.path.exists(scaler_path):
             print(f"📦 Loading existing Transformer model for {symbol}...")
-            model = load_model(model_path)
+            model = run_blocking(load_model, model_path)
             scaler = joblib.load(scaler_path)
         else:
-            model, scaler = train_and_save_transformer(symbol, df)
+            model, scaler = run_blocking(train_and_save_transformer, symbol, df)
 
         scaled = scaler.transform(df[["Open", "High", "Low", "Close", "Volume"]])
         last_60 = scaled[-60:]
         next_input = np.expand_dims(last_60, axis=0)
 
-        predicted_scaled = model.predict(next_input, verbose=0)
+        predicted_scaled = run_blocking(model.predict, next_input, verbose=0)
         predicted_open = scaler.inverse_transform(
             np.concatenate([predicted_scaled, np.zeros((1, 4))], axis=1)
         )[0, 0]
@@ -1199,7 +2501,7 @@ def index_summary():
 
         for name, ticker in INDEX_MAP.items():
             try:
-                data = yf.download(ticker, period="5d", interval="1d", progress=False)
+                data = run_blocking(yf.download, ticker, period="5d", interval="1d", progress=False)
                 if len(data) >= 2:
                     prev_close = float(data["Close"].iloc[-2])
                     latest = data.iloc[-1]
@@ -1302,15 +2604,7 @@ def handle_root_or_callback():
                 update_env_access_token()
 
                 # Restart streamer and index feed
-                global sdk_streamer
-                try:
-                    if sdk_streamer:
-                        sdk_streamer.shutdown()
-                except Exception:
-                    pass
-
-                sdk_streamer = UpstoxStreamer(os.environ["UPSTOX_ACCESS_TOKEN"])
-                sdk_streamer.start()
+                start_streamer(os.environ["UPSTOX_ACCESS_TOKEN"])
                 start_index_feed()
 
                 return redirect(f"/login-success?token={token_data['access_token']}")
@@ -1435,14 +2729,7 @@ def exchange_token():
             update_env_access_token()
 
             # 🔄 (Re)start streamer and index feed
-            global sdk_streamer
-            try:
-                if sdk_streamer:
-                    sdk_streamer.shutdown()
-            except Exception:
-                pass
-            sdk_streamer = UpstoxStreamer(os.environ["UPSTOX_ACCESS_TOKEN"])
-            sdk_streamer.start()
+            start_streamer(os.environ["UPSTOX_ACCESS_TOKEN"])
             start_index_feed()
 
             return f"""
@@ -1461,9 +2748,50 @@ def exchange_token():
 
 # ===== Create WS streamer if we have a valid token =====
 sdk_streamer = None
-if UPSTOX_ACCESS_TOKEN and len(UPSTOX_ACCESS_TOKEN) >= 20:
-    sdk_streamer = UpstoxStreamer(UPSTOX_ACCESS_TOKEN)
+
+def upstream_connections() -> tuple[int, int]:
+    """
+    Upstox sockets this configuration holds: (steady state, peak during a
+    token rotation). Shards rotate one at a time, and a lone streamer drops
+    its standby before opening the overlap socket.
+    """
+    steady = UPSTOX_SHARDS + (1 if UPSTOX_WS_STANDBY else 0)
+    if not UPSTOX_SHARED_INDEX_FEED and UPSTOX_ASYNC_MODE == "threading":
+        steady += 1  # dedicated index_feed_loop socket
+    overlap = 0 if UPSTOX_SHARDS == 1 and UPSTOX_WS_STANDBY else 1
+    return steady, steady + overlap
+
+def start_streamer(access_token: str):
+    """
+    Start the upstream streamer and restore every key still being watched.
+    A running streamer rotates onto the new token instead of restarting.
+    """
+    global sdk_streamer
+    if sdk_streamer and sdk_streamer.is_alive() and not sdk_streamer.stop_event.is_set():
+        sdk_streamer.rotate_token(access_token)
+        return sdk_streamer
+    steady, peak = upstream_connections()
+    if UPSTOX_MAX_CONNECTIONS and steady > UPSTOX_MAX_CONNECTIONS:
+        print(f"❌ UPSTOX_SHARDS={UPSTOX_SHARDS} with UPSTOX_WS_STANDBY={int(UPSTOX_WS_STANDBY)} needs {steady} "
+              f"upstream connections, over UPSTOX_MAX_CONNECTIONS={UPSTOX_MAX_CONNECTIONS} — not starting the streamer")
+        return None
+    if UPSTOX_MAX_CONNECTIONS and peak > UPSTOX_MAX_CONNECTIONS:
+        print(f"⚠️ A token rotation briefly needs {peak} upstream connections "
+              f"(UPSTOX_MAX_CONNECTIONS={UPSTOX_MAX_CONNECTIONS}); Upstox may refuse the overlap socket")
+    if UPSTOX_SHARDS > 1:
+        sdk_streamer = ShardedStreamer(access_token, UPSTOX_SHARDS)
+    else:
+        sdk_streamer = new_streamer(access_token)
+    # Snapshot and queue under the registry lock so no acquire/release slips in between
+    with subscriptions.lock:
+        keys = list(subscriptions.counts)
+        if keys:
+            sdk_streamer.subscribe(keys)
     sdk_streamer.start()
+    return sdk_streamer
+
+if UPSTOX_ACCESS_TOKEN and len(UPSTOX_ACCESS_TOKEN) >= 20:
+    start_streamer(UPSTOX_ACCESS_TOKEN)
     start_index_feed()
 else:
     print("⏸️ Not starting UpstoxStreamer — no valid access token yet.")
@@ -1472,11 +2800,16 @@ else:
 # 🚀 MAIN
 # ================================
 if __name__ == "__main__":
-    print("🚀 Server running at http://localhost:5000")
-    socketio.run(
-        app,
-        host="0.0.0.0",
-        port=5000,
-        debug=True,
-        allow_unsafe_werkzeug=True
-    )
+    port = int(os.getenv("PORT", "5000"))
+    print(f"🚀 Server running at http://localhost:{port} ({UPSTOX_ASYNC_MODE} mode)")
+    if UPSTOX_ASYNC_MODE == "threading":
+        # Development server; see docs/production.md for eventlet/gevent + gunicorn
+        socketio.run(
+            app,
+            host="0.0.0.0",
+            port=port,
+            debug=os.getenv("UPSTOX_DEBUG", "1") == "1",
+            allow_unsafe_werkzeug=True
+        )
+    else:
+        socketio.run(app, host="0.0.0.0", port=port, debug=False)
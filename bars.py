@@ -0,0 +1,275 @@
+"""
+Incremental OHLCV bars (1s / 1m / 5m / 15m, ...) built from the live feed.
+
+``BarBuilder.append()`` is a TickTable batch hook: for every timeframe it
+updates the open bar of each ticked slot with a handful of vectorized array
+ops, so the cost per tick is O(1) regardless of history length. Buckets
+come from the exchange trade time (``ltt``), and ``sweep()`` closes bars
+whose bucket has ended according to ``FeedResponse.currentTs`` — wall time
+is never used. Closed bars land in a bounded per-instrument store.
+
+Volume uses cumulative traded volume (``vtt``) deltas when the feed carries
+it (full / option modes) and falls back to summing ``ltq`` for LTPC. A
+trade's ``ltq`` only counts when its ``ltt`` is newer than the last one
+applied to the slot, so snapshots and resends never add volume twice.
+"""
+import numpy as np
+
+BAR_FIELDS = ("t", "open", "high", "low", "close", "volume")
+
+TIMEFRAME_SECONDS = {"s": 1, "m": 60, "h": 3600}
+
+
+def parse_timeframes(spec: str) -> dict:
+    """Parse ``"1s:900,1m:400,5m:100,15m:30"`` into {name: (seconds, closed_bar_capacity)}."""
+    out = {}
+    for part in (spec or "").split(","):
+        part = part.strip()
+        if not part:
+            continue
+        name, _, cap = part.partition(":")
+        name = name.strip()
+        seconds = int(name[:-1]) * TIMEFRAME_SECONDS[name[-1]]
+        out[name] = (seconds, max(int(cap or 500), 1))
+    return out
+
+
+class _ClosedBars:
+    """Ring of closed bars per instrument row for one timeframe."""
+
+    def __init__(self, capacity: int, rows: int = 16):
+        self.capacity = capacity
+        self.rows = 0
+        self.used = 0
+        self._alloc(rows)
+
+    def _alloc(self, rows: int):
+        shape = (rows, self.capacity)
+        fresh = {name: np.zeros(shape, dtype=np.float64) for name in BAR_FIELDS}
+        fresh["t"] = np.zeros(shape, dtype=np.int64)
+        fresh["volume"] = np.zeros(shape, dtype=np.int64)
+        fresh["head"] = np.zeros(rows, dtype=np.int64)
+        fresh["count"] = np.zeros(rows, dtype=np.int64)
+        for name, arr in fresh.items():
+            old = getattr(self, name, None)
+            if old is not None:
+                arr[: self.rows] = old
+            setattr(self, name, arr)
+        self.rows = rows
+
+    def new_row(self) -> int:
+        if self.used >= self.rows:
+            self._alloc(self.rows * 2)
+        self.used += 1
+        return self.used - 1
+
+    def append(self, rows, bars: dict):
+        pos = self.head[rows]
+        for name in BAR_FIELDS:
+            getattr(self, name)[rows, pos] = bars[name]
+        self.head[rows] = (pos + 1) % self.capacity
+        self.count[rows] = np.minimum(self.count[rows] + 1, self.capacity)
+
+    def read(self, r: int, limit: int = None) -> dict:
+        n, h = int(self.count[r]), int(self.head[r])
+        out = {}
+        for name in BAR_FIELDS:
+            arr = getattr(self, name)[r]
+            col = arr[h - n:h] if n < self.capacity else np.concatenate((arr[h:], arr[:h]))
+            out[name] = col[-limit:] if limit else col
+        return out
+
+
+class _Timeframe:
+    """Open-bar columns (one per slot) plus the closed-bar store for one timeframe."""
+
+    def __init__(self, name: str, seconds: int, capacity: int, slots: int):
+        self.name = name
+        self.ms = seconds * 1000
+        self.closed = _ClosedBars(capacity)
+        self.size = 0
+        self._alloc(slots)
+
+    def _alloc(self, slots: int):
+        fresh = {
+            "bucket": np.full(slots, -1, dtype=np.int64),
+            "last_closed": np.full(slots, -1, dtype=np.int64),
+            "open": np.zeros(slots, dtype=np.float64),
+            "high": np.zeros(slots, dtype=np.float64),
+            "low": np.zeros(slots, dtype=np.float64),
+            "close": np.zeros(slots, dtype=np.float64),
+            "volume": np.zeros(slots, dtype=np.int64),
+            "vtt_base": np.zeros(slots, dtype=np.int64),
+            "row": np.full(slots, -1, dtype=np.int64),
+            "dirty": np.zeros(slots, dtype=bool),
+        }
+        for name, arr in fresh.items():
+            old = getattr(self, name, None)
+            if old is not None:
+                arr[: self.size] = old
+            setattr(self, name, arr)
+        self.size = slots
+
+    def update(self, slots, ltt, ltp, ltq, vtt, has_vtt, prev_vtt, closed_out: list):
+        b = ltt // self.ms
+        cur = self.bucket[slots]
+        fresh = b > self.last_closed[slots]
+        roll = fresh & (b > cur)
+        same = fresh & (b == cur)
+
+        rolling_open = roll & (cur >= 0)
+        if rolling_open.any():
+            self.close_bars(slots[rolling_open], closed_out)
+
+        if roll.any():
+            s, p = slots[roll], ltp[roll]
+            base = np.where(prev_vtt[roll] > 0, prev_vtt[roll], vtt[roll] - ltq[roll])
+            self.bucket[s] = b[roll]
+            self.open[s] = p
+            self.high[s] = p
+            self.low[s] = p
+            self.close[s] = p
+            self.vtt_base[s] = base
+            self.volume[s] = np.where(has_vtt[roll], vtt[roll] - base, ltq[roll])
+        if same.any():
+            s, p = slots[same], ltp[same]
+            self.high[s] = np.maximum(self.high[s], p)
+            self.low[s] = np.minimum(self.low[s], p)
+            self.close[s] = p
+            self.volume[s] = np.where(has_vtt[same], vtt[same] - self.vtt_base[s], self.volume[s] + ltq[same])
+        self.dirty[slots[roll | same]] = True
+
+    def close_bars(self, slots, closed_out: list):
+        """Move the open bars of ``slots`` into the closed store and queue bar_close events."""
+        need = slots[self.row[slots] < 0]
+        for s in need.tolist():
+            self.row[s] = self.closed.new_row()
+        bars = {
+            "t": self.bucket[slots] * self.ms,
+            "open": self.open[slots], "high": self.high[slots],
+            "low": self.low[slots], "close": self.close[slots],
+            "volume": self.volume[slots],
+        }
+        self.closed.append(self.row[slots], bars)
+        self.last_closed[slots] = self.bucket[slots]
+        self.bucket[slots] = -1
+        self.dirty[slots] = False
+        closed_out.append((self.name, slots.copy(), {k: v.copy() for k, v in bars.items()}))
+
+
+class BarBuilder:
+    """Multi-timeframe streaming bar aggregator over TickTable slots."""
+
+    def __init__(self, table, timeframes: dict):
+        self.table = table
+        self.capacity = table.capacity
+        self.frames = [_Timeframe(name, sec, cap, self.capacity) for name, (sec, cap) in timeframes.items()]
+        self.by_name = {tf.name: tf for tf in self.frames}
+        self.prev_vtt = np.zeros(self.capacity, dtype=np.int64)
+        # Last trade time whose ltq was counted, per slot
+        self.prev_ltt = np.zeros(self.capacity, dtype=np.int64)
+        # (timeframe, slots, bars) tuples waiting to go out as bar_close
+        self.closed_pending: list = []
+        # Callables (timeframe, slots, bars) run as bars close (indicators, ...)
+        self.close_hooks: list = []
+        table.batch_hooks.append(self.append)
+
+    def _grow(self):
+        cap = self.table.capacity
+        for tf in self.frames:
+            tf._alloc(cap)
+        for name in ("prev_vtt", "prev_ltt"):
+            prev = np.zeros(cap, dtype=np.int64)
+            prev[: self.capacity] = getattr(self, name)
+            setattr(self, name, prev)
+        self.capacity = cap
+
+    def _closed(self, start: int):
+        for tf_name, slots, bars in self.closed_pending[start:]:
+            for hook in self.close_hooks:
+                hook(tf_name, slots, bars)
+
+    # 🧩 TickTable batch hook (called under table.lock)
+    def append(self, slots):
+        if self.table.capacity > self.capacity:
+            self._grow()
+        t = self.table
+        ltt = t.ltt[slots]
+        ok = ltt > 0
+        if not ok.all():
+            slots, ltt = slots[ok], ltt[ok]
+            if len(slots) == 0:
+                return
+        ltp, ltq, vtt = t.ltp[slots], t.ltq[slots], t.vtt[slots]
+        has_vtt = vtt > 0
+        prev_vtt = self.prev_vtt[slots]
+        # A trade already counted (initial_feed snapshot, resubscribe, resend) adds no volume
+        prev_ltt = self.prev_ltt[slots]
+        ltq = np.where(ltt > prev_ltt, ltq, 0)
+        start = len(self.closed_pending)
+        for tf in self.frames:
+            tf.update(slots, ltt, ltp, ltq, vtt, has_vtt, prev_vtt, self.closed_pending)
+        self.prev_vtt[slots] = np.where(has_vtt, vtt, prev_vtt)
+        self.prev_ltt[slots] = np.maximum(ltt, prev_ltt)
+        self._closed(start)
+
+    def sweep(self, exchange_now_ms: int = None):
+        """Close every open bar whose bucket ended before the exchange clock."""
+        now = exchange_now_ms or self.table.exchange_ts
+        if not now:
+            return
+        start = len(self.closed_pending)
+        for tf in self.frames:
+            n = min(len(self.table.keys), tf.size)
+            cur = tf.bucket[:n]
+            done = np.flatnonzero((cur >= 0) & ((cur + 1) * tf.ms <= now))
+            if len(done):
+                tf.close_bars(done, self.closed_pending)
+        self._closed(start)
+
+    # 📦 Payloads
+    def updates(self) -> dict:
+        """Open bars changed since the last call: {key: {tf: bar}} for ``bar_update``."""
+        keys = self.table.keys
+        out: dict[str, dict] = {}
+        for tf in self.frames:
+            slots = np.flatnonzero(tf.dirty[: min(len(keys), tf.size)])
+            if len(slots) == 0:
+                continue
+            tf.dirty[slots] = False
+            cols = [
+                (tf.bucket[slots] * tf.ms).tolist(), tf.open[slots].tolist(), tf.high[slots].tolist(),
+                tf.low[slots].tolist(), tf.close[slots].tolist(), tf.volume[slots].tolist(),
+            ]
+            for i, s in enumerate(slots.tolist()):
+                out.setdefault(keys[s], {})[tf.name] = dict(zip(BAR_FIELDS, (c[i] for c in cols)))
+        return out
+
+    def drain_closed(self) -> dict:
+        """Bars closed since the last call: {key: [{tf, t, open, ...}]} for ``bar_close``."""
+        pending, self.closed_pending = self.closed_pending, []
+        keys = self.table.keys
+        out: dict[str, list] = {}
+        for tf_name, slots, bars in pending:
+            cols = [bars[name].tolist() for name in BAR_FIELDS]
+            for i, s in enumerate(slots.tolist()):
+                bar = {"tf": tf_name, **dict(zip(BAR_FIELDS, (c[i] for c in cols)))}
+                out.setdefault(keys[s], []).append(bar)
+        return out
+
+    def read(self, key: str, tf: str, limit: int = None, partial: bool = True) -> dict:
+        """Closed bars (plus the open one when ``partial``) as column arrays."""
+        frame = self.by_name.get(tf)
+        s = self.table.slots.get(key)
+        if frame is None or s is None or s >= frame.size:
+            return None
+        r = int(frame.row[s])
+        cols = frame.closed.read(r, limit) if r >= 0 else {n: np.zeros(0) for n in BAR_FIELDS}
+        out = {name: cols[name].tolist() for name in BAR_FIELDS}
+        if partial and frame.bucket[s] >= 0:
+            out["partial"] = {
+                "t": int(frame.bucket[s] * frame.ms), "open": float(frame.open[s]),
+                "high": float(frame.high[s]), "low": float(frame.low[s]),
+                "close": float(frame.close[s]), "volume": int(frame.volume[s]),
+            }
+        return {"key": key, "tf": tf, **out}
@@ -0,0 +1,220 @@
+"""
+Inline decode vs. the process-pool decode stage under a synthetic burst.
+
+For each mode, a feeder thread plays synthetic frames at ``--fps`` and
+every ``--burst-every`` seconds pushes ``--burst`` frames back to back, the
+way the websocket callback thread sees market open:
+
+  inline — ParseFromString + TickConflator.on_frame on the feeder thread
+           (today's UPSTOX_DECODE_MODE=columnar path)
+  pool   — DecodePool.submit() on the feeder thread; worker processes
+           decode, the collector thread applies the records
+
+Meanwhile a separate client process calls an HTTP endpoint served from
+this process every ``--http-interval-ms``. The endpoint reads a snapshot
+from the TickTable under its lock, like the Flask handlers do. Reported
+per mode:
+
+  * end-to-end frame latency: frame arrival (burst start for burst
+    frames) → columns written (p50/p99/max)
+  * HTTP round-trip latency seen by the client (p50/p99/max)
+  * frames applied / dropped and the conflator tick count
+
+Usage:
+    python benchmarks/bench_decode_pool.py [--duration 10] [--workers 2] [--mix ltpc|full] [--json]
+"""
+import argparse
+import http.client
+import json
+import multiprocessing as mp
+import os
+import random
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path[:0] = [ROOT, os.path.join(ROOT, "src", "pages"), os.path.dirname(os.path.abspath(__file__))]
+
+import MarketDataFeedV3_pb2 as pb  # noqa: E402
+from bench_feed_decoder import synthetic_frames  # noqa: E402
+from decode_pool import DecodePool  # noqa: E402
+from feed_pipeline import TickConflator  # noqa: E402
+from order_book import OrderBookStore  # noqa: E402
+from tick_table import TickTable  # noqa: E402
+
+
+def ltpc_frames(instruments: int, frames: int, seed: int = 7) -> list[bytes]:
+    """Serialized LTPC-only frames (the default equity subscription mode)."""
+    rnd = random.Random(seed)
+    keys = [f"NSE_EQ|SYN{i:05d}" for i in range(instruments)]
+    out = []
+    for n in range(frames):
+        msg = pb.FeedResponse()
+        msg.type = pb.live_feed
+        msg.currentTs = 1_700_000_000_000 + n
+        for key in rnd.sample(keys, max(1, instruments // 2)):
+            lt = msg.feeds[key].ltpc
+            lt.ltp, lt.ltt, lt.ltq, lt.cp = 100 + rnd.random() * 10, msg.currentTs, rnd.randint(1, 500), 100
+        out.append(msg.SerializeToString())
+    return out
+
+
+def _pct(samples_ns) -> dict:
+    if not len(samples_ns):
+        return {"count": 0}
+    a = np.asarray(samples_ns, dtype=np.float64) / 1e6
+    p50, p99 = np.percentile(a, [50, 99])
+    return {"count": len(a), "p50_ms": round(float(p50), 3), "p99_ms": round(float(p99), 3),
+            "max_ms": round(float(a.max()), 3)}
+
+
+def http_client(port: int, interval_s: float, duration_s: float, out_q):
+    """Runs in its own process so its timing is not skewed by the server's GIL."""
+    conn = http.client.HTTPConnection("127.0.0.1", port, timeout=30)
+    lat = []
+    end = time.perf_counter() + duration_s
+    while time.perf_counter() < end:
+        t0 = time.perf_counter_ns()
+        conn.request("GET", "/snapshot")
+        conn.getresponse().read()
+        lat.append(time.perf_counter_ns() - t0)
+        time.sleep(interval_s)
+    out_q.put(lat)
+
+
+def serve(table: TickTable, keys: list[str]) -> ThreadingHTTPServer:
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+        disable_nagle_algorithm = True  # headers and body go out as separate writes
+
+        def do_GET(self):
+            with table.lock:
+                body = json.dumps(table.snapshot(keys)).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def run_mode(mode: str, frames: list[bytes], args) -> dict:
+    table = TickTable(4096)
+    conflator = TickConflator(table, emit=lambda payload: json.dumps(payload), interval_ms=args.interval_ms)
+    OrderBookStore(table, 5)
+    conflator.start()
+    pool = None
+    if mode == "pool":
+        pool = DecodePool(conflator, workers=args.workers, frame_class=pb.FeedResponse)
+        pool.start()
+        time.sleep(2.0)  # let the spawned workers import protobuf before timing
+
+    # Warm the slots so the HTTP snapshot has something to serialize
+    for raw in frames[:50]:
+        msg = pb.FeedResponse()
+        msg.ParseFromString(raw)
+        conflator.on_frame(msg)
+    server = serve(table, list(table.keys[: args.http_keys]))
+
+    ctx = mp.get_context("spawn")
+    out_q = ctx.Queue()
+    client = ctx.Process(target=http_client, args=(
+        server.server_address[1], args.http_interval_ms / 1000.0, args.duration, out_q))
+    client.start()
+
+    e2e = []
+    submitted = 0
+    period = 1.0 / args.fps
+    start = time.perf_counter()
+    next_frame, next_burst = start, start + args.burst_every
+    i = 0
+    while time.perf_counter() - start < args.duration:
+        now = time.perf_counter()
+        if now >= next_burst:
+            batch, next_burst = args.burst, now + args.burst_every
+        elif now >= next_frame:
+            batch, next_frame = 1, next_frame + period
+        else:
+            time.sleep(min(next_frame, next_burst) - now)
+            continue
+        # Every frame of a burst arrives at once; inline ones wait behind the earlier decodes
+        arrived = time.perf_counter_ns()
+        for _ in range(batch):
+            raw = frames[i % len(frames)]
+            i += 1
+            if pool:
+                pool.submit(raw)
+            else:
+                msg = pb.FeedResponse()
+                msg.ParseFromString(raw)
+                conflator.on_frame(msg)
+                e2e.append(time.perf_counter_ns() - arrived)
+            submitted += 1
+
+    http_lat = out_q.get()
+    client.join()
+    if pool:
+        deadline = time.perf_counter() + 30
+        while pool.frames_applied + pool.frames_dropped < submitted and time.perf_counter() < deadline:
+            time.sleep(0.05)
+        e2e = list(pool.latency_ns)
+        pool_stats = pool.stats()
+        pool.stop()
+    server.shutdown()
+    conflator.stop()
+    return {
+        "mode": mode,
+        "frames_submitted": submitted,
+        "frames_applied": pool_stats["frames_applied"] if pool else submitted,
+        "frames_dropped": pool_stats["frames_dropped"] if pool else 0,
+        "ticks_in": conflator.ticks_in,
+        "frame_latency": _pct(e2e),
+        "http_latency": _pct(http_lat),
+        "pool": pool_stats if pool else None,
+    }
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--duration", type=float, default=10.0, help="seconds per mode")
+    ap.add_argument("--workers", type=int, default=2)
+    ap.add_argument("--mix", choices=("ltpc", "full"), default="ltpc",
+                    help="ltpc-only frames, or every Feed variant (side stores re-parse those)")
+    ap.add_argument("--instruments", type=int, default=500)
+    ap.add_argument("--fps", type=float, default=50.0, help="steady frames/s")
+    ap.add_argument("--burst", type=int, default=1000, help="frames pushed back to back per burst")
+    ap.add_argument("--burst-every", type=float, default=2.0, help="seconds between bursts")
+    ap.add_argument("--interval-ms", type=int, default=250, help="conflation window")
+    ap.add_argument("--http-interval-ms", type=float, default=5.0)
+    ap.add_argument("--http-keys", type=int, default=50, help="instruments in each HTTP snapshot")
+    ap.add_argument("--modes", default="inline,pool")
+    ap.add_argument("--json", action="store_true")
+    args = ap.parse_args()
+
+    make = ltpc_frames if args.mix == "ltpc" else synthetic_frames
+    frames = make(args.instruments, 2000)
+    results = [run_mode(m.strip(), frames, args) for m in args.modes.split(",") if m.strip()]
+    if args.json:
+        print(json.dumps({"params": vars(args), "results": results}, indent=2))
+        return
+    print(f"{args.mix} frames, {args.instruments} instruments, {args.fps} fps + {args.burst}-frame "
+          f"bursts every {args.burst_every}s, {args.duration}s per mode")
+    for r in results:
+        f, h = r["frame_latency"], r["http_latency"]
+        print(f"  {r['mode']:<7} frames {r['frames_applied']}/{r['frames_submitted']} "
+              f"(dropped {r['frames_dropped']})  frame p50 {f.get('p50_ms')} p99 {f.get('p99_ms')} ms  "
+              f"HTTP p50 {h.get('p50_ms')} p99 {h.get('p99_ms')} max {h.get('max_ms')} ms")
+
+
+if __name__ == "__main__":
+    main()
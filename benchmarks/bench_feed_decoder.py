@@ -0,0 +1,153 @@
+"""
+Microbenchmark: MessageToDict walk vs. the direct-field feed_decoder.
+
+Builds a set of synthetic FeedResponse frames (one per Feed variant mix),
+serializes them, then times parse + decode for:
+
+  * messagetodict   — ParseFromString + MessageToDict + dict walk
+                      (the old index_feed_loop path)
+  * index_ticks     — ParseFromString + feed_decoder.index_ticks
+  * decode_response — ParseFromString + feed_decoder.decode_feed_response
+
+Usage:
+    python benchmarks/bench_feed_decoder.py [--instruments 200] [--frames 2000] [--json]
+    python benchmarks/bench_feed_decoder.py --recording recordings/2025-01-10 [--frames 50000]
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path[:0] = [ROOT, os.path.join(ROOT, "src", "pages")]
+
+from google.protobuf.json_format import MessageToDict  # noqa: E402
+
+import MarketDataFeedV3_pb2 as pb  # noqa: E402
+from feed_decoder import decode_feed_response, index_ticks, parse_frame  # noqa: E402
+
+
+def synthetic_frames(instruments: int, frames: int, seed: int = 7) -> list[bytes]:
+    """Serialized FeedResponse frames mixing every Feed variant."""
+    rnd = random.Random(seed)
+    keys = [f"NSE_EQ|SYN{i:05d}" for i in range(instruments)]
+    index_keys = ["NSE_INDEX|Nifty 50", "NSE_INDEX|Nifty Bank", "NSE_INDEX|SENSEX"]
+    out = []
+    for n in range(frames):
+        msg = pb.FeedResponse()
+        msg.type = pb.live_feed
+        msg.currentTs = 1_700_000_000_000 + n
+        for key in index_keys:
+            ff = msg.feeds[key].fullFeed.indexFF
+            ff.ltpc.ltp = 20000 + rnd.random() * 100
+            ff.ltpc.ltt = msg.currentTs
+            ff.ltpc.cp = 20000
+            bar = ff.marketOHLC.ohlc.add()
+            bar.interval, bar.open, bar.high, bar.low, bar.close = "1d", 20000, 20100, 19900, 20050
+        for key in rnd.sample(keys, max(1, instruments // 4)):
+            variant = rnd.randrange(3)
+            price = 100 + rnd.random() * 10
+            if variant == 0:
+                lt = msg.feeds[key].ltpc
+            elif variant == 1:
+                mff = msg.feeds[key].fullFeed.marketFF
+                lt = mff.ltpc
+                for lvl in range(5):
+                    q = mff.marketLevel.bidAskQuote.add()
+                    q.bidP, q.bidQ = price - 0.05 * (lvl + 1), 100 * (lvl + 1)
+                    q.askP, q.askQ = price + 0.05 * (lvl + 1), 90 * (lvl + 1)
+                bar = mff.marketOHLC.ohlc.add()
+                bar.interval, bar.open, bar.high, bar.low, bar.close = "1d", 100, 110, 99, price
+                mff.vtt, mff.tbq, mff.tsq, mff.atp = 10_000 + n, 5000, 4000, price
+            else:
+                flg = msg.feeds[key].firstLevelWithGreeks
+                lt = flg.ltpc
+                flg.optionGreeks.delta, flg.optionGreeks.gamma = 0.5, 0.01
+                flg.oi, flg.iv = 12345, 0.18
+                flg.firstDepth.bidP, flg.firstDepth.askP = price - 0.05, price + 0.05
+            lt.ltp, lt.ltt, lt.ltq, lt.cp = price, msg.currentTs, rnd.randint(1, 500), 100
+        out.append(msg.SerializeToString())
+    return out
+
+
+def messagetodict_walk(raw: bytes) -> dict:
+    """The pre-decoder index_feed_loop path."""
+    feed_resp = pb.FeedResponse()
+    feed_resp.ParseFromString(raw)
+    feed_dict = MessageToDict(feed_resp)
+    parsed = {}
+    for key, feed in (feed_dict.get("feeds") or {}).items():
+        full_feed = feed.get("fullFeed", {})
+        if "indexFF" in full_feed:
+            idx = full_feed["indexFF"]
+            ltpc = idx.get("ltpc", {})
+            ohlc = idx.get("marketOHLC", {}).get("ohlc", [])
+            parsed[key] = {
+                "ltp": round(float(ltpc.get("ltp", 0.0)), 2),
+                "open": ohlc[0].get("open") if ohlc else None,
+                "high": ohlc[0].get("high") if ohlc else None,
+                "low": ohlc[0].get("low") if ohlc else None,
+                "close": ohlc[0].get("close") if ohlc else None,
+            }
+    return parsed
+
+
+CASES = {
+    "messagetodict": messagetodict_walk,
+    "index_ticks": lambda raw: index_ticks(parse_frame(raw)),
+    "decode_response": lambda raw: decode_feed_response(parse_frame(raw)),
+}
+
+
+def run(frames: list[bytes], repeat: int) -> dict:
+    results = {}
+    for name, fn in CASES.items():
+        best = float("inf")
+        for _ in range(repeat):
+            t0 = time.perf_counter()
+            for raw in frames:
+                fn(raw)
+            best = min(best, time.perf_counter() - t0)
+        results[name] = {
+            "frames_per_s": round(len(frames) / best, 1),
+            "us_per_frame": round(best / len(frames) * 1e6, 2),
+        }
+    base = results["messagetodict"]["us_per_frame"]
+    for r in results.values():
+        r["speedup_vs_messagetodict"] = round(base / r["us_per_frame"], 2)
+    return results
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--instruments", type=int, default=200)
+    ap.add_argument("--frames", type=int, default=2000)
+    ap.add_argument("--repeat", type=int, default=3)
+    ap.add_argument("--recording", nargs="+", help="use frames from tick_recorder segments instead")
+    ap.add_argument("--json", action="store_true", help="print machine-readable results")
+    args = ap.parse_args()
+
+    if args.recording:
+        from tick_replay import iter_frames, recording_files
+        frames = []
+        for path in recording_files(args.recording):
+            frames += [bytes(view) for _, view in iter_frames(path)]
+            if len(frames) >= args.frames:
+                break
+        frames = frames[: args.frames]
+    else:
+        frames = synthetic_frames(args.instruments, args.frames)
+    results = run(frames, args.repeat)
+    if args.json:
+        print(json.dumps({"frames": len(frames), "results": results}, indent=2))
+        return
+    print(f"{len(frames)} frames, {sum(map(len, frames)) / len(frames):.0f} bytes avg")
+    for name, r in results.items():
+        print(f"  {name:<16} {r['us_per_frame']:>9.2f} µs/frame  "
+              f"{r['frames_per_s']:>10.1f} frames/s  x{r['speedup_vs_messagetodict']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,314 @@
+"""
+End-to-end fan-out load test: feed_simulator → app.py → N Socket.IO clients.
+
+Starts the feed simulator and app.py as subprocesses. app.py is pointed at
+the simulator and at a synthetic instruments file (SIM00000, SIM00001,
+...) purely through env vars. Then, for each concurrency level, it opens
+that many asyncio Socket.IO clients, each sending ``subscribe_symbols`` with
+a watchlist drawn from a Zipf-like popularity curve, so popular names
+overlap the way real watchlists do. For ``--duration`` seconds it measures:
+
+  * tick-to-client latency (client receive time − exchange ``ltt`` stamped
+    by the simulator; includes the conflation window) p50/p90/p99/max
+  * messages/s and instrument updates/s delivered to clients
+  * late updates (latency > ``--late-ms``) and subscribed keys that never
+    received an update during the window
+  * server CPU % and RSS (app process tree, via psutil)
+
+Results are JSON (``--json out.json``) so runs can be diffed across releases.
+
+Usage:
+    python benchmarks/fanout_load.py [--levels 100,250,500,1000] [--duration 20]
+                                     [--symbols-per-client 20] [--json results.json]
+    python benchmarks/fanout_load.py --async-mode eventlet --gunicorn --json eventlet.json
+Needs python-socketio[asyncio_client] (aiohttp), psutil, requests and websockets.
+"""
+import argparse
+import asyncio
+import gzip
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+import requests
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def write_instruments(path: str, universe: int) -> list[str]:
+    """Synthetic NSE_EQ instrument file matching the simulator's key scheme."""
+    symbols = [f"SIM{i:05d}" for i in range(universe)]
+    rows = [{
+        "segment": "NSE_EQ", "exchange": "NSE", "instrument_type": "EQ",
+        "trading_symbol": s, "instrument_key": f"NSE_EQ|{s}", "name": s, "short_name": s,
+    } for s in symbols]
+    with gzip.open(path, "wt", encoding="utf-8") as f:
+        json.dump(rows, f)
+    return symbols
+
+
+def watchlist(rnd: random.Random, symbols: list[str], weights: list[float], size: int) -> list[str]:
+    picked = set()
+    while len(picked) < min(size, len(symbols)):
+        picked.update(rnd.choices(symbols, weights=weights, k=size - len(picked)))
+    return sorted(picked)
+
+
+def _git_rev() -> str:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, text=True).strip()
+    except Exception:
+        return ""
+
+
+class ServerProbe:
+    """CPU/RSS sampler over the app process and its children (werkzeug reloader, ...)."""
+
+    def __init__(self, pid: int):
+        import psutil
+        self.psutil = psutil
+        self.root = psutil.Process(pid)
+        # cpu_percent() measures since the previous call on the same object, so keep them
+        self.known: dict[int, object] = {pid: self.root}
+
+    def _procs(self):
+        try:
+            procs = [self.root] + self.root.children(recursive=True)
+        except self.psutil.NoSuchProcess:
+            return []
+        return [self.known.setdefault(p.pid, p) for p in procs]
+
+    def prime(self):
+        for p in self._procs():
+            p.cpu_percent(None)
+
+    def sample(self) -> tuple[float, float]:
+        cpu = rss = 0.0
+        for p in self._procs():
+            try:
+                cpu += p.cpu_percent(None)
+                rss += p.memory_info().rss
+            except self.psutil.NoSuchProcess:
+                pass
+        return cpu, rss / 1e6
+
+
+async def run_level(args, n_clients: int, symbols, weights, probe) -> dict:
+    import socketio
+
+    rnd = random.Random(args.seed + n_clients)
+    latencies: list[float] = []
+    counters = {"messages": 0, "updates": 0, "late": 0}
+    measuring = {"on": False}
+    clients, seen, wanted = [], [], []
+    connect_failures = 0
+    sem = asyncio.Semaphore(args.connect_concurrency)
+
+    async def open_client(i: int):
+        nonlocal connect_failures
+        sio = socketio.AsyncClient(reconnection=False)
+        got: set = set()
+        wl = watchlist(rnd, symbols, weights, args.symbols_per_client)
+
+        @sio.on("tick_update")
+        async def on_tick(data):
+            if not measuring["on"]:
+                return
+            now = time.time() * 1000
+            counters["messages"] += 1
+            for key, row in data.items():
+                counters["updates"] += 1
+                lat = now - (row.get("ltt") or now)
+                latencies.append(lat)
+                if lat > args.late_ms:
+                    counters["late"] += 1
+                got.add(key)
+
+        async with sem:
+            try:
+                await sio.connect(args.app_url, transports=["websocket"], wait_timeout=30)
+                await sio.emit("subscribe_symbols", {"symbols": wl})
+            except Exception:
+                connect_failures += 1
+                return
+        clients.append(sio)
+        seen.append(got)
+        wanted.append({f"NSE_EQ|{s}" for s in wl})
+
+    t0 = time.perf_counter()
+    await asyncio.gather(*(open_client(i) for i in range(n_clients)))
+    connect_s = time.perf_counter() - t0
+    await asyncio.sleep(args.warmup)
+
+    cpu, rss = [], []
+    if probe:
+        probe.prime()
+    measuring["on"] = True
+    t_start = time.perf_counter()
+    while time.perf_counter() - t_start < args.duration:
+        await asyncio.sleep(0.5)
+        if probe:
+            c, r = probe.sample()
+            cpu.append(c)
+            rss.append(r)
+    measuring["on"] = False
+    window = time.perf_counter() - t_start
+
+    try:
+        feed_stats = requests.get(f"{args.app_url}/api/feed/stats", timeout=10).json()
+    except Exception:
+        feed_stats = None
+    await asyncio.gather(*(c.disconnect() for c in clients), return_exceptions=True)
+
+    missing_keys = sum(len(w - g) for w, g in zip(wanted, seen))
+    lat = np.asarray(latencies) if latencies else np.zeros(1)
+    p50, p90, p99 = np.percentile(lat, [50, 90, 99])
+    return {
+        "clients": n_clients,
+        "connected": len(clients),
+        "connect_failures": connect_failures,
+        "connect_s": round(connect_s, 2),
+        "window_s": round(window, 2),
+        "messages": counters["messages"],
+        "messages_per_s": round(counters["messages"] / window, 1),
+        "updates_per_s": round(counters["updates"] / window, 1),
+        "latency_ms": {
+            "p50": round(float(p50), 1), "p90": round(float(p90), 1),
+            "p99": round(float(p99), 1), "max": round(float(lat.max()), 1),
+        },
+        "late_updates": counters["late"],
+        "late_pct": round(100.0 * counters["late"] / max(counters["updates"], 1), 3),
+        "clients_with_missing_keys": sum(1 for w, g in zip(wanted, seen) if w - g),
+        "missing_keys": missing_keys,
+        "server_cpu_pct": {"avg": round(float(np.mean(cpu)), 1), "max": round(float(np.max(cpu)), 1)} if cpu else None,
+        "server_rss_mb": {"max": round(float(np.max(rss)), 1)} if rss else None,
+        "server_feed_stats": feed_stats,
+    }
+
+
+def wait_for(url: str, timeout: float) -> bool:
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            if requests.get(url, timeout=2).ok:
+                return True
+        except Exception:
+            pass
+        time.sleep(1)
+    return False
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--levels", default="100,250,500,1000", help="comma-separated client counts")
+    ap.add_argument("--duration", type=float, default=20.0, help="measurement window per level (s)")
+    ap.add_argument("--warmup", type=float, default=3.0, help="settle time after connecting (s)")
+    ap.add_argument("--universe", type=int, default=500, help="synthetic symbols in the instrument file")
+    ap.add_argument("--symbols-per-client", type=int, default=20)
+    ap.add_argument("--zipf", type=float, default=1.1, help="popularity skew of watchlist symbols")
+    ap.add_argument("--rate", type=float, default=2.0, help="simulator ticks/s per instrument")
+    ap.add_argument("--fps", type=float, default=20.0, help="simulator frames/s")
+    ap.add_argument("--emit-interval-ms", type=int, default=None, help="UPSTOX_EMIT_INTERVAL_MS for the app")
+    ap.add_argument("--late-ms", type=float, default=1000.0)
+    ap.add_argument("--connect-concurrency", type=int, default=50)
+    ap.add_argument("--app-url", default="http://127.0.0.1:5000")
+    ap.add_argument("--async-mode", choices=("threading", "eventlet", "gevent"), default="threading",
+                    help="UPSTOX_ASYNC_MODE for the spawned app")
+    ap.add_argument("--gunicorn", action="store_true", help="serve through gunicorn.conf.py instead of app.py")
+    ap.add_argument("--no-spawn", action="store_true", help="bench an already running app + simulator")
+    ap.add_argument("--pid", type=int, default=None, help="app pid for CPU/RSS with --no-spawn")
+    ap.add_argument("--sim-http-port", type=int, default=8765)
+    ap.add_argument("--sim-ws-port", type=int, default=8766)
+    ap.add_argument("--seed", type=int, default=7)
+    ap.add_argument("--json", default=None, help="write results here (default: stdout)")
+    args = ap.parse_args()
+
+    levels = [int(x) for x in args.levels.split(",") if x.strip()]
+    tmp = tempfile.mkdtemp(prefix="fanout_load_")
+    inst_file = os.path.join(tmp, "instruments.json.gz")
+    symbols = write_instruments(inst_file, args.universe)
+    weights = [1.0 / (i + 1) ** args.zipf for i in range(len(symbols))]
+
+    procs = []
+    pid = args.pid
+    try:
+        if not args.no_spawn:
+            sim = subprocess.Popen([
+                sys.executable, os.path.join(ROOT, "feed_simulator.py"),
+                "--http-port", str(args.sim_http_port), "--ws-port", str(args.sim_ws_port),
+                "--rate", str(args.rate), "--fps", str(args.fps), "--seed", str(args.seed),
+            ], cwd=ROOT)
+            procs.append(sim)
+            env = dict(os.environ)
+            env.update({
+                "UPSTOX_AUTHORIZE_URL": f"http://127.0.0.1:{args.sim_http_port}/v3/feed/market-data-feed/authorize",
+                "UPSTOX_ACCESS_TOKEN": env.get("UPSTOX_ACCESS_TOKEN") or "simulated-access-token-000000",
+                "UPSTOX_IGNORE_MARKET_HOURS": "1",
+                "UPSTOX_INSTRUMENTS_FILE": inst_file,
+                "UPSTOX_ASYNC_MODE": args.async_mode,
+                "UPSTOX_DEBUG": "0",
+                # app.py imports the generated protobuf module from src/pages
+                "PYTHONPATH": os.pathsep.join(
+                    p for p in (os.path.join(ROOT, "src", "pages"), env.get("PYTHONPATH")) if p),
+            })
+            if args.emit_interval_ms is not None:
+                env["UPSTOX_EMIT_INTERVAL_MS"] = str(args.emit_interval_ms)
+            if args.gunicorn:
+                cmd = [sys.executable, "-m", "gunicorn", "-c", "gunicorn.conf.py", "wsgi:app"]
+            else:
+                cmd = [sys.executable, os.path.join(ROOT, "app.py")]
+            app = subprocess.Popen(cmd, cwd=ROOT, env=env)
+            procs.append(app)
+            pid = app.pid
+        if not wait_for(f"{args.app_url}/api/feed/stats", timeout=300):
+            sys.exit("App did not come up")
+
+        probe = None
+        if pid:
+            try:
+                probe = ServerProbe(pid)
+            except ImportError:
+                print("⚠️ psutil not installed — skipping server CPU/RSS", file=sys.stderr)
+
+        results = []
+        for n in levels:
+            print(f"👥 {n} clients ...", file=sys.stderr)
+            res = asyncio.run(run_level(args, n, symbols, weights, probe))
+            print(f"   {res['messages_per_s']} msg/s, p99 {res['latency_ms']['p99']} ms, "
+                  f"late {res['late_pct']}%, cpu {res['server_cpu_pct']}", file=sys.stderr)
+            results.append(res)
+    finally:
+        for p in reversed(procs):
+            p.terminate()
+        for p in procs:
+            try:
+                p.wait(10)
+            except subprocess.TimeoutExpired:
+                p.kill()
+
+    out = {
+        "benchmark": "fanout_load",
+        "git_rev": _git_rev(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "params": {k: v for k, v in vars(args).items() if k not in ("json",)},
+        "levels": results,
+    }
+    text = json.dumps(out, indent=2)
+    if args.json:
+        with open(args.json, "w") as f:
+            f.write(text)
+        print(f"📝 Results written to {args.json}", file=sys.stderr)
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,237 @@
+"""
+Streaming IndicatorEngine vs. the ``ta`` package on the same bars.
+
+Bars are random-walk OHLC per instrument (``--bars`` x ``--instruments``),
+or real daily bars from yfinance with ``--yf TICKER,...``. They go through
+the live path: one LTPC frame each for open / high / low / close, applied
+to a TickTable, so BarBuilder builds and closes the bars and the engine
+commits them through its close hook. After every close the committed
+values are compared with ``ta`` computed over the same closed bars (the
+functions ``download_history_excel`` uses). A second engine is warmed
+through ``IndicatorEngine.seed_many()`` with the same bars and must end in
+the same state.
+
+Reported per indicator: points compared (both defined), mismatches beyond
+``--tol`` (relative) and the max absolute difference. Timing compares one
+engine update for all instruments with ``ta`` recomputing one instrument's
+full history, which is what refreshing the values per bar would cost.
+
+Usage:
+    python benchmarks/indicator_parity.py [--instruments 50] [--bars 500] [--json]
+    python benchmarks/indicator_parity.py --yf RELIANCE.NS,TCS.NS,^NSEI
+Needs ta and pandas (yfinance for --yf).
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path[:0] = [ROOT, os.path.join(ROOT, "src", "pages")]
+
+import MarketDataFeedV3_pb2 as pb  # noqa: E402
+from bars import BarBuilder, parse_timeframes  # noqa: E402
+from indicators import OUTPUTS, IndicatorEngine  # noqa: E402
+from tick_table import TickTable  # noqa: E402
+
+BAR_MS = 60_000
+T0_MS = 1_700_000_040_000  # minute aligned
+
+
+def random_bars(instruments: int, bars: int, seed: int = 7) -> dict:
+    """{key: (high, low, close, open)} random walks with realistic bar ranges."""
+    rnd = np.random.default_rng(seed)
+    out = {}
+    for i in range(instruments):
+        close = 100 * np.exp(np.cumsum(rnd.normal(0, 0.004, bars)))
+        open_ = np.r_[close[0], close[:-1]] * (1 + rnd.normal(0, 0.001, bars))
+        span = np.abs(rnd.normal(0, 0.003, bars)) * close
+        high = np.maximum(open_, close) + span * rnd.random(bars)
+        low = np.minimum(open_, close) - span * rnd.random(bars)
+        out[f"NSE_EQ|SYN{i:05d}"] = (high, low, close, open_)
+    return out
+
+
+def yf_bars(tickers: list[str]) -> dict:
+    import yfinance as yf
+    out = {}
+    for t in tickers:
+        df = yf.download(t, period="2y", interval="1d", auto_adjust=False, progress=False)
+        if df.empty:
+            print(f"⚠️ no data for {t}", file=sys.stderr)
+            continue
+        if hasattr(df.columns, "levels"):
+            df.columns = df.columns.get_level_values(0)
+        df = df.dropna(subset=["Open", "High", "Low", "Close"])
+        out[t] = tuple(df[c].to_numpy(dtype=np.float64) for c in ("High", "Low", "Close", "Open"))
+    return out
+
+
+def frames_for_bar(keys: list[str], data: dict, i: int) -> list[bytes]:
+    """Four LTPC frames inside bar ``i``: open, high, low, close."""
+    out = []
+    for j, col in enumerate((3, 0, 1, 2)):
+        msg = pb.FeedResponse()
+        msg.type = pb.live_feed
+        ts = T0_MS + i * BAR_MS + j * 10_000
+        msg.currentTs = ts
+        for key in keys:
+            # past an instrument's last bar its close repeats, which closes that bar
+            k = min(i, len(data[key][2]) - 1)
+            lt = msg.feeds[key].ltpc
+            lt.ltp, lt.ltt, lt.ltq, lt.cp = float(data[key][col][k]), ts, 1, 100
+        out.append(msg.SerializeToString())
+    return out
+
+
+def ta_outputs(high, low, close) -> dict:
+    import pandas as pd
+    import ta
+
+    h, l, c = pd.Series(high), pd.Series(low), pd.Series(close)
+    macd = ta.trend.MACD(c)
+    adx = ta.trend.ADXIndicator(h, l, c, window=14)
+    bb = ta.volatility.BollingerBands(c, window=20, window_dev=2)
+    return {
+        "RSI_14": ta.momentum.RSIIndicator(c, window=14).rsi(),
+        "SMA_5": ta.trend.SMAIndicator(c, window=5).sma_indicator(),
+        "SMA_20": ta.trend.SMAIndicator(c, window=20).sma_indicator(),
+        "EMA_5": ta.trend.EMAIndicator(c, window=5).ema_indicator(),
+        "EMA_20": ta.trend.EMAIndicator(c, window=20).ema_indicator(),
+        "MACD": macd.macd(),
+        "MACD_Signal": macd.macd_signal(),
+        "MACD_Hist": macd.macd_diff(),
+        "ADX": adx.adx(),
+        "+DI": adx.adx_pos(),
+        "-DI": adx.adx_neg(),
+        "BB_High": bb.bollinger_hband(),
+        "BB_Mid": bb.bollinger_mavg(),
+        "BB_Low": bb.bollinger_lband(),
+    }
+
+
+def engine(capacity: int):
+    table = TickTable(capacity)
+    bars = BarBuilder(table, parse_timeframes("1m:10"))
+    return table, IndicatorEngine(bars, "1m")
+
+
+def run(data: dict, tol: float) -> dict:
+    keys = list(data)
+    n_bars = max(len(v[2]) for v in data.values())
+    table, eng = engine(max(len(keys), 16))
+    for k in keys:
+        table.slot(k)
+    slots = np.array([table.slots[k] for k in keys], dtype=np.int64)
+
+    # Committed values after each close: {output: (keys, bars)}
+    live = {name: np.full((len(keys), n_bars), np.nan) for name in OUTPUTS}
+    update_ns = []
+    for i in range(n_bars + 1):
+        frames = frames_for_bar(keys, data, i)
+        if i == n_bars:
+            frames = frames[:1]  # only there to close the last bar
+        for n, raw in enumerate(frames):
+            msg = pb.FeedResponse()
+            msg.ParseFromString(raw)
+            t0 = time.perf_counter_ns()
+            with table.lock:
+                table.apply(msg)
+            if n == 0 and i:
+                update_ns.append(time.perf_counter_ns() - t0)  # includes bar i-1 close + commit
+        if i:
+            for name in OUTPUTS:
+                live[name][:, i - 1] = getattr(eng, name)[slots]
+
+    # ta over the same closed bars
+    ta_ns, report = [], {name: {"compared": 0, "mismatches": 0, "max_abs_diff": 0.0} for name in OUTPUTS}
+    for r, key in enumerate(keys):
+        high, low, close, _ = data[key]
+        t0 = time.perf_counter_ns()
+        ref = ta_outputs(high, low, close)
+        ta_ns.append(time.perf_counter_ns() - t0)
+        for name in OUTPUTS:
+            a = live[name][r, : len(close)]
+            b = ref[name].to_numpy(dtype=np.float64)
+            both = np.isfinite(a) & np.isfinite(b)
+            diff = np.abs(a[both] - b[both])
+            rep = report[name]
+            rep["compared"] += int(both.sum())
+            rep["mismatches"] += int((diff > tol * np.maximum(np.abs(b[both]), 1.0)).sum())
+            if diff.size:
+                rep["max_abs_diff"] = max(rep["max_abs_diff"], float(diff.max()))
+
+    # seed_many() with the same bars must land on the live engine's final state
+    seed_table, seeded = engine(max(len(keys), 16))
+    seed_diff = 0.0
+    series = {}
+    for key in keys:
+        high, low, close, _ = data[key]
+        t = T0_MS + np.arange(len(close) + 1) * BAR_MS
+        # one extra (dropped) bar stands in for the still-forming one
+        series[key] = (t, np.r_[high, 0.0], np.r_[low, 0.0], np.r_[close, 0.0])
+    t0 = time.perf_counter_ns()
+    seeded.seed_many(series)
+    seed_ms = (time.perf_counter_ns() - t0) / 1e6
+    seed_slots = np.array([seed_table.slots[k] for k in keys], dtype=np.int64)
+    for name in OUTPUTS:
+        a, b = getattr(eng, name)[slots], getattr(seeded, name)[seed_slots]
+        both = np.isfinite(a) & np.isfinite(b)
+        if both.any():
+            seed_diff = max(seed_diff, float(np.abs(a[both] - b[both]).max()))
+
+    upd = np.asarray(update_ns, dtype=np.float64) / 1e3
+    return {
+        "instruments": len(keys),
+        "bars": n_bars,
+        "tolerance_rel": tol,
+        "indicators": report,
+        "parity": all(r["mismatches"] == 0 for r in report.values()),
+        "seed_vs_live_max_abs_diff": seed_diff,
+        "seed_many_ms": round(seed_ms, 1),  # every instrument's history; table.lock only for the copy-in
+        "engine_update_us": {  # one bar close for every instrument, via the live tick path
+            "p50": round(float(np.percentile(upd, 50)), 1),
+            "p99": round(float(np.percentile(upd, 99)), 1),
+            "per_instrument_p50": round(float(np.percentile(upd, 50)) / len(keys), 2),
+        },
+        "ta_full_recompute_us_per_instrument": round(float(np.median(ta_ns)) / 1e3, 1),
+    }
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--instruments", type=int, default=50)
+    ap.add_argument("--bars", type=int, default=500)
+    ap.add_argument("--yf", default=None, help="comma-separated Yahoo tickers instead of random walks")
+    ap.add_argument("--tol", type=float, default=1e-6, help="relative tolerance")
+    ap.add_argument("--seed", type=int, default=7)
+    ap.add_argument("--json", action="store_true")
+    args = ap.parse_args()
+
+    if args.yf:
+        data = yf_bars([t.strip() for t in args.yf.split(",") if t.strip()])
+        if not data:
+            sys.exit("No bars downloaded")
+    else:
+        data = random_bars(args.instruments, args.bars, args.seed)
+    res = run(data, args.tol)
+    if args.json:
+        print(json.dumps(res, indent=2))
+        return
+    print(f"{res['instruments']} instruments x {res['bars']} bars — parity: {res['parity']}")
+    for name, r in res["indicators"].items():
+        print(f"  {name:<12} compared {r['compared']:>7}  mismatches {r['mismatches']:>5}  "
+              f"max |diff| {r['max_abs_diff']:.3g}")
+    print(f"  seed_many() vs live final state: max |diff| {res['seed_vs_live_max_abs_diff']:.3g}, "
+          f"{res['seed_many_ms']} ms for all instruments")
+    u = res["engine_update_us"]
+    print(f"  engine: {u['p50']} µs per bar close for all instruments (p99 {u['p99']}), "
+          f"{u['per_instrument_p50']} µs per instrument; ta: "
+          f"{res['ta_full_recompute_us_per_instrument']} µs to recompute one instrument")
+
+
+if __name__ == "__main__":
+    main()
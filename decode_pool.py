@@ -0,0 +1,504 @@
+"""
+Process-pool decode stage for raw feed frames.
+
+In ``UPSTOX_DECODE_MODE=pool`` the websocket thread only hands the raw
+bytes to ``DecodePool.submit()``. Worker processes run
+``FeedResponse.ParseFromString`` and the field walk off the main
+interpreter's GIL. Each frame comes back as one or more blocks of
+fixed-width ``RECORD`` rows in shared memory. The main process maps each
+row to its TickTable slot and writes the columns in one vectorized
+``TickConflator.on_records()`` call:
+
+    websocket thread ──raw bytes──▶ worker ──RECORD rows (shm)──▶ collector ──▶ TickTable
+
+Results are applied in submit order, so the last value per instrument
+matches the inline path. The rows carry the LTPC, first OHLC bar and vtt
+columns. Side stores that need whole feed bodies (order book, greeks) get
+those frames re-parsed in the main process, so the pool only pays off
+when most subscriptions are ``ltpc``.
+
+Workers are started through a forkserver that only preloads this module,
+never by forking the app process: by the time the pool starts, app.py has
+TensorFlow loaded, feed threads running and (under eventlet/gevent) a
+monkey-patched stdlib. A worker that dies is respawned on the same
+shared-memory blocks; frames it still held are skipped at once instead of
+stalling the reorder buffer.
+"""
+import multiprocessing as mp
+import os
+import queue
+import sys
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from multiprocessing.connection import wait as wait_readers
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+
+# One decoded tick. ``key`` is the worker-local key id (new ids are sent with the result).
+RECORD = np.dtype([
+    ("key", np.int32),
+    ("has_ohlc", np.bool_),
+    ("has_vtt", np.bool_),
+    ("ltp", np.float64),
+    ("ltt", np.int64),
+    ("ltq", np.int64),
+    ("cp", np.float64),
+    ("vtt", np.int64),
+    ("open", np.float64),
+    ("high", np.float64),
+    ("low", np.float64),
+    ("close", np.float64),
+])
+
+
+def _worker(wid: int, in_q, result_w, free_q, shm_names: list, block_records: int, id_base: int = 0):
+    sys.path[:0] = [ROOT, os.path.join(ROOT, "src", "pages")]
+    from MarketDataFeedV3_pb2 import FeedResponse
+    from feed_decoder import FEED_GREEKS, FEED_LTPC, FEED_MARKET, feed_kind
+
+    from multiprocessing import shared_memory
+    # Workers share the parent's resource tracker, which unlinks the blocks when the pool stops
+    shms = [shared_memory.SharedMemory(name=n) for n in shm_names]
+    blocks = [np.ndarray((block_records,), dtype=RECORD, buffer=s.buf) for s in shms]
+    max_rows = block_records * len(blocks)
+    # ids continue from the previous worker on these blocks, so the parent's id → slot map stays valid
+    ids: dict[str, int] = {}
+    next_id = id_base
+    msg = FeedResponse()
+
+    while True:
+        item = in_q.get()
+        if item is None:
+            break
+        seq, raw, submit_ns, dedup = item
+        try:
+            msg.ParseFromString(raw)
+        except Exception:
+            result_w.send((seq, wid, (), (), -1, submit_ns, dedup, False, 0))
+            continue
+
+        key_ids, ltp, ltt, ltq, cp = [], [], [], [], []
+        has_ohlc, opn, high, low, close = [], [], [], [], []
+        has_vtt, vtt = [], []
+        new_keys = []
+        side = False
+        truncated = 0
+        for key, feed in msg.feeds.items():
+            kind, body = feed_kind(feed)
+            if kind is None:
+                continue
+            if kind == FEED_LTPC:
+                lt, ohlc, vol = body, None, 0
+            elif kind == FEED_GREEKS:
+                lt, ohlc, vol = body.ltpc, None, body.vtt
+            elif kind == FEED_MARKET:
+                lt, ohlc, vol = body.ltpc, body.marketOHLC.ohlc, body.vtt
+            else:
+                lt, ohlc, vol = body.ltpc, body.marketOHLC.ohlc, 0
+            if not lt.ltp:
+                continue
+            if len(key_ids) >= max_rows:
+                truncated += 1  # more ticks than every block of this worker together
+                continue
+            side = side or kind != FEED_LTPC
+            kid = ids.get(key)
+            if kid is None:
+                kid = ids[key] = next_id
+                next_id += 1
+                new_keys.append(key)
+            key_ids.append(kid)
+            ltp.append(lt.ltp)
+            ltt.append(lt.ltt)
+            ltq.append(lt.ltq)
+            cp.append(lt.cp)
+            has_vtt.append(bool(vol))
+            vtt.append(vol)
+            if ohlc:
+                bar = ohlc[0]
+                has_ohlc.append(True)
+                opn.append(bar.open)
+                high.append(bar.high)
+                low.append(bar.low)
+                close.append(bar.close)
+            else:
+                has_ohlc.append(False)
+                opn.append(0.0)
+                high.append(0.0)
+                low.append(0.0)
+                close.append(0.0)
+
+        # Large frames (initial subscription snapshots) span several blocks
+        used = []
+        for lo in range(0, len(key_ids), block_records):
+            hi = min(lo + block_records, len(key_ids))
+            b = free_q.get()
+            rec = blocks[b]
+            n = hi - lo
+            rec["key"][:n] = key_ids[lo:hi]
+            rec["ltp"][:n] = ltp[lo:hi]
+            rec["ltt"][:n] = ltt[lo:hi]
+            rec["ltq"][:n] = ltq[lo:hi]
+            rec["cp"][:n] = cp[lo:hi]
+            rec["has_vtt"][:n] = has_vtt[lo:hi]
+            rec["vtt"][:n] = vtt[lo:hi]
+            rec["has_ohlc"][:n] = has_ohlc[lo:hi]
+            rec["open"][:n] = opn[lo:hi]
+            rec["high"][:n] = high[lo:hi]
+            rec["low"][:n] = low[lo:hi]
+            rec["close"][:n] = close[lo:hi]
+            used.append((b, n))
+        result_w.send((seq, wid, used, new_keys, msg.currentTs, submit_ns, dedup, side, truncated))
+
+    for s in shms:
+        s.close()
+
+
+@contextmanager
+def _main_hidden():
+    """
+    spawn/forkserver children re-import the parent's ``__main__`` before
+    running their target. app.py is not safe to import twice, and workers
+    only need this module, so hide it while a worker starts.
+    """
+    main = sys.modules["__main__"]
+    saved = main.__dict__.pop("__file__", None), getattr(main, "__spec__", None)
+    main.__spec__ = None
+    try:
+        yield
+    finally:
+        if saved[0] is not None:
+            main.__file__ = saved[0]
+        main.__spec__ = saved[1]
+
+
+class _Worker:
+    """One worker process with its shared-memory blocks and queues."""
+
+    def __init__(self, wid: int, shms: list, block_records: int):
+        self.wid = wid
+        self.shms = shms
+        self.blocks = [np.ndarray((block_records,), dtype=RECORD, buffer=s.buf) for s in shms]
+        self.proc = None
+        self.in_q = None
+        self.free_q = None
+        self.result_r = None
+        self.inflight: set = set()  # seqs queued to this process, result not back yet
+
+
+class DecodePool:
+    """Decodes raw frames in worker processes and applies the records in submit order."""
+
+    def __init__(self, conflator, workers: int = 2, queue_size: int = 4096,
+                 blocks_per_worker: int = 64, block_records: int = 1024, frame_class=None,
+                 start_method: str = None, metrics=None):
+        from multiprocessing import shared_memory
+
+        self.conflator = conflator
+        self.table = conflator.table
+        self.frame_class = frame_class  # re-parse frames for hook-based side stores
+        self.metrics = metrics  # feed_metrics.FeedMetrics, told about every applied frame
+        self.n_workers = max(int(workers), 1)
+        self.queue_size = max(int(queue_size), 1)
+        self.block_records = max(int(block_records), 1)
+        if start_method is None:
+            start_method = "forkserver" if "forkserver" in mp.get_all_start_methods() else "spawn"
+        self.ctx = mp.get_context(start_method)
+        if start_method == "forkserver":
+            self.ctx.set_forkserver_preload([__name__])
+        self.workers = [
+            _Worker(wid, [shared_memory.SharedMemory(create=True, size=RECORD.itemsize * self.block_records)
+                          for _ in range(max(int(blocks_per_worker), 1))], self.block_records)
+            for wid in range(self.n_workers)
+        ]
+        self.live: list[int] = []  # workers submit() may route to
+        # Worker-local key id → TickTable slot
+        self.slot_maps = [np.full(1024, -1, dtype=np.int64) for _ in range(self.n_workers)]
+        self.key_counts = [0] * self.n_workers
+
+        self.lock = threading.Lock()
+        self.seq = 0
+        self.rr = 0
+        self.next_seq = 0
+        self.pending: dict[int, tuple] = {}
+        self.lost: set = set()  # seqs that died with a worker
+        self.raw: dict[int, bytes] = {}  # frames whose side stores need the full body
+        self.meters: dict[int, object] = {}  # seq → FrameMeter of the submitting streamer
+        self.stall_since = 0.0
+        self.stop_event = threading.Event()
+        self.stopping = False
+        self.collector = None
+
+        # 📊 Counters
+        self.frames_in = 0
+        self.frames_dropped = 0
+        self.frames_applied = 0
+        self.frames_failed = 0
+        self.frames_skipped = 0  # lost in a worker; ordering moved past them
+        self.frames_late = 0  # came back after a stall skip had moved past them; dropped
+        self.ticks_truncated = 0
+        self.side_reparsed = 0
+        self.restarts = 0
+        self.latency_ns: deque = deque(maxlen=20000)  # submit → applied
+
+    # 🧩 Input side (websocket callback threads)
+    def submit(self, raw: bytes, dedup: bool = False, meter=None) -> bool:
+        """
+        Queue one frame for decoding; never blocks. False (and counted) when
+        the pool lags or no worker is up. ``meter`` gets the frame's exchange lag once applied.
+        """
+        with self.lock:
+            self.frames_in += 1
+            if not self.live:
+                self.frames_dropped += 1
+                return False
+            w = self.workers[self.live[self.rr % len(self.live)]]
+            self.rr += 1
+            seq = self.seq
+            if len(w.inflight) >= self.queue_size:
+                self.frames_dropped += 1
+                return False
+            try:
+                w.in_q.put_nowait((seq, bytes(raw), time.perf_counter_ns(), dedup))
+            except queue.Full:
+                self.frames_dropped += 1
+                return False
+            w.inflight.add(seq)
+            self.seq += 1
+            if self.frame_class is not None and self.table.hooks:
+                self.raw[seq] = raw
+            if meter is not None:
+                self.meters[seq] = meter
+        return True
+
+    # 👷 Workers
+    def _launch(self, w: _Worker, free_blocks, id_base: int = 0):
+        w.in_q = self.ctx.Queue(maxsize=self.queue_size)
+        w.free_q = self.ctx.Queue()
+        for b in free_blocks:
+            w.free_q.put(b)
+        w.result_r, result_w = self.ctx.Pipe(duplex=False)
+        w.proc = self.ctx.Process(
+            target=_worker,
+            args=(w.wid, w.in_q, result_w, w.free_q, [s.name for s in w.shms], self.block_records, id_base),
+            daemon=True,
+        )
+        with _main_hidden():
+            w.proc.start()
+        result_w.close()  # the worker holds the only write end, so its death reads as EOF
+
+    def _respawn(self, w: _Worker):
+        """Replace a dead worker on the same blocks; the frames it still held are skipped."""
+        with self.lock:
+            if w.wid in self.live:
+                self.live.remove(w.wid)
+        # Everything it finished is already in the pipe, ahead of the EOF
+        self._drain(w)
+        with self.lock:
+            lost, w.inflight = w.inflight, set()
+            self.lost.update(lost)
+        w.result_r.close()
+        w.result_r = None
+        if self.stopping:
+            return
+        mine = [item for item in self.pending.values() if item[1] == w.wid]
+        held = {b for item in mine for b, _ in item[2]}
+        id_base = self.key_counts[w.wid] + sum(len(item[3]) for item in mine)
+        old_q = w.in_q
+        self._launch(w, [b for b in range(len(w.blocks)) if b not in held], id_base)
+        old_q.cancel_join_thread()  # its reader may have died holding the queue lock
+        old_q.close()
+        with self.lock:
+            self.live.append(w.wid)
+        self.restarts += 1
+        print(f"♻️ Decode worker {w.wid} died — respawned, {len(lost)} frame(s) skipped")
+
+    def _drain(self, w: _Worker):
+        try:
+            while w.result_r.poll():
+                self._received(w.result_r.recv())
+        except (EOFError, OSError):
+            pass
+
+    # 📥 Output side (collector thread)
+    def _received(self, item):
+        seq, wid = item[0], item[1]
+        with self.lock:
+            self.workers[wid].inflight.discard(seq)
+        if seq >= self.next_seq:
+            self.pending[seq] = item
+            return
+        # Ordering already stepped past it: applying it now would put stale ticks over newer ones
+        self.frames_late += 1
+        with self.lock:
+            self.raw.pop(seq, None)
+            self.meters.pop(seq, None)
+        w = self.workers[wid]
+        new_keys = item[3]
+        if new_keys:
+            # The worker numbered these keys; later frames refer to them by id
+            with self.conflator.lock:
+                self._slots(wid, new_keys, np.zeros(0, dtype=np.int64))
+        for b, _ in item[2]:
+            w.free_q.put(b)
+
+    def _slots(self, wid: int, new_keys, key_ids: np.ndarray) -> np.ndarray:
+        m = self.slot_maps[wid]
+        if new_keys:
+            base = self.key_counts[wid]
+            self.key_counts[wid] += len(new_keys)
+            if base + len(new_keys) > len(m):
+                grown = np.full(max(len(m) * 2, base + len(new_keys)), -1, dtype=np.int64)
+                grown[: len(m)] = m
+                m = self.slot_maps[wid] = grown
+            for i, key in enumerate(new_keys):
+                m[base + i] = self.table.slot(key)
+        return m[key_ids]
+
+    def _apply(self, item):
+        seq, wid, used, new_keys, current_ts, submit_ns, dedup, side, truncated = item
+        with self.lock:
+            raw = self.raw.pop(seq, None)
+            meter = self.meters.pop(seq, None)
+        if current_ts < 0:
+            self.frames_failed += 1
+            return
+        w = self.workers[wid]
+        self.ticks_truncated += truncated
+        try:
+            with self.conflator.lock:
+                if len(used) == 1:
+                    b, n = used[0]
+                    rec = w.blocks[b][:n]
+                elif used:
+                    rec = np.concatenate([w.blocks[b][:n] for b, n in used])
+                else:
+                    rec = w.blocks[0][:0]
+                slots = self._slots(wid, new_keys, rec["key"]) if len(rec) else np.zeros(0, dtype=np.int64)
+                if side and raw is not None:
+                    # Order book / greeks hooks need the protobuf bodies
+                    msg = self.frame_class()
+                    msg.ParseFromString(raw)
+                    self.table.run_hooks(msg, dedup)
+                    self.side_reparsed += 1
+                self.conflator.on_records(slots, rec, current_ts, dedup)
+        finally:
+            for b, _ in used:
+                w.free_q.put(b)
+        self.frames_applied += 1
+        elapsed = time.perf_counter_ns() - submit_ns
+        self.latency_ns.append(elapsed)
+        if meter is not None:
+            meter.lag(current_ts)
+        if self.metrics is not None:
+            done = time.time_ns()
+            self.metrics.decoded(current_ts, done - elapsed, done)
+
+    def _advance(self):
+        """Apply everything that is next in submit order; step over frames lost with a worker."""
+        while True:
+            if self.next_seq in self.pending:
+                try:
+                    self._apply(self.pending.pop(self.next_seq))
+                except Exception as e:
+                    print("⚠️ Decode pool apply error:", e)
+            elif self.next_seq in self.lost:
+                self.lost.discard(self.next_seq)
+                self.frames_skipped += 1
+                with self.lock:
+                    self.raw.pop(self.next_seq, None)
+                    self.meters.pop(self.next_seq, None)
+            else:
+                break
+            self.next_seq += 1
+
+    def _collect(self):
+        next_check = 0.0
+        while not self.stop_event.is_set():
+            readers = {w.result_r: w for w in self.workers if w.result_r is not None}
+            dead = []
+            for r in wait_readers(list(readers), timeout=0.2):
+                try:
+                    self._received(r.recv())
+                except (EOFError, OSError):
+                    dead.append(readers[r])
+            now = time.monotonic()
+            if now >= next_check:
+                next_check = now + 0.2
+                dead += [w for w in self.workers
+                         if w.result_r is not None and w not in dead and not w.proc.is_alive()]
+            for w in dead:
+                self._respawn(w)
+            self._advance()
+
+            if not self.pending:
+                self.stall_since = 0.0
+            elif not self.stall_since:
+                self.stall_since = now
+            elif now - self.stall_since > 1.0:
+                # A result never came back without its worker dying: move on to what we have
+                skip_to = min((s for s in self.pending if s >= self.next_seq), default=self.next_seq)
+                self.frames_skipped += skip_to - self.next_seq
+                with self.lock:
+                    for s in range(self.next_seq, skip_to):
+                        self.raw.pop(s, None)
+                        self.meters.pop(s, None)
+                self.next_seq = skip_to
+                self.stall_since = 0.0
+
+    def start(self):
+        for w in self.workers:
+            self._launch(w, range(len(w.blocks)))
+        with self.lock:
+            self.live = [w.wid for w in self.workers]
+        self.collector = threading.Thread(target=self._collect, daemon=True)
+        self.collector.start()
+        print(f"🧵 Decode pool started ({self.n_workers} worker process(es), {self.ctx.get_start_method()})")
+
+    def stop(self, timeout: float = 5.0):
+        self.stopping = True
+        with self.lock:
+            self.live = []
+        for w in self.workers:
+            try:
+                w.in_q.put(None, timeout=timeout)
+            except Exception:
+                pass
+        for w in self.workers:
+            w.proc.join(timeout)
+            if w.proc.is_alive():
+                w.proc.terminate()
+        self.stop_event.set()
+        if self.collector:
+            self.collector.join(timeout)
+        for w in self.workers:
+            w.blocks = []
+            for s in w.shms:
+                s.close()
+                s.unlink()
+
+    def stats(self) -> dict:
+        lat = np.asarray(self.latency_ns, dtype=np.float64) / 1e3
+        out = {
+            "workers": self.n_workers,
+            "alive": sum(w.proc.is_alive() for w in self.workers if w.proc),
+            "restarts": self.restarts,
+            "start_method": self.ctx.get_start_method(),
+            "frames_in": self.frames_in,
+            "frames_applied": self.frames_applied,
+            "frames_dropped": self.frames_dropped,
+            "frames_failed": self.frames_failed,
+            "frames_skipped": self.frames_skipped,
+            "frames_late": self.frames_late,
+            "ticks_truncated": self.ticks_truncated,
+            "side_reparsed": self.side_reparsed,
+            "queue_depth": sum(len(w.inflight) for w in self.workers),
+            "reorder_pending": len(self.pending),
+        }
+        if len(lat):
+            p50, p99 = np.percentile(lat, [50, 99])
+            out["latency_us"] = {"p50": round(float(p50), 1), "p99": round(float(p99), 1), "max": round(float(lat.max()), 1)}
+        return out
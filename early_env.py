@@ -0,0 +1,54 @@
+"""
+Read single keys from ``.env`` before anything else is imported.
+
+The async mode has to be known before eventlet/gevent monkey-patch the
+stdlib, which is before python-dotenv (it imports logging, and with it
+threading) may be loaded. This is a stdlib-only reader for plain
+``KEY=value`` lines, looked up the way ``load_dotenv()`` finds its file:
+the first ``.env`` in the starting directory or one of its parents.
+"""
+import os
+
+
+def find_env_file(start: str = None):
+    d = os.path.abspath(start or os.getcwd())
+    while True:
+        path = os.path.join(d, ".env")
+        if os.path.isfile(path):
+            return path
+        parent = os.path.dirname(d)
+        if parent == d:
+            return None
+        d = parent
+
+
+def dotenv_value(key: str, start: str = None):
+    """``key`` from the nearest ``.env`` (unquoted), or None."""
+    path = find_env_file(start)
+    if not path:
+        return None
+    try:
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if line.startswith("export "):
+                    line = line[len("export "):]
+                name, sep, value = line.partition("=")
+                if sep and name.strip() == key:
+                    value = value.split(" #", 1)[0].strip()
+                    return value.strip("'\"")
+    except OSError:
+        pass
+    return None
+
+
+def early_env(key: str, default: str, start: str = None) -> str:
+    """
+    ``key`` from the environment, else from ``.env``, else ``default``. A
+    real environment variable wins, so a process manager (gunicorn picks
+    its worker class from it) and the app always agree.
+    """
+    value = os.environ.get(key)
+    if value is None:
+        value = dotenv_value(key, start)
+    return default if value is None else value
@@ -0,0 +1,290 @@
+"""
+Socket.IO fan-out helpers.
+
+Clients with the same watchlist share one room, so a conflated tick batch
+is sliced and serialized once per distinct watchlist and only reaches the
+sockets that asked for those instruments.
+
+Sessions whose transport is backing up are taken out of room emits by
+``OutboundQueues`` and get their updates merged into a bounded per-session
+buffer (latest row per instrument) until they catch up.
+"""
+import hashlib
+import threading
+import time
+
+
+class WatchlistRooms:
+    """Groups Socket.IO sessions with identical watchlists into shared rooms."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.sid_keys: dict[str, frozenset] = {}
+        self.sid_room: dict[str, str] = {}
+        self.room_keys: dict[str, frozenset] = {}
+        self.room_members: dict[str, set] = {}
+
+    @staticmethod
+    def room_name(keys) -> str:
+        digest = hashlib.sha1("\n".join(sorted(keys)).encode("utf-8")).hexdigest()
+        return f"wl:{digest[:16]}"
+
+    # 🧭 Membership
+    def set_keys(self, sid: str, keys) -> tuple:
+        """Move a session to the room for ``keys``. Returns (old_room, new_room)."""
+        keys = frozenset(keys)
+        with self.lock:
+            old_room = self._detach(sid)
+            if not keys:
+                return old_room, None
+            room = self.room_name(keys)
+            self.sid_keys[sid] = keys
+            self.sid_room[sid] = room
+            self.room_keys[room] = keys
+            self.room_members.setdefault(room, set()).add(sid)
+            return old_room, room
+
+    def add_keys(self, sid: str, keys) -> tuple:
+        return self.set_keys(sid, self.sid_keys.get(sid, frozenset()) | set(keys))
+
+    def remove_keys(self, sid: str, keys) -> tuple:
+        return self.set_keys(sid, self.sid_keys.get(sid, frozenset()) - set(keys))
+
+    def drop(self, sid: str):
+        """Forget a disconnected session. Returns the room it was in."""
+        with self.lock:
+            return self._detach(sid)
+
+    def _detach(self, sid: str):
+        room = self.sid_room.pop(sid, None)
+        self.sid_keys.pop(sid, None)
+        if room:
+            members = self.room_members.get(room)
+            if members is not None:
+                members.discard(sid)
+                if not members:
+                    self.room_members.pop(room, None)
+                    self.room_keys.pop(room, None)
+        return room
+
+    def keys_for(self, sid: str) -> frozenset:
+        return self.sid_keys.get(sid, frozenset())
+
+    def members(self, room: str) -> list:
+        with self.lock:
+            return list(self.room_members.get(room, ()))
+
+    # 📤 Routing
+    def routes(self, payload: dict) -> list:
+        """Slice a tick batch into per-room payloads: [(room, {key: tick})]."""
+        with self.lock:
+            rooms = list(self.room_keys.items())
+        out = []
+        for room, keys in rooms:
+            if len(payload) < len(keys):
+                part = {k: v for k, v in payload.items() if k in keys}
+            else:
+                part = {k: payload[k] for k in keys if k in payload}
+            if part:
+                out.append((room, part))
+        return out
+
+    def stats(self) -> dict:
+        with self.lock:
+            return {"clients": len(self.sid_room), "rooms": len(self.room_keys)}
+
+
+class _Outbox:
+    """Backpressure state for one Socket.IO session."""
+
+    __slots__ = ("slow", "slow_since", "pending", "pending_rows", "superseded",
+                 "overflow", "deferred", "flushed", "episodes", "max_lag", "backlog")
+
+    def __init__(self):
+        self.slow = False
+        self.slow_since = 0.0
+        self.pending: dict[str, dict] = {}  # event → {instrument_key: latest row, or appended rows}
+        self.pending_rows = 0
+        self.superseded = 0  # rows replaced by a newer row for the same key
+        self.overflow = 0  # rows dropped because the buffer (or a key's appended list) was full
+        self.deferred = 0
+        self.flushed = 0
+        self.episodes = 0
+        self.max_lag = 0.0
+        self.backlog = 0
+
+
+class OutboundQueues:
+    """
+    Per-session outbound backpressure.
+
+    ``backlog(sid)`` reports how many packets are already queued on the
+    session's transport. Above ``high_water`` the session is marked slow:
+    emits skip it, and its updates go into a buffer of at most ``max_rows``
+    rows. For ``snapshot_events`` a newer row for the same instrument
+    replaces the older one. Other events carry {key: [rows]} that must all
+    arrive (``bar_close``), so their rows are appended, keeping the newest
+    ``max_appended`` per instrument. When the backlog drains below
+    ``low_water`` the buffer goes out as one message per event. Sessions
+    slow for longer than ``max_lag_s`` are returned for eviction.
+    """
+
+    SNAPSHOT_EVENTS = ("tick_update", "index_update", "bar_update", "depth_update", "indicator_update")
+
+    def __init__(self, backlog, high_water: int = 64, low_water: int = 8,
+                 max_rows: int = 5000, max_lag_s: float = 30.0,
+                 snapshot_events=SNAPSHOT_EVENTS, max_appended: int = 64):
+        self.backlog = backlog
+        self.high_water = max(int(high_water), 1)
+        self.low_water = min(max(int(low_water), 0), self.high_water)
+        self.max_rows = max(int(max_rows), 1)
+        self.snapshot_events = frozenset(snapshot_events)
+        self.max_appended = max(int(max_appended), 1)
+        self.max_lag_s = float(max_lag_s)
+        self.lock = threading.Lock()
+        self.clients: dict[str, _Outbox] = {}
+        self.evicted = 0
+        self.gone_superseded = 0  # counters of sessions that already left
+        self.gone_overflow = 0
+
+    def add(self, sid: str):
+        with self.lock:
+            self.clients.setdefault(sid, _Outbox())
+
+    def _retire(self, sid: str):
+        box = self.clients.pop(sid, None)
+        if box is not None:
+            self.gone_superseded += box.superseded
+            self.gone_overflow += box.overflow
+
+    def drop(self, sid: str):
+        with self.lock:
+            self._retire(sid)
+
+    def sids(self) -> list:
+        with self.lock:
+            return list(self.clients)
+
+    def __contains__(self, sid: str) -> bool:
+        with self.lock:
+            return sid in self.clients
+
+    # 🐢 Slow-session detection (emit path)
+    def slow_among(self, sids) -> list:
+        """Sessions in ``sids`` that must not get a direct emit right now."""
+        slow = []
+        now = time.monotonic()
+        with self.lock:
+            for sid in sids:
+                box = self.clients.get(sid)
+                if box is None:
+                    continue
+                if box.slow:
+                    slow.append(sid)
+                    continue
+                depth = self.backlog(sid)
+                box.backlog = depth
+                if depth > self.high_water:
+                    box.slow = True
+                    box.slow_since = now
+                    box.episodes += 1
+                    slow.append(sid)
+        return slow
+
+    def defer(self, sid: str, event: str, payload: dict):
+        """Add a {key: row} (or {key: [rows]}) payload to a slow session's buffer."""
+        with self.lock:
+            box = self.clients.get(sid)
+            if box is None:
+                return
+            rows = box.pending.setdefault(event, {})
+            if event not in self.snapshot_events:
+                self._append(box, rows, payload)
+                box.deferred += 1
+                return
+            for key, row in payload.items():
+                if key in rows:
+                    box.superseded += 1
+                elif box.pending_rows >= self.max_rows:
+                    box.overflow += 1
+                    continue
+                else:
+                    box.pending_rows += 1
+                rows[key] = row
+            box.deferred += 1
+
+    def _append(self, box: _Outbox, rows: dict, payload: dict):
+        for key, items in payload.items():
+            items = items if isinstance(items, list) else [items]
+            take = items[: max(self.max_rows - box.pending_rows, 0)]
+            box.overflow += len(items) - len(take)
+            if not take:
+                continue
+            held = rows.setdefault(key, [])
+            held.extend(take)
+            box.pending_rows += len(take)
+            excess = len(held) - self.max_appended
+            if excess > 0:
+                # Oldest first out; the client still gets the latest closes in order
+                del held[:excess]
+                box.pending_rows -= excess
+                box.overflow += excess
+
+    # 🔁 Drain / evict (flush thread)
+    def service(self) -> tuple:
+        """
+        Returns (deliveries, evictions): merged [(sid, event, payload)] for
+        sessions that caught up, and sids that stayed behind past max_lag_s.
+        """
+        deliveries, evictions = [], []
+        now = time.monotonic()
+        with self.lock:
+            for sid, box in self.clients.items():
+                if not box.slow:
+                    continue
+                lag = now - box.slow_since
+                box.max_lag = max(box.max_lag, lag)
+                box.backlog = self.backlog(sid)
+                if box.backlog <= self.low_water:
+                    for event, rows in box.pending.items():
+                        if rows:
+                            deliveries.append((sid, event, rows))
+                    box.pending = {}
+                    box.pending_rows = 0
+                    box.slow = False
+                    box.flushed += 1
+                elif lag > self.max_lag_s:
+                    evictions.append(sid)
+            for sid in evictions:
+                self._retire(sid)
+            self.evicted += len(evictions)
+        return deliveries, evictions
+
+    def stats(self, top: int = 10) -> dict:
+        now = time.monotonic()
+        with self.lock:
+            boxes = list(self.clients.items())
+            evicted = self.evicted
+            gone = (self.gone_superseded, self.gone_overflow)
+        slow = [(sid, b) for sid, b in boxes if b.slow]
+        worst = sorted(boxes, key=lambda x: -(x[1].superseded + x[1].overflow))[:top]
+        return {
+            "clients": len(boxes),
+            "slow_now": len(slow),
+            "evicted": evicted,
+            "superseded": gone[0] + sum(b.superseded for _, b in boxes),
+            "overflow": gone[1] + sum(b.overflow for _, b in boxes),
+            "high_water": self.high_water,
+            "max_lag_s": self.max_lag_s,
+            "worst": [{
+                "sid": sid,
+                "slow": b.slow,
+                "lag_s": round(now - b.slow_since, 3) if b.slow else 0.0,
+                "max_lag_s": round(b.max_lag, 3),
+                "backlog": b.backlog,
+                "pending_rows": b.pending_rows,
+                "superseded": b.superseded,
+                "overflow": b.overflow,
+                "episodes": b.episodes,
+            } for sid, b in worst if b.episodes],
+        }
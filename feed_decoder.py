@@ -0,0 +1,124 @@
+"""
+Direct-field decoder for Upstox MarketDataFeedV3 frames.
+
+Replaces ``MessageToDict`` + string-keyed dict walks with ``WhichOneof`` and
+plain attribute access on the generated ``MarketDataFeedV3_pb2`` classes.
+Covers every ``Feed`` variant: ``ltpc``, ``fullFeed.marketFF``,
+``fullFeed.indexFF`` and ``firstLevelWithGreeks``.
+"""
+try:
+    from MarketDataFeedV3_pb2 import FeedResponse
+except Exception:  # decoder helpers still work on already-parsed messages
+    FeedResponse = None
+
+# Feed variant names, as returned by feed_kind()
+FEED_LTPC = "ltpc"
+FEED_MARKET = "marketFF"
+FEED_INDEX = "indexFF"
+FEED_GREEKS = "firstLevelWithGreeks"
+
+
+def parse_frame(raw):
+    """Parse one binary websocket frame into a FeedResponse."""
+    msg = FeedResponse()
+    msg.ParseFromString(raw)
+    return msg
+
+
+def feed_kind(feed):
+    """Return (kind, body) for a Feed, flattening the fullFeed oneof. (None, None) if empty."""
+    kind = feed.WhichOneof("FeedUnion")
+    if kind == "fullFeed":
+        ff = feed.fullFeed
+        kind = ff.WhichOneof("FullFeedUnion")
+        return (kind, getattr(ff, kind)) if kind else (None, None)
+    if kind is None or kind == "requestMode":
+        return None, None
+    return kind, getattr(feed, kind)
+
+
+def ltpc_of(kind, body):
+    """The LTPC sub-message of any variant body."""
+    return body if kind == FEED_LTPC else body.ltpc
+
+
+# 🧩 Field-level decoders
+def decode_ltpc(lt) -> dict:
+    return {"ltp": lt.ltp, "ltt": lt.ltt, "ltq": lt.ltq, "cp": lt.cp}
+
+
+def decode_ohlc(ohlc_list) -> list:
+    return [
+        {"interval": o.interval, "open": o.open, "high": o.high, "low": o.low,
+         "close": o.close, "vol": o.vol, "ts": o.ts}
+        for o in ohlc_list
+    ]
+
+
+def decode_quote(q) -> dict:
+    return {"bidQ": q.bidQ, "bidP": q.bidP, "askQ": q.askQ, "askP": q.askP}
+
+
+def decode_greeks(g) -> dict:
+    return {"delta": g.delta, "theta": g.theta, "gamma": g.gamma, "vega": g.vega, "rho": g.rho}
+
+
+def decode_feed(feed) -> dict:
+    """Decode one Feed into a plain dict tagged with its variant ``kind``."""
+    kind, body = feed_kind(feed)
+    if kind is None:
+        return {}
+    if kind == FEED_LTPC:
+        return {"kind": kind, "ltpc": decode_ltpc(body)}
+    if kind == FEED_INDEX:
+        return {
+            "kind": kind,
+            "ltpc": decode_ltpc(body.ltpc),
+            "ohlc": decode_ohlc(body.marketOHLC.ohlc),
+        }
+    if kind == FEED_MARKET:
+        return {
+            "kind": kind,
+            "ltpc": decode_ltpc(body.ltpc),
+            "depth": [decode_quote(q) for q in body.marketLevel.bidAskQuote],
+            "greeks": decode_greeks(body.optionGreeks),
+            "ohlc": decode_ohlc(body.marketOHLC.ohlc),
+            "atp": body.atp, "vtt": body.vtt, "oi": body.oi, "iv": body.iv,
+            "tbq": body.tbq, "tsq": body.tsq,
+        }
+    # FEED_GREEKS
+    return {
+        "kind": kind,
+        "ltpc": decode_ltpc(body.ltpc),
+        "firstDepth": decode_quote(body.firstDepth),
+        "greeks": decode_greeks(body.optionGreeks),
+        "vtt": body.vtt, "oi": body.oi, "iv": body.iv,
+    }
+
+
+def decode_feed_response(msg) -> dict:
+    """Decode a whole FeedResponse (all feeds) into plain dicts."""
+    return {
+        "type": msg.type,
+        "currentTs": msg.currentTs,
+        "feeds": {key: decode_feed(feed) for key, feed in msg.feeds.items()},
+    }
+
+
+def index_ticks(msg) -> dict:
+    """``index_update`` payload (ltp + first OHLC bar) for every indexFF feed in a frame."""
+    out = {}
+    for key, feed in msg.feeds.items():
+        kind, body = feed_kind(feed)
+        if kind != FEED_INDEX:
+            continue
+        ohlc = body.marketOHLC.ohlc
+        bar = ohlc[0] if ohlc else None
+        out[key] = {
+            "ltp": round(body.ltpc.ltp, 2),
+            "open": bar.open if bar else None,
+            "high": bar.high if bar else None,
+            "low": bar.low if bar else None,
+            "close": bar.close if bar else None,
+        }
+    return out
@@ -0,0 +1,335 @@
+"""
+Feed latency instrumentation and Prometheus exposition.
+
+Every frame carries the exchange clock (``FeedResponse.currentTs``) and
+every tick its trade time (``LTPC.ltt``). ``FeedMetrics`` stamps the other
+points on the path and records the differences, so a slow feed can be
+blamed on the right stage:
+
+    exchange ──▶ receive ──▶ decode done ──▶ emit (batch handed to Socket.IO) ──▶ fan-out done
+       frame: exchange_to_receive, receive_to_decode
+       tick (per instrument group): exchange_to_emit, decode_to_emit
+       batch: fanout
+
+Latencies go into ``LogHistogram``s: HDR-style log-linear buckets
+(16 per power of two, so any value is within 6.25% of its bucket) over
+preallocated NumPy counts. Recording is one bucket increment per value,
+or one ``np.add.at`` per frame for the per-tick histograms; nothing is
+locked. Rare lost increments from concurrent writers only blur a
+percentile, so that trade is fine here.
+
+``render()`` builds the Prometheus text exposition from cumulative sums
+over the bucket counts and caches it for ``cache_ms``, so frequent
+scrapes during market hours cost almost nothing.
+"""
+import time
+
+import numpy as np
+
+SUB_BITS = 4
+SUB_BUCKETS = 1 << SUB_BITS
+MAX_EXP = 38  # values clamp at 2^38 µs (~76 h)
+N_BUCKETS = SUB_BUCKETS * (MAX_EXP - SUB_BITS + 1) + SUB_BUCKETS
+MAX_VALUE = (1 << MAX_EXP) - 1
+
+# Prometheus ``le`` bounds (seconds) the fine buckets are folded into
+DEFAULT_BOUNDS_S = (
+    0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+    0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0,
+)
+
+
+def bucket_index(v: int) -> int:
+    """Fine bucket of a non-negative integer: exact below 32, then 16 per power of two."""
+    if v < 2 * SUB_BUCKETS:
+        return v if v > 0 else 0
+    if v > MAX_VALUE:
+        v = MAX_VALUE
+    shift = v.bit_length() - SUB_BITS - 1
+    return (shift << SUB_BITS) + (v >> shift)
+
+
+def bucket_indices(values: np.ndarray) -> np.ndarray:
+    """Vectorized ``bucket_index``."""
+    v = np.clip(np.asarray(values, dtype=np.int64), 0, MAX_VALUE)
+    shift = np.maximum(np.frexp(v.astype(np.float64))[1] - SUB_BITS - 1, 0)
+    return (shift << SUB_BITS) + (v >> shift)
+
+
+def _bucket_bounds() -> tuple[np.ndarray, np.ndarray]:
+    """Lower bound and width of every fine bucket."""
+    idx = np.arange(N_BUCKETS, dtype=np.int64)
+    shift = np.maximum(idx // SUB_BUCKETS - 1, 0)
+    lower = np.where(idx < 2 * SUB_BUCKETS, idx, (idx % SUB_BUCKETS + SUB_BUCKETS) << shift)
+    return lower, np.int64(1) << shift
+
+
+BUCKET_LOWER, BUCKET_WIDTH = _bucket_bounds()
+
+
+class LogHistogram:
+    """Log-linear histogram of µs values with one row of counts per label (instrument group, ...)."""
+
+    def __init__(self, rows: int = 1):
+        self.counts = np.zeros((max(int(rows), 1), N_BUCKETS), dtype=np.int64)
+        self.sums = np.zeros(len(self.counts), dtype=np.float64)
+
+    def grow(self, rows: int):
+        if rows <= len(self.counts):
+            return
+        counts = np.zeros((rows, N_BUCKETS), dtype=np.int64)
+        counts[: len(self.counts)] = self.counts
+        sums = np.zeros(rows, dtype=np.float64)
+        sums[: len(self.sums)] = self.sums
+        self.counts, self.sums = counts, sums
+
+    def record(self, value_us: int, row: int = 0):
+        v = int(value_us) if value_us > 0 else 0
+        self.counts[row, bucket_index(v)] += 1
+        self.sums[row] += v
+
+    def record_many(self, values_us: np.ndarray, rows: np.ndarray = None):
+        """One value per element; ``rows`` gives each value's row (default row 0)."""
+        if not len(values_us):
+            return
+        v = np.maximum(np.asarray(values_us, dtype=np.int64), 0)
+        idx = bucket_indices(v)
+        if rows is None:
+            np.add.at(self.counts[0], idx, 1)
+            self.sums[0] += float(v.sum())
+        else:
+            np.add.at(self.counts, (rows, idx), 1)
+            np.add.at(self.sums, rows, v.astype(np.float64))
+
+    def count(self, row: int = 0) -> int:
+        return int(self.counts[row].sum())
+
+    def percentiles(self, ps, row: int = 0) -> list:
+        """Values (µs) at the given percentiles, each reported as the top of its bucket."""
+        cum = np.cumsum(self.counts[row])
+        total = cum[-1] if len(cum) else 0
+        if not total:
+            return [None] * len(ps)
+        ranks = np.maximum(np.ceil(np.asarray(ps, dtype=np.float64) / 100.0 * total), 1)
+        idx = np.searchsorted(cum, ranks, side="left")
+        return (BUCKET_LOWER[idx] + BUCKET_WIDTH[idx] - 1).tolist()
+
+
+class FeedMetrics:
+    """Stage latencies, throughput counters and the ``/metrics`` text for the upstream feed."""
+
+    FRAME_STAGES = ("exchange_to_receive", "receive_to_decode")
+    TICK_STAGES = ("exchange_to_emit", "decode_to_emit")
+
+    def __init__(self, table, conflator=None, cache_ms: int = 1000, bounds_s=DEFAULT_BOUNDS_S,
+                 prefix: str = "upstox_feed"):
+        self.table = table
+        self.prefix = prefix
+        self.cache_s = max(int(cache_ms), 0) / 1000.0
+        self.bounds_s = tuple(bounds_s)
+        # Fine buckets up to and including the one holding each bound (``le`` is inclusive)
+        self.bound_cut = bucket_indices(np.round(np.asarray(self.bounds_s) * 1e6)) + 1
+
+        self.frame_hist = {name: LogHistogram() for name in self.FRAME_STAGES}
+        self.tick_hist = {name: LogHistogram(8) for name in self.TICK_STAGES}
+        self.fanout_hist = LogHistogram()
+
+        # Instrument group (segment before "|") per TickTable slot
+        self.groups: list[str] = []
+        self.group_ids: dict[str, int] = {}
+        self.slot_group = np.zeros(table.capacity, dtype=np.int32)
+        self.grouped = 0
+        # Wall-clock ns each slot was last written (decode done)
+        self.applied_ns = np.zeros(table.capacity, dtype=np.int64)
+        # ltt each slot carried when last emitted; quote/depth-only updates keep it unchanged
+        self.emitted_ltt = np.zeros(table.capacity, dtype=np.int64)
+
+        # 📊 Counters
+        self.frames = 0
+        self.bytes = 0
+        self.frames_decoded = 0
+        self.clock_skew = 0  # frames stamped ahead of the local clock
+        self.batches = 0
+        self.rows_emitted = 0
+
+        self.collectors: list = []
+        self._cache = (0.0, "")
+
+        table.batch_hooks.append(self._applied)
+        if conflator is not None:
+            conflator.emit_hooks.append(self._emitting)
+
+    # 🧩 Input side (websocket callback / decode threads)
+    def received(self, nbytes: int):
+        self.frames += 1
+        self.bytes += nbytes
+
+    def decoded(self, exchange_ts_ms: int, received_ns: int, decoded_ns: int):
+        """One frame parsed: ``currentTs`` plus wall-clock receive and decode-done times."""
+        self.frames_decoded += 1
+        self.frame_hist["receive_to_decode"].record((decoded_ns - received_ns) // 1000)
+        if exchange_ts_ms:
+            lag_us = received_ns // 1000 - exchange_ts_ms * 1000
+            if lag_us < 0:
+                self.clock_skew += 1
+            self.frame_hist["exchange_to_receive"].record(lag_us)
+
+    def _applied(self, slots: np.ndarray):
+        """TickTable batch hook: remember when each slot's tick was decoded."""
+        if len(slots):
+            if len(self.applied_ns) < self.table.capacity:
+                self._grow(self.table.capacity)
+            self.applied_ns[slots] = time.time_ns()
+
+    def _grow(self, capacity: int):
+        applied = np.zeros(capacity, dtype=np.int64)
+        applied[: len(self.applied_ns)] = self.applied_ns
+        emitted = np.zeros(capacity, dtype=np.int64)
+        emitted[: len(self.emitted_ltt)] = self.emitted_ltt
+        group = np.zeros(capacity, dtype=np.int32)
+        group[: len(self.slot_group)] = self.slot_group
+        self.applied_ns, self.emitted_ltt, self.slot_group = applied, emitted, group
+
+    def _group_slots(self):
+        keys = self.table.keys
+        for s in range(self.grouped, len(keys)):
+            group = keys[s].split("|", 1)[0]
+            gid = self.group_ids.get(group)
+            if gid is None:
+                gid = len(self.groups)
+                # Rows first: render() reads the group list without the table lock
+                for hist in self.tick_hist.values():
+                    hist.grow(gid + 1)
+                self.group_ids[group] = gid
+                self.groups.append(group)
+            self.slot_group[s] = gid
+        self.grouped = len(keys)
+
+    # 📤 Output side (conflator thread)
+    def _emitting(self, slots: np.ndarray):
+        """Conflator emit hook, under the table lock as a batch is taken for Socket.IO."""
+        if not len(slots):
+            return
+        if len(self.applied_ns) < self.table.capacity:
+            self._grow(self.table.capacity)
+        if self.grouped < len(self.table.keys):
+            self._group_slots()
+        now_ns = time.time_ns()
+        rows = self.slot_group[slots]
+        ltt = self.table.ltt[slots]
+        # Only new trades: an unchanged ltt would measure the age of the last trade, not latency
+        traded = (ltt > 0) & (ltt != self.emitted_ltt[slots])
+        self.emitted_ltt[slots] = ltt
+        self.tick_hist["exchange_to_emit"].record_many((now_ns // 1000 - ltt[traded] * 1000), rows[traded])
+        self.tick_hist["decode_to_emit"].record_many((now_ns - self.applied_ns[slots]) // 1000, rows)
+
+    def emitted(self, rows: int, duration_ns: int):
+        """A ``tick_update`` batch finished fanning out."""
+        self.batches += 1
+        self.rows_emitted += rows
+        self.fanout_hist.record(duration_ns // 1000)
+
+    # 📈 Exposition
+    def add_collector(self, name: str, help_text: str, fn, kind: str = "gauge", label: str = None):
+        """
+        Expose a value read at scrape time. ``fn()`` returns a number, or a
+        ``{label value: number}`` dict when ``label`` is given.
+        """
+        self.collectors.append((f"{self.prefix}_{name}", help_text, fn, kind, label))
+
+    def _histogram_lines(self, out: list, name: str, help_text: str, hist: LogHistogram, label: str = None,
+                         values=None):
+        out.append(f"# HELP {name} {help_text}")
+        out.append(f"# TYPE {name} histogram")
+        rows = range(len(values)) if values is not None else range(1)
+        for row in rows:
+            cum = np.cumsum(hist.counts[row])
+            total = int(cum[-1])
+            if values is not None and not total:
+                continue
+            lab = f'{label}="{values[row]}",' if values is not None else ""
+            for le, n in zip(self.bounds_s, cum[self.bound_cut - 1].tolist()):
+                out.append(f'{name}_bucket{{{lab}le="{le:g}"}} {n}')
+            out.append(f'{name}_bucket{{{lab}le="+Inf"}} {total}')
+            lab = f"{{{lab[:-1]}}}" if lab else ""
+            out.append(f"{name}_sum{lab} {hist.sums[row] / 1e6:.6f}")
+            out.append(f"{name}_count{lab} {total}")
+
+    def render(self) -> str:
+        """Prometheus text format (0.0.4); rebuilt at most every ``cache_ms``."""
+        now = time.monotonic()
+        at, text = self._cache
+        if text and now - at < self.cache_s:
+            return text
+
+        p = self.prefix
+        out: list[str] = []
+        for name, help_text, value in (
+            ("frames_total", "Binary frames received upstream.", self.frames),
+            ("bytes_total", "Bytes of binary frames received upstream.", self.bytes),
+            ("frames_decoded_total", "Frames decoded into the tick table.", self.frames_decoded),
+            ("clock_skew_frames_total", "Frames whose exchange time was ahead of the local clock.", self.clock_skew),
+            ("emit_batches_total", "tick_update batches emitted.", self.batches),
+            ("emit_rows_total", "Instrument rows emitted in tick_update batches.", self.rows_emitted),
+        ):
+            out.append(f"# HELP {p}_{name} {help_text}")
+            out.append(f"# TYPE {p}_{name} counter")
+            out.append(f"{p}_{name} {value}")
+
+        self._histogram_lines(out, f"{p}_exchange_to_receive_seconds",
+                              "Frame currentTs to websocket receive.", self.frame_hist["exchange_to_receive"])
+        self._histogram_lines(out, f"{p}_receive_to_decode_seconds",
+                              "Websocket receive to frame decoded into the tick table.",
+                              self.frame_hist["receive_to_decode"])
+        groups = list(self.groups)
+        self._histogram_lines(out, f"{p}_exchange_to_emit_seconds",
+                              "Tick ltt to its conflated batch being emitted, per instrument group.",
+                              self.tick_hist["exchange_to_emit"], "group", groups)
+        self._histogram_lines(out, f"{p}_decode_to_emit_seconds",
+                              "Tick decoded to its conflated batch being emitted, per instrument group.",
+                              self.tick_hist["decode_to_emit"], "group", groups)
+        self._histogram_lines(out, f"{p}_fanout_seconds",
+                              "Time to hand one tick_update batch to every room.", self.fanout_hist)
+
+        for name, help_text, fn, kind, label in self.collectors:
+            try:
+                value = fn()
+            except Exception:
+                continue
+            out.append(f"# HELP {name} {help_text}")
+            out.append(f"# TYPE {name} {kind}")
+            if isinstance(value, dict):
+                for lv, v in value.items():
+                    out.append(f'{name}{{{label}="{lv}"}} {v}')
+            elif value is not None:
+                out.append(f"{name} {value}")
+
+        text = "\n".join(out) + "\n"
+        self._cache = (now, text)
+        return text
+
+    def stats(self) -> dict:
+        """p50/p99/max in ms per stage (and per group for tick stages) for /api/feed/stats."""
+
+        def summary(hist, row=0):
+            n = hist.count(row)
+            if not n:
+                return None
+            p50, p99, top = hist.percentiles((50, 99, 100), row)
+            return {"count": n, "p50_ms": round(p50 / 1000, 3), "p99_ms": round(p99 / 1000, 3),
+                    "max_ms": round(top / 1000, 3)}
+
+        out = {
+            "frames": self.frames,
+            "bytes": self.bytes,
+            "frames_decoded": self.frames_decoded,
+            "clock_skew_frames": self.clock_skew,
+            "emit_batches": self.batches,
+            "emit_rows": self.rows_emitted,
+            "fanout": summary(self.fanout_hist),
+        }
+        for name, hist in self.frame_hist.items():
+            out[name] = summary(hist)
+        for name, hist in self.tick_hist.items():
+            out[name] = {g: summary(hist, i) for i, g in enumerate(list(self.groups))}
+        return out
@@ -0,0 +1,117 @@
+"""
+Conflation stage between the websocket decode callback and Socket.IO.
+
+Decoded frames land in a TickTable (latest state per instrument); a
+background thread flushes the dirty slots as one merged ``tick_update``
+every ``interval_ms`` milliseconds, so the emit rate no longer follows the
+upstream frame rate. Slower channels (depth, greeks, ...) ride on the same
+thread through ``add_periodic()``.
+"""
+import threading
+import time
+
+
+class TickConflator:
+    """Keeps the latest tick per instrument and emits merged batches on a fixed cadence."""
+
+    def __init__(self, table, emit, interval_ms: int = 250):
+        self.table = table
+        self.emit = emit
+        self.interval = max(int(interval_ms), 0) / 1000.0
+        self.lock = table.lock
+        self.stop_event = threading.Event()
+        self.thread = None
+        self.periodic: list = []  # [fn, interval_s, next_due]
+        # Callables (slots: np.ndarray) run under the lock as each batch is taken for emit
+        self.emit_hooks: list = []
+
+        # 📊 Counters
+        self.frames_in = 0
+        self.ticks_in = 0
+        self.emits_out = 0
+        self.last_emit_ts = 0.0
+
+    @property
+    def ticks_conflated(self) -> int:
+        return self.table.overwrites
+
+    # 🧩 Input side (websocket callback thread)
+    def on_frame(self, msg, dedup: bool = False) -> int:
+        with self.lock:
+            n = self.table.apply(msg, dedup)
+            self.frames_in += 1
+            self.ticks_in += n
+        if n and self.interval == 0:
+            self.flush()
+        return n
+
+    def on_records(self, slots, rec, current_ts: int = 0, dedup: bool = False) -> int:
+        """Columns already decoded elsewhere (``decode_pool``) — one vectorized write."""
+        with self.lock:
+            n = self.table.apply_records(slots, rec, current_ts, dedup)
+            self.frames_in += 1
+            self.ticks_in += n
+        if n and self.interval == 0:
+            self.flush()
+        return n
+
+    # 📤 Output side (flush thread)
+    def flush(self) -> int:
+        with self.lock:
+            slots = self.table.dirty_slots()
+            payload = self.table.payload(slots)
+            for hook in self.emit_hooks:
+                hook(slots)
+        if not payload:
+            return 0
+        self.emit(payload)
+        self.emits_out += 1
+        self.last_emit_ts = time.time()
+        return len(payload)
+
+    def add_periodic(self, fn, interval_ms: int):
+        """Run ``fn()`` on the flush thread at most every ``interval_ms`` milliseconds."""
+        self.periodic.append([fn, max(int(interval_ms), 0) / 1000.0, 0.0])
+
+    def _run_periodic(self, now: float = None):
+        now = time.monotonic() if now is None else now
+        for job in self.periodic:
+            fn, every, due = job
+            if now < due:
+                continue
+            job[2] = now + every
+            try:
+                fn()
+            except Exception as e:
+                print(f"⚠️ Periodic job {getattr(fn, '__name__', fn)} failed:", e)
+
+    def _run(self):
+        # With interval 0 ticks go out inline from on_frame(); the thread only drives periodic jobs
+        wait = self.interval or 0.1
+        while not self.stop_event.wait(wait):
+            if self.interval:
+                try:
+                    self.flush()
+                except Exception as e:
+                    print("⚠️ Conflator flush error:", e)
+            self._run_periodic()
+
+    def start(self):
+        if self.thread and self.thread.is_alive():
+            return
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+        print(f"⏱️ Tick conflation started ({int(self.interval * 1000)} ms window)")
+
+    def stop(self):
+        self.stop_event.set()
+
+    def stats(self) -> dict:
+        return {
+            "interval_ms": int(self.interval * 1000),
+            "frames_in": self.frames_in,
+            "ticks_in": self.ticks_in,
+            "ticks_conflated": self.ticks_conflated,
+            "emits_out": self.emits_out,
+            "last_emit_ts": self.last_emit_ts,
+        }
@@ -0,0 +1,281 @@
+"""
+Local stand-in for the Upstox V3 market data feed.
+
+Serves two endpoints so the app runs fully offline:
+
+  * HTTP  GET .../authorize → {"status": "success",
+                               "data": {"authorized_redirect_uri": "ws://host:ws_port/feed"}}
+  * WS    accepts the same ``{"guid", "method": "sub"|"unsub"|"change_mode",
+          "data": {"mode", "instrumentKeys"}}`` JSON the app sends and streams
+          binary ``FeedResponse`` frames built from ``MarketDataFeedV3_pb2``
+
+Each subscribed key ticks as a random walk in the mode it was subscribed
+with (``ltpc``, ``full``/``full_d5``, ``full_d30``, ``option_greeks``;
+index keys get ``indexFF`` in full modes), or in ``--mode`` when forced.
+Load shape: ``--rate`` ticks/s per instrument, ``--burst`` probability of
+a frame being followed by a back-to-back burst, ``--drop`` probability of
+silently dropping a frame, ``--disconnect-every`` seconds between forced
+server-side closes. ``--instruments N`` streams N synthetic NSE_EQ keys on
+every connection even if nobody subscribed them.
+
+Point the app at it with:
+    UPSTOX_AUTHORIZE_URL=http://127.0.0.1:8765/v3/feed/market-data-feed/authorize
+    UPSTOX_ACCESS_TOKEN=<any 20+ chars> UPSTOX_IGNORE_MARKET_HOURS=1
+
+Usage:
+    python feed_simulator.py [--instruments 0] [--rate 2] [--fps 10] [--burst 0.05]
+                             [--drop 0] [--disconnect-every 0] [--mode ...]
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.join(ROOT, "src", "pages"))
+
+import MarketDataFeedV3_pb2 as pb  # noqa: E402
+
+MODES = ("ltpc", "full", "full_d5", "full_d30", "option_greeks")
+DEPTH = {"full": 5, "full_d5": 5, "full_d30": 30}
+INDEX_PREFIXES = ("NSE_INDEX|", "BSE_INDEX|")
+
+
+class _Instrument:
+    """Random-walk state for one simulated key."""
+
+    __slots__ = ("price", "cp", "open", "high", "low", "vtt", "oi")
+
+    def __init__(self, rnd: random.Random, key: str):
+        base = 20000.0 if key.startswith(INDEX_PREFIXES) else rnd.uniform(50, 3000)
+        self.price = self.cp = self.open = self.high = self.low = base
+        self.vtt = 0
+        self.oi = rnd.randint(1_000, 500_000)
+
+    def step(self, rnd: random.Random) -> int:
+        self.price = max(0.05, round(self.price * (1 + rnd.gauss(0, 0.0004)), 2))
+        self.high = max(self.high, self.price)
+        self.low = min(self.low, self.price)
+        qty = rnd.randint(1, 500)
+        self.vtt += qty
+        return qty
+
+
+def build_frame(rnd: random.Random, ticks: list, state: dict, now_ms: int) -> bytes:
+    """Serialized FeedResponse for [(key, mode)] ticking at ``now_ms``."""
+    msg = pb.FeedResponse()
+    msg.type = pb.live_feed
+    msg.currentTs = now_ms
+    for key, mode in ticks:
+        inst = state.get(key)
+        if inst is None:
+            inst = state[key] = _Instrument(rnd, key)
+        qty = inst.step(rnd)
+        feed = msg.feeds[key]
+        if mode == "ltpc":
+            lt = feed.ltpc
+        elif mode == "option_greeks":
+            flg = feed.firstLevelWithGreeks
+            lt = flg.ltpc
+            flg.firstDepth.bidP, flg.firstDepth.bidQ = inst.price - 0.05, rnd.randint(50, 5000)
+            flg.firstDepth.askP, flg.firstDepth.askQ = inst.price + 0.05, rnd.randint(50, 5000)
+            g = flg.optionGreeks
+            g.delta, g.gamma = round(rnd.uniform(-1, 1), 4), round(rnd.uniform(0, 0.01), 6)
+            g.theta, g.vega, g.rho = round(-rnd.uniform(0, 20), 4), round(rnd.uniform(0, 15), 4), 0.01
+            flg.vtt, flg.oi, flg.iv = inst.vtt, inst.oi, round(rnd.uniform(0.1, 0.4), 4)
+        elif key.startswith(INDEX_PREFIXES):
+            iff = feed.fullFeed.indexFF
+            lt = iff.ltpc
+            bar = iff.marketOHLC.ohlc.add()
+            bar.interval, bar.open, bar.high, bar.low, bar.close = "1d", inst.open, inst.high, inst.low, inst.price
+        else:
+            mff = feed.fullFeed.marketFF
+            lt = mff.ltpc
+            for lvl in range(DEPTH.get(mode, 5)):
+                q = mff.marketLevel.bidAskQuote.add()
+                q.bidP, q.bidQ = round(inst.price - 0.05 * (lvl + 1), 2), rnd.randint(1, 2000)
+                q.askP, q.askQ = round(inst.price + 0.05 * (lvl + 1), 2), rnd.randint(1, 2000)
+            bar = mff.marketOHLC.ohlc.add()
+            bar.interval, bar.open, bar.high, bar.low, bar.close = "1d", inst.open, inst.high, inst.low, inst.price
+            bar.vol, bar.ts = inst.vtt, now_ms - now_ms % 86_400_000
+            mff.vtt, mff.atp = inst.vtt, round((inst.high + inst.low) / 2, 2)
+            mff.tbq, mff.tsq = rnd.randint(1_000, 100_000), rnd.randint(1_000, 100_000)
+        lt.ltp, lt.ltt, lt.ltq, lt.cp = inst.price, now_ms, qty, inst.cp
+    return msg.SerializeToString()
+
+
+def market_info_frame(now_ms: int) -> bytes:
+    msg = pb.FeedResponse()
+    msg.type = pb.market_info
+    msg.currentTs = now_ms
+    for seg in ("NSE_EQ", "NSE_FO", "NSE_INDEX", "BSE_EQ", "BSE_FO", "BSE_INDEX"):
+        msg.marketInfo.segmentStatus[seg] = pb.NORMAL_OPEN
+    return msg.SerializeToString()
+
+
+class FeedSimulator:
+    """Authorize HTTP endpoint + protobuf websocket server with a configurable load shape."""
+
+    def __init__(self, host: str = "127.0.0.1", http_port: int = 8765, ws_port: int = 8766,
+                 instruments: int = 0, mode: str = None, rate: float = 2.0, fps: float = 10.0,
+                 burst: float = 0.0, burst_size: int = 20, drop: float = 0.0,
+                 disconnect_every: float = 0.0, seed: int = 7):
+        if mode and mode not in MODES:
+            raise ValueError(f"Unknown mode {mode} (use one of {', '.join(MODES)})")
+        self.host, self.http_port, self.ws_port = host, http_port, ws_port
+        self.instruments = instruments
+        self.mode = mode
+        self.rate = max(rate, 0.0)
+        self.fps = max(fps, 0.1)
+        self.burst, self.burst_size = burst, max(int(burst_size), 1)
+        self.drop = drop
+        self.disconnect_every = disconnect_every
+        self.seed = seed
+        self.http = None
+
+        # 📊 Counters
+        self.connections = 0
+        self.frames_sent = 0
+        self.frames_dropped = 0
+        self.ticks_sent = 0
+        self.disconnects = 0
+
+    @property
+    def ws_url(self) -> str:
+        return f"ws://{self.host}:{self.ws_port}/feed"
+
+    # 🔑 Authorize endpoint
+    def start_http(self):
+        sim = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.rstrip("/").endswith("/stats"):
+                    body = sim.stats()
+                elif "authorize" in self.path:
+                    body = {"status": "success", "data": {
+                        "authorized_redirect_uri": sim.ws_url, "authorizedRedirectUri": sim.ws_url,
+                    }}
+                else:
+                    self.send_error(404)
+                    return
+                raw = json.dumps(body).encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(raw)))
+                self.end_headers()
+                self.wfile.write(raw)
+
+            def log_message(self, *args):
+                pass
+
+        self.http = ThreadingHTTPServer((self.host, self.http_port), Handler)
+        threading.Thread(target=self.http.serve_forever, daemon=True).start()
+        print(f"🔑 Authorize endpoint: http://{self.host}:{self.http_port}/v3/feed/market-data-feed/authorize")
+
+    # 📡 Websocket side
+    async def _reader(self, ws, subs: dict):
+        async for raw in ws:
+            try:
+                req = json.loads(raw.decode() if isinstance(raw, (bytes, bytearray)) else raw)
+            except ValueError:
+                continue
+            data = req.get("data") or {}
+            keys = data.get("instrumentKeys") or []
+            method = req.get("method")
+            if method in ("sub", "change_mode"):
+                mode = self.mode or data.get("mode") or "ltpc"
+                for k in keys:
+                    subs[k] = mode
+            elif method == "unsub":
+                for k in keys:
+                    subs.pop(k, None)
+
+    async def _handler(self, ws, path=None):
+        self.connections += 1
+        rnd = random.Random(self.seed + self.connections)
+        subs: dict[str, str] = {
+            f"NSE_EQ|SIM{i:05d}": self.mode or "ltpc" for i in range(self.instruments)
+        }
+        state: dict = {}
+        reader = asyncio.ensure_future(self._reader(ws, subs))
+        deadline = time.monotonic() + self.disconnect_every * rnd.uniform(0.5, 1.5) if self.disconnect_every else None
+        per_frame = min(self.rate / self.fps, 1.0)
+        print(f"🟢 Simulator client #{self.connections} connected")
+        try:
+            await ws.send(market_info_frame(int(time.time() * 1000)))
+            while not reader.done():
+                await asyncio.sleep(1.0 / self.fps)
+                if deadline and time.monotonic() >= deadline:
+                    self.disconnects += 1
+                    print(f"✂️ Simulator forcing disconnect of client #{self.connections}")
+                    await ws.close(code=1011, reason="simulated disconnect")
+                    break
+                frames = 1 + (self.burst_size if self.burst and rnd.random() < self.burst else 0)
+                for _ in range(frames):
+                    ticks = [(k, m) for k, m in list(subs.items()) if rnd.random() < per_frame]
+                    if not ticks:
+                        continue
+                    if self.drop and rnd.random() < self.drop:
+                        self.frames_dropped += 1
+                        continue
+                    await ws.send(build_frame(rnd, ticks, state, int(time.time() * 1000)))
+                    self.frames_sent += 1
+                    self.ticks_sent += len(ticks)
+        except Exception as e:
+            print("🔌 Simulator client gone:", e)
+        finally:
+            reader.cancel()
+
+    async def serve(self):
+        import websockets
+        async with websockets.serve(self._handler, self.host, self.ws_port, max_size=None):
+            print(f"📡 Feed websocket: {self.ws_url}")
+            await asyncio.Future()
+
+    def stats(self) -> dict:
+        return {
+            "connections": self.connections,
+            "frames_sent": self.frames_sent,
+            "frames_dropped": self.frames_dropped,
+            "ticks_sent": self.ticks_sent,
+            "disconnects": self.disconnects,
+        }
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--http-port", type=int, default=8765)
+    ap.add_argument("--ws-port", type=int, default=8766)
+    ap.add_argument("--instruments", type=int, default=0, help="synthetic keys streamed without a sub")
+    ap.add_argument("--mode", choices=MODES, default=None, help="force one mode for every key")
+    ap.add_argument("--rate", type=float, default=2.0, help="ticks/s per instrument")
+    ap.add_argument("--fps", type=float, default=10.0, help="frames/s per connection")
+    ap.add_argument("--burst", type=float, default=0.0, help="probability a frame starts a burst")
+    ap.add_argument("--burst-size", type=int, default=20, help="extra back-to-back frames per burst")
+    ap.add_argument("--drop", type=float, default=0.0, help="probability a frame is dropped")
+    ap.add_argument("--disconnect-every", type=float, default=0.0, help="seconds between forced closes (0 = never)")
+    ap.add_argument("--seed", type=int, default=7)
+    args = ap.parse_args()
+
+    sim = FeedSimulator(
+        host=args.host, http_port=args.http_port, ws_port=args.ws_port,
+        instruments=args.instruments, mode=args.mode, rate=args.rate, fps=args.fps,
+        burst=args.burst, burst_size=args.burst_size, drop=args.drop,
+        disconnect_every=args.disconnect_every, seed=args.seed,
+    )
+    sim.start_http()
+    try:
+        asyncio.run(sim.serve())
+    except KeyboardInterrupt:
+        print("👋 Simulator stopped", sim.stats())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,304 @@
+"""
+Building blocks for supervising upstream feed connections.
+
+``FeedConnection`` wraps one ``websocket.WebSocketApp`` and its thread, and
+``AsyncFeedConnection`` one ``websockets`` client on an asyncio loop. Both
+track what is subscribed on that socket and when frames arrive, so the
+streamer can keep a warm standby, overlap two sockets during a token
+rotation and measure the gap when it swaps. ``Backoff`` gives jittered
+exponential retry delays in place of fixed sleeps, ``FailoverLog``
+records each swap with the measured feed gap, and ``FrameMeter`` tracks
+a streamer's frame rate and exchange-clock lag.
+"""
+import asyncio
+import random
+import threading
+import time
+from collections import deque
+
+import numpy as np
+import websocket  # websocket-client
+import websockets
+
+
+class Backoff:
+    """Exponential backoff with jitter: base·2ⁿ capped at ``cap``, scaled by U(1-jitter, 1)."""
+
+    def __init__(self, base: float = 1.0, cap: float = 300.0, jitter: float = 0.5):
+        self.base = max(float(base), 0.05)
+        self.cap = max(float(cap), self.base)
+        self.jitter = min(max(float(jitter), 0.0), 1.0)
+        self.attempt = 0
+
+    def next(self) -> float:
+        delay = min(self.cap, self.base * (2 ** min(self.attempt, 30)))
+        self.attempt += 1
+        return delay * random.uniform(1.0 - self.jitter, 1.0)
+
+    def reset(self):
+        self.attempt = 0
+
+
+class _Connection:
+    """Bookkeeping shared by the thread and asyncio connection flavours."""
+
+    def __init__(self, name: str, url: str, token: str, on_frame, on_close=None):
+        self.name = name
+        self.url = url
+        self.token = token
+        self.on_frame = on_frame
+        self.on_close = on_close
+        self.opened = threading.Event()
+        self.closed = threading.Event()
+        self.close_reason = None
+        self.keys: set = set()  # instrument keys subscribed on this socket
+        self.frames = 0
+        self.first_frame_ns = 0
+        self.last_frame_ns = 0
+        # Frames carrying ticks for subscribed keys; market_info and other status frames don't count
+        self.data_frames = 0
+        self.first_data_ns = 0
+        self.last_data_ns = 0
+        self.opened_ns = 0
+        self.ws = None
+
+    def mark_frame(self) -> int:
+        now = time.time_ns()
+        if not self.frames:
+            self.first_frame_ns = now
+        self.frames += 1
+        self.last_frame_ns = now
+        return now
+
+    def mark_data(self, now_ns: int):
+        if not self.data_frames:
+            self.first_data_ns = now_ns
+        self.data_frames += 1
+        self.last_data_ns = now_ns
+
+    def alive(self) -> bool:
+        return self.opened.is_set() and not self.closed.is_set()
+
+    def stats(self) -> dict:
+        return {
+            "name": self.name,
+            "alive": self.alive(),
+            "keys": len(self.keys),
+            "frames": self.frames,
+            "data_frames": self.data_frames,
+            "last_frame_age_ms": round((time.time_ns() - self.last_frame_ns) / 1e6, 1) if self.frames else None,
+        }
+
+
+class FeedConnection(_Connection):
+    """
+    One websocket-client socket on its own thread. ``on_close`` runs on that
+    thread when the socket ends, so the supervisor can react without polling.
+    """
+
+    def __init__(self, name: str, url: str, token: str, on_frame, on_close=None,
+                 ping_interval: int = 20, ping_timeout: int = 10):
+        super().__init__(name, url, token, on_frame, on_close)
+        self.ws = websocket.WebSocketApp(
+            url,
+            on_open=self._on_open,
+            on_message=lambda ws, message: on_frame(self, message),
+            on_error=self._on_error,
+            on_close=self._on_close,
+        )
+        self.thread = threading.Thread(
+            target=self._run, args=(ping_interval, ping_timeout), daemon=True,
+        )
+
+    def _run(self, ping_interval: int, ping_timeout: int):
+        try:
+            self.ws.run_forever(ping_interval=ping_interval, ping_timeout=ping_timeout)
+        finally:
+            if not self.closed.is_set():
+                # run_forever can return without on_close (e.g. after ws.close())
+                self._on_close(self.ws, None, "socket thread exited")
+
+    def _on_open(self, ws):
+        self.opened_ns = time.time_ns()
+        self.opened.set()
+        print(f"✅ Upstox WS [{self.name}] connected.")
+
+    def _on_close(self, ws, code, reason):
+        self.close_reason = self.close_reason or f"closed code={code} reason={reason}"
+        self.closed.set()
+        print(f"🔌 Upstox WS [{self.name}] closed: code={code}, reason={reason}")
+        if self.on_close:
+            self.on_close(self)
+
+    def _on_error(self, ws, error):
+        self.close_reason = self.close_reason or f"error: {error}"
+        print(f"⚠️ Upstox WS [{self.name}] error:", error)
+
+    def start(self, open_timeout: float) -> bool:
+        """Start the socket thread and wait for the handshake. False if it never opened."""
+        self.thread.start()
+        if self.opened.wait(open_timeout) and not self.closed.is_set():
+            return True
+        self.close("open timeout")
+        return False
+
+    def alive(self) -> bool:
+        return super().alive() and self.thread.is_alive()
+
+    def send(self, text: str):
+        self.ws.send(text)
+
+    def close(self, reason: str = "closed by supervisor"):
+        self.close_reason = self.close_reason or reason
+        try:
+            self.ws.close()
+        except Exception:
+            pass
+        self.closed.set()
+
+
+class AsyncFeedConnection(_Connection):
+    """
+    One ``websockets`` client socket read by a task on the caller's event
+    loop. ``on_close`` runs on that loop when the socket ends, so the
+    supervisor can react without polling.
+    """
+
+    def __init__(self, name: str, url: str, token: str, on_frame, on_close=None,
+                 ping_interval: int = 20, ping_timeout: int = 10):
+        super().__init__(name, url, token, on_frame, on_close)
+        self.ping_interval = ping_interval
+        self.ping_timeout = ping_timeout
+        self.reader = None
+
+    async def start(self, open_timeout: float) -> bool:
+        """Connect; False (and closed) if the handshake does not finish in ``open_timeout``."""
+        try:
+            self.ws = await asyncio.wait_for(websockets.connect(
+                self.url, ping_interval=self.ping_interval, ping_timeout=self.ping_timeout, max_size=None,
+            ), open_timeout)
+        except Exception as e:
+            self.close_reason = f"connect failed: {e}"
+            self.closed.set()
+            return False
+        self.opened_ns = time.time_ns()
+        self.opened.set()
+        print(f"✅ Upstox WS [{self.name}] connected.")
+        self.reader = asyncio.create_task(self._read())
+        return True
+
+    async def _read(self):
+        try:
+            async for message in self.ws:
+                self.on_frame(self, message)
+            self.close_reason = self.close_reason or f"closed code={self.ws.close_code} reason={self.ws.close_reason}"
+        except asyncio.CancelledError:
+            self.close_reason = self.close_reason or "cancelled"
+        except Exception as e:
+            self.close_reason = self.close_reason or f"error: {e}"
+        finally:
+            self.closed.set()
+            print(f"🔌 Upstox WS [{self.name}] closed: {self.close_reason}")
+            if self.on_close:
+                self.on_close(self)
+
+    async def send(self, text: str):
+        await self.ws.send(text)
+
+    async def aclose(self, reason: str = "closed by supervisor"):
+        self.close_reason = self.close_reason or reason
+        self.closed.set()
+        if self.ws is not None:
+            try:
+                await asyncio.wait_for(self.ws.close(), 5)
+            except Exception:
+                pass
+        if self.reader is not None and not self.reader.done():
+            self.reader.cancel()
+
+
+class FrameMeter:
+    """Frame rate over ~1 s windows plus lag of the exchange clock (FeedResponse.currentTs)."""
+
+    def __init__(self):
+        self.frames = 0
+        self.window_start = time.monotonic()
+        self.window_frames = 0
+        self.rate = 0.0
+        self.lag_ms = None  # EWMA
+        self.max_lag_ms = 0.0
+
+    def frame(self, exchange_ts_ms: int = 0):
+        self.frames += 1
+        self.window_frames += 1
+        now = time.monotonic()
+        elapsed = now - self.window_start
+        if elapsed >= 1.0:
+            self.rate = self.window_frames / elapsed
+            self.window_start = now
+            self.window_frames = 0
+        if exchange_ts_ms:
+            self.lag(exchange_ts_ms)
+
+    def lag(self, exchange_ts_ms: int):
+        """Fold one frame's exchange clock into the lag EWMA (called after decode when it runs off-thread)."""
+        lag = time.time() * 1000 - exchange_ts_ms
+        self.lag_ms = lag if self.lag_ms is None else 0.9 * self.lag_ms + 0.1 * lag
+        self.max_lag_ms = max(self.max_lag_ms, lag)
+
+    def stats(self) -> dict:
+        idle = time.monotonic() - self.window_start
+        # A stalled connection never closes its window; report the decayed rate instead
+        rate = self.rate if idle < 2.0 else self.window_frames / idle
+        return {
+            "frames": self.frames,
+            "frames_per_s": round(rate, 1),
+            "lag_ms": round(self.lag_ms, 1) if self.lag_ms is not None else None,
+            "max_lag_ms": round(self.max_lag_ms, 1),
+        }
+
+
+class FailoverLog:
+    """Swaps of the active upstream socket, with the feed gap each one caused."""
+
+    def __init__(self, keep: int = 100):
+        self.events: deque = deque(maxlen=keep)
+        self.pending = None
+        self.count = 0
+
+    def begin(self, reason: str, via: str, last_frame_ns: int, first_frame_ns: int = 0):
+        """
+        Record a swap. ``last_frame_ns`` is the last frame seen on the old
+        socket; the gap closes at the first frame on the new one, now if it
+        already arrived (overlap) or later through ``frame()``.
+        """
+        self.count += 1
+        event = {"at": time.time(), "reason": reason, "via": via, "gap_ms": None}
+        self.events.append(event)
+        self.pending = None
+        if not last_frame_ns:
+            return
+        if first_frame_ns:
+            event["gap_ms"] = round(max(first_frame_ns - last_frame_ns, 0) / 1e6, 1)
+        else:
+            self.pending = (event, last_frame_ns)
+
+    def frame(self, now_ns: int):
+        """First frame on the promoted socket closes the pending gap."""
+        if self.pending is None:
+            return
+        event, last_ns = self.pending
+        self.pending = None
+        event["gap_ms"] = round(max(now_ns - last_ns, 0) / 1e6, 1)
+
+    def stats(self) -> dict:
+        gaps = [e["gap_ms"] for e in self.events if e["gap_ms"] is not None]
+        out = {"failovers": self.count, "recent": list(self.events)[-10:]}
+        if gaps:
+            a = np.asarray(gaps)
+            out["gap_ms"] = {
+                "last": gaps[-1],
+                "p50": round(float(np.percentile(a, 50)), 1),
+                "max": round(float(a.max()), 1),
+            }
+        return out
@@ -0,0 +1,213 @@
+"""
+The decode → store → emit wiring shared by app.py and tick_replay.py.
+
+``pipeline_settings()`` reads the UPSTOX_* knobs of the tick pipeline (the
+defaults live here only) and ``FeedWiring`` builds the stores, the
+conflator with its periodic emitters, watchlist rooms, slow-client queues,
+option greeks, alerts and stage metrics from them. app.py hands it the
+Flask-SocketIO server; tick_replay hands it a stub that only records what
+would have been sent, so a replay exercises the same routing code.
+"""
+import os
+import time
+
+from tick_table import TickTable
+from order_book import OrderBookStore
+from option_greeks import OptionGreeksStore
+from tick_history import TickHistory, parse_segments
+from bars import BarBuilder, parse_timeframes
+from indicators import IndicatorEngine
+from alerts import AlertEngine
+from feed_pipeline import TickConflator
+from feed_metrics import FeedMetrics
+from fanout import WatchlistRooms, OutboundQueues
+
+INDEX_KEY_PREFIXES = ("NSE_INDEX|", "BSE_INDEX|")
+
+
+def pipeline_settings(env=None) -> dict:
+    """UPSTOX_* pipeline settings from ``env`` (default ``os.environ``)."""
+    env = os.environ if env is None else env
+    sub_mode = env.get("UPSTOX_SUB_MODE", "ltpc").strip()
+    emit_interval_ms = int(env.get("UPSTOX_EMIT_INTERVAL_MS", "250"))
+    return {
+        "tick_capacity": int(env.get("UPSTOX_TICK_CAPACITY", "4096")),
+        # Conflation window for tick_update emits (0 = emit every frame)
+        "emit_interval_ms": emit_interval_ms,
+        # Order book depth kept per instrument (full → 5 levels, full_d30 → 30) and depth_update cadence
+        "depth_levels": int(env.get("UPSTOX_DEPTH_LEVELS", "30" if sub_mode == "full_d30" else "5")),
+        "depth_emit_ms": int(env.get("UPSTOX_DEPTH_EMIT_MS", "1000")),
+        "greeks_emit_ms": int(env.get("UPSTOX_GREEKS_EMIT_MS", "1000")),
+        # Intraday tick ring size + eviction per segment: "SEGMENT=capacity[:overwrite|decimate],..."
+        "history_segments": env.get("UPSTOX_HISTORY_SEGMENTS", "NSE_INDEX=8192:decimate,default=1024:decimate"),
+        # Streaming bar timeframes with closed bars kept per instrument: "tf:capacity,..." + bar_update cadence
+        "bar_timeframes": env.get("UPSTOX_BAR_TIMEFRAMES", "1s:900,1m:400,5m:100,15m:30"),
+        "bar_emit_ms": int(env.get("UPSTOX_BAR_EMIT_MS", "1000")),
+        # Bar timeframe the streaming indicators run on + indicator_update cadence
+        "indicator_tf": env.get("UPSTOX_INDICATOR_TF", "1m"),
+        "indicator_emit_ms": int(env.get("UPSTOX_INDICATOR_EMIT_MS", "1000")),
+        # Alert rules are evaluated once per conflated batch by default
+        "alert_eval_ms": int(env.get("UPSTOX_ALERT_EVAL_MS", str(emit_interval_ms or 250))),
+        # Per-client backpressure: transport backlog (packets) that marks a client slow /
+        # lets it resume, merged rows buffered while slow, and how long it may stay slow
+        "client_high_water": int(env.get("UPSTOX_CLIENT_HIGH_WATER", "64")),
+        "client_low_water": int(env.get("UPSTOX_CLIENT_LOW_WATER", "8")),
+        "client_max_rows": int(env.get("UPSTOX_CLIENT_MAX_ROWS", "5000")),
+        "client_max_lag_s": float(env.get("UPSTOX_CLIENT_MAX_LAG_S", "30")),
+        "outbound_check_ms": int(env.get("UPSTOX_OUTBOUND_CHECK_MS", "250")),
+        # Stage latency histograms + Prometheus /metrics (0 = off); rendered text is reused for this long
+        "metrics": env.get("UPSTOX_METRICS", "1").strip() == "1",
+        "metrics_cache_ms": int(env.get("UPSTOX_METRICS_CACHE_MS", "1000")),
+    }
+
+
+class FeedWiring:
+    """
+    Stores, conflator and Socket.IO routing for one feed.
+
+    ``socketio`` needs ``emit(event, data, to=None, skip_sid=None)`` (and
+    ``server.disconnect`` for evicting slow clients). ``backlog(sid)`` is the
+    client's transport queue depth, ``valid_key`` gates alert rules and
+    ``release_keys(owner, keys)`` drops the upstream subscription of retired
+    ``once`` alerts. Nothing runs until ``start()``; replay drives
+    ``conflator.flush()`` and ``run_periodic()`` on recorded time instead.
+    """
+
+    def __init__(self, socketio, settings: dict = None, option_meta: dict = None,
+                 valid_key=None, backlog=None, release_keys=None):
+        self.socketio = socketio
+        self.settings = s = settings or pipeline_settings()
+        self.release_keys = release_keys
+
+        self.table = TickTable(s["tick_capacity"])
+        self.books = OrderBookStore(self.table, s["depth_levels"])
+        self.history = TickHistory(self.table, parse_segments(s["history_segments"]))
+        self.bars = BarBuilder(self.table, parse_timeframes(s["bar_timeframes"]))
+        self.indicators = IndicatorEngine(self.bars, s["indicator_tf"])
+        self.alerts = AlertEngine(self.table, self.indicators, valid_key=valid_key)
+        self.greeks = OptionGreeksStore(self.table, option_meta if option_meta is not None else {})
+
+        # One room per distinct client watchlist — each batch is serialized once per room
+        self.rooms = WatchlistRooms()
+        # Slow clients are skipped by room emits and get merged latest-per-key updates instead
+        self.outbound = OutboundQueues(
+            backlog or (lambda sid: 0),
+            high_water=s["client_high_water"],
+            low_water=s["client_low_water"],
+            max_rows=s["client_max_rows"],
+            max_lag_s=s["client_max_lag_s"],
+        )
+
+        self.conflator = TickConflator(self.table, emit=self.emit_ticks, interval_ms=s["emit_interval_ms"])
+        self.conflator.add_periodic(self.emit_depth, s["depth_emit_ms"])
+        self.conflator.add_periodic(self.emit_bars, s["bar_emit_ms"])
+        self.conflator.add_periodic(self.emit_indicators, s["indicator_emit_ms"])
+        self.conflator.add_periodic(self.evaluate_alerts, s["alert_eval_ms"])
+        self.conflator.add_periodic(self.flush_outbound, s["outbound_check_ms"])
+        self.conflator.add_periodic(self.emit_greeks, s["greeks_emit_ms"])
+
+        self.metrics = None
+        if s["metrics"]:
+            self.metrics = FeedMetrics(self.table, self.conflator, cache_ms=s["metrics_cache_ms"])
+
+    def start(self):
+        self.conflator.start()
+
+    def run_periodic(self, now: float = None):
+        """Due periodic emitters, for callers that drive the conflator without its thread (``now`` in seconds)."""
+        self.conflator._run_periodic(now)
+
+    # 🧩 Input side
+    def apply(self, msg, dedup: bool = False, received_ns: int = None) -> int:
+        """A decoded FeedResponse into the columns (and metrics); emits happen on flush."""
+        n = self.conflator.on_frame(msg, dedup)
+        if self.metrics is not None:
+            self.metrics.decoded(msg.currentTs, received_ns or time.time_ns(), time.time_ns())
+        return n
+
+    # 📤 Routing
+    def emit_to_rooms(self, event: str, payload: dict):
+        """Send each watchlist room only its slice of a {instrument_key: data} batch."""
+        for room, part in self.rooms.routes(payload):
+            slow = self.outbound.slow_among(self.rooms.members(room))
+            for sid in slow:
+                self.outbound.defer(sid, event, part)
+            self.socketio.emit(event, part, to=room, skip_sid=slow or None)
+
+    def emit_by_prefix(self, event: str, payload: dict, index_event: str = None):
+        """Route a batch by key prefix: indices broadcast, equities to watchlist rooms."""
+        index_part = {k: v for k, v in payload.items() if k.startswith(INDEX_KEY_PREFIXES)}
+        if index_part:
+            index_event = index_event or event
+            slow = self.outbound.slow_among(self.outbound.sids())
+            for sid in slow:
+                self.outbound.defer(sid, index_event, index_part)
+            self.socketio.emit(index_event, index_part, skip_sid=slow or None)
+            if len(index_part) == len(payload):
+                return
+            payload = {k: v for k, v in payload.items() if k not in index_part}
+        self.emit_to_rooms(event, payload)
+
+    # ⏱️ Emitters
+    def emit_ticks(self, payload: dict):
+        started = time.perf_counter_ns()
+        self.emit_by_prefix("tick_update", payload, index_event="index_update")
+        if self.metrics is not None:
+            self.metrics.emitted(len(payload), time.perf_counter_ns() - started)
+
+    def emit_depth(self):
+        with self.table.lock:
+            payload = self.books.payload()
+        if payload:
+            self.emit_to_rooms("depth_update", payload)
+
+    def emit_bars(self):
+        """Close bars the exchange clock has moved past, then push closes and in-progress bars."""
+        with self.table.lock:
+            self.bars.sweep()
+            closed = self.bars.drain_closed()
+            updates = self.bars.updates()
+        if closed:
+            self.emit_by_prefix("bar_close", closed)
+        if updates:
+            self.emit_by_prefix("bar_update", updates)
+
+    def emit_indicators(self):
+        with self.table.lock:
+            payload = self.indicators.payload()
+        if payload:
+            self.emit_by_prefix("indicator_update", payload)
+
+    def emit_greeks(self):
+        """Push refreshed chain aggregates to the clients watching each chain."""
+        with self.table.lock:
+            snaps = self.greeks.aggregate()
+        for chain, snap in snaps.items():
+            self.socketio.emit("greeks_update", {chain: snap}, to=f"oc:{chain}")
+
+    def evaluate_alerts(self):
+        """Fired alerts go only to the Socket.IO session that owns the rule; HTTP owners poll /api/alerts."""
+        fired, retired = self.alerts.evaluate()
+        for owner, events in fired:
+            if owner and not owner.startswith("http:"):
+                self.socketio.emit("alert_fired", events, to=owner)
+        if self.release_keys is None:
+            return
+        # Retired ``once`` rules no longer hold their upstream subscription
+        by_owner: dict[str, set] = {}
+        for owner, key in retired:
+            by_owner.setdefault(owner, set()).add(key)
+        for owner, keys in by_owner.items():
+            self.release_keys(f"alerts:{owner}", list(keys - self.alerts.keys_for(owner)))
+
+    def flush_outbound(self):
+        """Deliver merged updates to clients that caught up; evict ones that never do."""
+        deliveries, evictions = self.outbound.service()
+        for sid, event, rows in deliveries:
+            self.socketio.emit(event, rows, to=sid)
+        for sid in evictions:
+            print(f"🐢 Client {sid} stayed behind > {self.settings['client_max_lag_s']}s — disconnecting")
+            try:
+                self.socketio.server.disconnect(sid, namespace="/")
+            except Exception as e:
+                print(f"⚠️ Failed to disconnect slow client {sid}:", e)
@@ -0,0 +1,34 @@
+"""
+Gunicorn settings for the Flask-SocketIO app (``gunicorn -c gunicorn.conf.py wsgi:app``).
+
+The worker class follows UPSTOX_ASYNC_MODE from the environment or ``.env``
+(default eventlet). Socket.IO session state, the tick table and the
+upstream feed connection all live in process, so this runs exactly one
+worker; one event-loop worker holds thousands of websocket clients.
+"""
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, ROOT)
+from early_env import early_env  # noqa: E402
+
+# Exported so app.py (imported by the worker) runs the mode the worker class was picked for
+os.environ["UPSTOX_ASYNC_MODE"] = early_env("UPSTOX_ASYNC_MODE", "eventlet", ROOT)
+_mode = os.environ["UPSTOX_ASYNC_MODE"].strip().lower()
+
+bind = os.getenv("BIND", f"0.0.0.0:{os.getenv('PORT', '5000')}")
+workers = 1
+worker_class = {
+    "eventlet": "eventlet",
+    "gevent": "geventwebsocket.gunicorn.workers.GeventWebSocketWorker",
+}.get(_mode, "gthread")
+# gthread only: request threads for the threading fallback
+threads = int(os.getenv("GUNICORN_THREADS", "64"))
+worker_connections = int(os.getenv("GUNICORN_WORKER_CONNECTIONS", "4000"))
+# Model training requests can run for minutes (offloaded, but the HTTP request waits)
+timeout = int(os.getenv("GUNICORN_TIMEOUT", "600"))
+graceful_timeout = 30
+keepalive = 5
+accesslog = os.getenv("GUNICORN_ACCESS_LOG") or None
+errorlog = "-"
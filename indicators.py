@@ -0,0 +1,308 @@
+"""
+Streaming technical indicators on top of the live bar builder.
+
+Per instrument slot the engine keeps the recursive state of RSI(14),
+SMA/EMA(5, 20), MACD(12, 26, 9), ADX/+DI/-DI(14) and Bollinger Bands
+(20, 2): Wilder / EMA accumulators plus a 20-close ring. Every update is a
+fixed number of vectorized array ops over the slots involved, so cost does
+not grow with history.
+
+State is committed once per closed bar of one timeframe. In between, ticks
+are "peeked": the open bar is stepped through the same math without being
+committed, giving live provisional values.
+
+Definitions follow the ``ta`` package used by ``download_history_excel``
+(``adjust=False`` EMAs seeded with the first close, Wilder RSI via
+``alpha=1/14``, population std for the bands, ta's ADX smoothing). Values
+equal ta's output on the same bar series once past each indicator's
+warm-up; during warm-up they are None (ta shows 0 for ADX/DI there).
+"""
+import numpy as np
+
+RSI_N = 14
+ADX_N = 14
+BB_N = 20
+BB_DEV = 2.0
+EMA_SPANS = (5, 12, 20, 26)
+MACD_SIGNAL = 9
+
+OUTPUTS = (
+    "RSI_14", "SMA_5", "SMA_20", "EMA_5", "EMA_20", "MACD", "MACD_Signal", "MACD_Hist",
+    "ADX", "+DI", "-DI", "BB_High", "BB_Mid", "BB_Low",
+)
+
+# Committed recursive state, one value per slot
+STATE = (
+    "prev_close", "prev_high", "prev_low", "rsi_up", "rsi_dn",
+    "ema_5", "ema_12", "ema_20", "ema_26", "macd_sig",
+    "tr_sum", "pdm_sum", "ndm_sum", "dx_acc", "adx",
+)
+
+
+def _ema_step(prev, x, span: int, first):
+    return np.where(first, x, prev + (2.0 / (span + 1)) * (x - prev))
+
+
+class IndicatorEngine:
+    """Incremental indicators for every slot, driven by one BarBuilder timeframe."""
+
+    def __init__(self, bars, timeframe: str = "1m"):
+        if timeframe not in bars.by_name:
+            raise ValueError(f"Unknown bar timeframe for indicators: {timeframe}")
+        self.bars = bars
+        self.table = bars.table
+        self.timeframe = timeframe
+        self.frame = bars.by_name[timeframe]
+        self.capacity = 0
+        self._alloc(self.table.capacity)
+        bars.close_hooks.append(self.on_close)
+        self.table.batch_hooks.append(self.on_ticks)
+
+    def _alloc(self, capacity: int):
+        fresh = {name: np.zeros(capacity, dtype=np.float64) for name in STATE}
+        fresh.update({name: np.full(capacity, np.nan) for name in OUTPUTS})
+        fresh.update({
+            "count": np.zeros(capacity, dtype=np.int64),
+            "ring": np.zeros((capacity, BB_N), dtype=np.float64),
+            "dirty": np.zeros(capacity, dtype=bool),
+        })
+        for name, arr in fresh.items():
+            old = getattr(self, name, None)
+            if old is not None:
+                arr[: self.capacity] = old
+            setattr(self, name, arr)
+        self.capacity = capacity
+
+    # 🧮 One bar step for an array of slots
+    def _step(self, slots, high, low, close):
+        """Advance every indicator by one bar. Returns (new_state, outputs); writes nothing."""
+        k = self.count[slots]
+        first = k == 0
+        pc, ph, pl = self.prev_close[slots], self.prev_high[slots], self.prev_low[slots]
+        st = {"prev_close": close, "prev_high": high, "prev_low": low}
+
+        # RSI — Wilder smoothing of up/down moves, first move counts as 0
+        diff = np.where(first, 0.0, close - pc)
+        up, dn = np.maximum(diff, 0.0), np.maximum(-diff, 0.0)
+        a = 1.0 / RSI_N
+        ru = np.where(first, up, self.rsi_up[slots] + a * (up - self.rsi_up[slots]))
+        rd = np.where(first, dn, self.rsi_dn[slots] + a * (dn - self.rsi_dn[slots]))
+        st["rsi_up"], st["rsi_dn"] = ru, rd
+        with np.errstate(divide="ignore", invalid="ignore"):
+            rsi = np.where(rd == 0, 100.0, 100.0 - 100.0 / (1.0 + ru / rd))
+
+        # EMAs + MACD (signal is seeded with the first defined MACD value)
+        for span in EMA_SPANS:
+            st[f"ema_{span}"] = _ema_step(getattr(self, f"ema_{span}")[slots], close, span, first)
+        macd = st["ema_12"] - st["ema_26"]
+        sig_prev = self.macd_sig[slots]
+        macd_start = EMA_SPANS[-1] - 1
+        st["macd_sig"] = np.where(
+            k < macd_start, 0.0,
+            _ema_step(sig_prev, macd, MACD_SIGNAL, k == macd_start),
+        )
+
+        # SMA / Bollinger over the last BB_N closes
+        win = self.ring[slots].copy()
+        pos = k % BB_N
+        rows = np.arange(len(slots))
+        win[rows, pos] = close
+        last5 = win[rows[:, None], (pos[:, None] - np.arange(5)) % BB_N]
+        sma5 = last5.mean(axis=1)
+        sma20 = win.mean(axis=1)
+        std20 = win.std(axis=1)
+
+        # ADX / DI — true range and directional movement summed for the first
+        # ADX_N moves, then Wilder-smoothed; ADX is the mean of the first
+        # ADX_N DX values, then Wilder-smoothed
+        tr = np.where(first, 0.0, np.maximum(high, pc) - np.minimum(low, pc))
+        du, dd = high - ph, pl - low
+        pdm = np.where(first | ~((du > dd) & (du > 0)), 0.0, du)
+        ndm = np.where(first | ~((dd > du) & (dd > 0)), 0.0, dd)
+        decay = np.where(k > ADX_N, 1.0 - 1.0 / ADX_N, 1.0)
+        trs = self.tr_sum[slots] * decay + tr
+        pds = self.pdm_sum[slots] * decay + pdm
+        nds = self.ndm_sum[slots] * decay + ndm
+        st["tr_sum"], st["pdm_sum"], st["ndm_sum"] = trs, pds, nds
+        with np.errstate(divide="ignore", invalid="ignore"):
+            dip = np.where(trs != 0, 100.0 * pds / trs, 0.0)
+            din = np.where(trs != 0, 100.0 * nds / trs, 0.0)
+            dx = np.where(dip + din != 0, 100.0 * np.abs(dip - din) / (dip + din), 0.0)
+        adx_start = 2 * ADX_N - 1
+        acc = self.dx_acc[slots]
+        st["dx_acc"] = np.where((k >= ADX_N) & (k < adx_start), acc + dx, acc)
+        adx_prev = self.adx[slots]
+        st["adx"] = np.where(
+            k == adx_start, (acc + dx) / ADX_N,
+            np.where(k > adx_start, (adx_prev * (ADX_N - 1) + dx) / ADX_N, 0.0),
+        )
+        st["ring"] = (rows, pos, close)
+
+        nan = np.nan
+        out = {
+            "RSI_14": np.where(k >= RSI_N - 1, rsi, nan),
+            "SMA_5": np.where(k >= 4, sma5, nan),
+            "SMA_20": np.where(k >= BB_N - 1, sma20, nan),
+            "EMA_5": np.where(k >= 4, st["ema_5"], nan),
+            "EMA_20": np.where(k >= 19, st["ema_20"], nan),
+            "MACD": np.where(k >= macd_start, macd, nan),
+            "MACD_Signal": np.where(k >= macd_start + MACD_SIGNAL - 1, st["macd_sig"], nan),
+            "ADX": np.where(k >= adx_start, st["adx"], nan),
+            "+DI": np.where(k > ADX_N, dip, nan),
+            "-DI": np.where(k > ADX_N, din, nan),
+            "BB_Mid": np.where(k >= BB_N - 1, sma20, nan),
+            "BB_High": np.where(k >= BB_N - 1, sma20 + BB_DEV * std20, nan),
+            "BB_Low": np.where(k >= BB_N - 1, sma20 - BB_DEV * std20, nan),
+        }
+        out["MACD_Hist"] = out["MACD"] - out["MACD_Signal"]
+        return st, out
+
+    @classmethod
+    def _scratch(cls, rows: int):
+        """Bare state for ``rows`` slots, not hooked to any table; seed replays run on it."""
+        eng = cls.__new__(cls)
+        eng.capacity = 0
+        eng._alloc(rows)
+        return eng
+
+    def _commit(self, slots, high, low, close):
+        st, out = self._step(slots, high, low, close)
+        rows, pos, c = st.pop("ring")
+        self.ring[slots, pos] = c
+        for name, arr in st.items():
+            getattr(self, name)[slots] = arr
+        for name, arr in out.items():
+            getattr(self, name)[slots] = arr
+        self.count[slots] += 1
+        self.dirty[slots] = True
+
+    # 🧩 BarBuilder close hook / TickTable batch hook (both under table.lock)
+    def on_close(self, tf: str, slots, bars: dict):
+        if tf == self.timeframe:
+            if self.table.capacity > self.capacity:
+                self._alloc(self.table.capacity)
+            self._commit(slots, bars["high"], bars["low"], bars["close"])
+
+    def on_ticks(self, slots):
+        if self.table.capacity > self.capacity:
+            self._alloc(self.table.capacity)
+        self.dirty[slots] = True
+
+    def seed(self, key: str, t, high, low, close) -> int:
+        """One instrument's ``seed_many()``; returns the number of bars committed."""
+        return self.seed_many({key: (t, high, low, close)}).get(key, 0)
+
+    def seed_many(self, series: dict) -> dict:
+        """
+        Warm instruments with historical bars of this timeframe:
+        ``{key: (t, high, low, close)}``, oldest first, ``t`` = bar start in
+        epoch ms. Only applies before an instrument's first committed live
+        bar, and only bars older than its open live bar, so history never
+        lands on top of live state. When no live bar is open the newest bar
+        may still be forming and is skipped. Returns {key: bars committed}.
+
+        The replay runs on scratch state outside ``table.lock``, all
+        instruments together (one vectorized step per bar index); the lock
+        is only held to pick the slots and to copy the final state in,
+        re-checking that no live bar closed or opened over the history
+        meanwhile.
+        """
+        f = self.frame
+        with self.table.lock:
+            slots = {key: self.table.slot(key) for key in series}
+            if self.table.capacity > self.capacity:
+                self._alloc(self.table.capacity)
+            open_bucket = {key: int(f.bucket[s]) if s < f.size else -1 for key, s in slots.items()}
+            fresh = [key for key, s in slots.items() if not self.count[s]]
+        out = {key: 0 for key in series}
+
+        todo = []
+        for key in fresh:
+            t, high, low, close = series[key]
+            b = np.asarray(t, dtype=np.int64) // f.ms
+            if len(b) == 0:
+                continue
+            keep = b < (open_bucket[key] if open_bucket[key] >= 0 else b[-1])
+            if keep.any():
+                todo.append((key, int(b[keep][-1]), *(np.asarray(x, dtype=np.float64)[keep] for x in (high, low, close))))
+        if not todo:
+            return out
+
+        # Longest series first: the rows still replaying at bar i are always a prefix
+        todo.sort(key=lambda x: -len(x[4]))
+        lens = np.array([len(x[4]) for x in todo])
+        rows, width = len(todo), int(lens[0])
+        cols = []
+        for j in (2, 3, 4):
+            m = np.zeros((rows, width), dtype=np.float64)
+            for r, x in enumerate(todo):
+                m[r, : lens[r]] = x[j]
+            cols.append(m)
+        scratch = self._scratch(rows)
+        idx = np.arange(rows, dtype=np.int64)
+        live = rows
+        for i in range(width):
+            while lens[live - 1] <= i:
+                live -= 1
+            scratch._commit(idx[:live], cols[0][:live, i], cols[1][:live, i], cols[2][:live, i])
+
+        with self.table.lock:
+            if self.table.capacity > self.capacity:
+                self._alloc(self.table.capacity)
+            src, dst = [], []
+            for r, x in enumerate(todo):
+                s = slots[x[0]]
+                cur = f.bucket[s] if s < f.size else -1
+                # Skip if a live bar was committed, or one opened inside the seeded history
+                if self.count[s] or 0 <= cur <= x[1]:
+                    continue
+                src.append(r)
+                dst.append(s)
+                out[x[0]] = int(lens[r])
+            if dst:
+                src, dst = np.array(src, dtype=np.int64), np.array(dst, dtype=np.int64)
+                for name in STATE + OUTPUTS + ("count", "ring"):
+                    getattr(self, name)[dst] = getattr(scratch, name)[src]
+                self.dirty[dst] = True
+        return out
+
+    # 📦 Payloads
+    def values(self, slots) -> dict:
+        """Latest values for slots: open bar peeked where one exists, else last committed."""
+        slots = np.asarray(slots, dtype=np.int64)
+        out = {name: getattr(self, name)[slots].copy() for name in OUTPUTS}
+        f = self.frame
+        live = slots[(slots < f.size)]
+        live = live[f.bucket[live] >= 0]
+        if len(live):
+            _, peek = self._step(live, f.high[live], f.low[live], f.close[live])
+            sel = np.isin(slots, live)
+            for name in OUTPUTS:
+                out[name][sel] = peek[name]
+        return out
+
+    def _rows(self, slots) -> dict:
+        vals = {k: np.round(v, 4).tolist() for k, v in self.values(slots).items()}
+        keys = self.table.keys
+        out = {}
+        for i, s in enumerate(slots.tolist()):
+            row = {k: (None if v[i] != v[i] else v[i]) for k, v in vals.items()}
+            row["tf"] = self.timeframe
+            row["bars"] = int(self.count[s])
+            out[keys[s]] = row
+        return out
+
+    def payload(self) -> dict:
+        """Values for every slot touched since the last call; clears dirty flags."""
+        slots = np.flatnonzero(self.dirty[: min(len(self.table.keys), self.capacity)])
+        if len(slots) == 0:
+            return {}
+        self.dirty[slots] = False
+        return self._rows(slots)
+
+    def snapshot(self, keys) -> dict:
+        slots = [self.table.slots[k] for k in keys if k in self.table.slots]
+        slots = np.array([s for s in slots if s < self.capacity], dtype=np.int64)
+        if len(slots) == 0:
+            return {}
+        return self._rows(slots)
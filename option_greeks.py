@@ -0,0 +1,173 @@
+"""
+Columnar option greeks / OI store fed from ``firstLevelWithGreeks``.
+
+Each option contract slot (shared with the TickTable) carries delta, theta,
+gamma, vega, rho, OI and IV plus static contract metadata (strike, CE/PE,
+lot size, chain). ``aggregate()`` computes per (underlying, expiry) chain
+aggregates with bincount/sort, so the frontend receives precomputed
+snapshots instead of walking hundreds of strikes per tick.
+"""
+import numpy as np
+
+from feed_decoder import FEED_GREEKS, FEED_MARKET
+
+GREEK_FIELDS = ("delta", "theta", "gamma", "vega", "rho", "oi", "iv")
+
+
+class OptionGreeksStore:
+    """Per-contract greeks columns plus per-chain aggregate snapshots."""
+
+    def __init__(self, table, option_meta: dict):
+        # option_meta: instrument_key → {"underlying", "underlying_key", "expiry", "strike", "is_call", "lot_size"}
+        self.table = table
+        self.option_meta = option_meta
+        self.chains: dict[str, int] = {}
+        self.chain_info: list[dict] = []
+        self.capacity = 0
+        self.dirty_chains: set[int] = set()
+        self.snapshots: dict[str, dict] = {}
+        self._alloc(table.capacity)
+        table.hooks.append(self.on_feed)
+
+    def _alloc(self, capacity: int):
+        fresh = {name: np.zeros(capacity, dtype=np.float64) for name in GREEK_FIELDS}
+        fresh.update({
+            "strike": np.zeros(capacity, dtype=np.float64),
+            "lot_size": np.zeros(capacity, dtype=np.float64),
+            "is_call": np.zeros(capacity, dtype=bool),
+            "chain": np.full(capacity, -1, dtype=np.int32),
+            "resolved": np.zeros(capacity, dtype=bool),
+            "has_greeks": np.zeros(capacity, dtype=bool),
+        })
+        for name, arr in fresh.items():
+            old = getattr(self, name, None)
+            if old is not None:
+                arr[: self.capacity] = old
+            setattr(self, name, arr)
+        self.capacity = capacity
+
+    @staticmethod
+    def chain_name(underlying: str, expiry: str) -> str:
+        return f"{underlying}|{expiry}"
+
+    def _resolve(self, slot: int):
+        """Attach static contract metadata the first time a slot is seen."""
+        self.resolved[slot] = True
+        meta = self.option_meta.get(self.table.keys[slot])
+        if not meta:
+            return
+        name = self.chain_name(meta["underlying"], meta["expiry"])
+        cid = self.chains.get(name)
+        if cid is None:
+            cid = len(self.chain_info)
+            self.chains[name] = cid
+            self.chain_info.append({
+                "chain": name,
+                "underlying": meta["underlying"],
+                "underlying_key": meta.get("underlying_key"),
+                "expiry": meta["expiry"],
+            })
+        self.chain[slot] = cid
+        self.strike[slot] = meta["strike"]
+        self.is_call[slot] = meta["is_call"]
+        self.lot_size[slot] = meta.get("lot_size") or 1
+
+    # 🧩 Feed hook (called by TickTable.apply under table.lock)
+    def on_feed(self, slot: int, kind: str, body):
+        if kind != FEED_GREEKS and kind != FEED_MARKET:
+            return
+        if slot >= self.capacity:
+            self._alloc(self.table.capacity)
+        if not self.resolved[slot]:
+            self._resolve(slot)
+        cid = self.chain[slot]
+        if cid < 0:
+            return
+        g = body.optionGreeks
+        self.delta[slot] = g.delta
+        self.theta[slot] = g.theta
+        self.gamma[slot] = g.gamma
+        self.vega[slot] = g.vega
+        self.rho[slot] = g.rho
+        self.oi[slot] = body.oi
+        self.iv[slot] = body.iv
+        self.has_greeks[slot] = True
+        self.dirty_chains.add(int(cid))
+
+    # 📊 Aggregates
+    def aggregate(self, chain_ids=None) -> dict:
+        """
+        Recompute snapshots for the given chains (default: chains touched since
+        the last call). Returns {chain_name: snapshot} for what was refreshed.
+        """
+        if chain_ids is None:
+            chain_ids, self.dirty_chains = self.dirty_chains, set()
+        if not chain_ids:
+            return {}
+        n = min(len(self.table.keys), self.capacity)
+        live = np.flatnonzero(self.has_greeks[:n] & np.isin(self.chain[:n], list(chain_ids)))
+        if len(live) == 0:
+            return {}
+
+        cid = self.chain[live]
+        nchains = len(self.chain_info)
+        calls = self.is_call[live]
+        sign = np.where(calls, 1.0, -1.0)
+        contracts = self.oi[live] * self.lot_size[live]
+
+        net_delta = np.bincount(cid, self.delta[live] * contracts, nchains)
+        net_gamma = np.bincount(cid, sign * self.gamma[live] * contracts, nchains)
+        net_vega = np.bincount(cid, self.vega[live] * contracts, nchains)
+        net_theta = np.bincount(cid, self.theta[live] * contracts, nchains)
+        call_oi = np.bincount(cid, np.where(calls, self.oi[live], 0.0), nchains)
+        put_oi = np.bincount(cid, np.where(calls, 0.0, self.oi[live]), nchains)
+        count = np.bincount(cid, None, nchains)
+
+        # Smile: sort by (chain, strike) once, then slice per chain
+        order = np.lexsort((self.strike[live], cid))
+        s_cid = cid[order]
+        s_strike = self.strike[live][order]
+        s_iv = self.iv[live][order]
+        s_call = calls[order]
+        bounds = np.flatnonzero(np.diff(s_cid)) + 1
+        starts = np.concatenate(([0], bounds))
+        ends = np.concatenate((bounds, [len(order)]))
+
+        out = {}
+        for a, b in zip(starts.tolist(), ends.tolist()):
+            c = int(s_cid[a])
+            info = self.chain_info[c]
+            strikes, pos = np.unique(s_strike[a:b], return_inverse=True)
+            call_iv = np.full(len(strikes), np.nan)
+            put_iv = np.full(len(strikes), np.nan)
+            is_c = s_call[a:b]
+            call_iv[pos[is_c]] = s_iv[a:b][is_c]
+            put_iv[pos[~is_c]] = s_iv[a:b][~is_c]
+
+            spot = None
+            ukey = info.get("underlying_key")
+            if ukey and ukey in self.table.slots:
+                spot = float(self.table.ltp[self.table.slots[ukey]]) or None
+
+            snap = {
+                **info,
+                "spot": spot,
+                "contracts": int(count[c]),
+                "call_oi": float(call_oi[c]),
+                "put_oi": float(put_oi[c]),
+                "pcr_oi": round(float(put_oi[c] / call_oi[c]), 4) if call_oi[c] else None,
+                "net_delta": round(float(net_delta[c]), 2),
+                "net_gamma": round(float(net_gamma[c]), 4),
+                "net_vega": round(float(net_vega[c]), 2),
+                "net_theta": round(float(net_theta[c]), 2),
+                # Gamma exposure per 1% move of the underlying (calls +, puts −)
+                "gex_1pct": round(float(net_gamma[c]) * spot * spot * 0.01, 2) if spot else None,
+                "smile": {
+                    "strike": strikes.tolist(),
+                    "call_iv": [None if v != v else round(v, 4) for v in call_iv.tolist()],
+                    "put_iv": [None if v != v else round(v, 4) for v in put_iv.tolist()],
+                },
+            }
+            self.snapshots[info["chain"]] = snap
+            out[info["chain"]] = snap
+        return out
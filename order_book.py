@@ -0,0 +1,125 @@
+"""
+L5/L30 order book state built from ``MarketFullFeed.marketLevel``.
+
+Each instrument slot (shared with the TickTable) owns one row of fixed-size
+bid/ask price and quantity arrays. Every ``marketFF`` feed overwrites its
+row in place, so top-of-book, spread, depth imbalance and ``tbq``/``tsq``
+are plain vectorized reads.
+"""
+import numpy as np
+
+from feed_decoder import FEED_MARKET
+
+
+class OrderBookStore:
+    """Fixed-size per-slot bid/ask ladders (``levels`` deep) kept current from the feed."""
+
+    def __init__(self, table, levels: int = 5):
+        self.table = table
+        self.levels = max(int(levels), 1)
+        self.capacity = 0
+        self._alloc(table.capacity)
+        table.hooks.append(self.on_feed)
+
+    def _alloc(self, capacity: int):
+        shape = (capacity, self.levels)
+        fresh = {
+            "bid_p": np.zeros(shape, dtype=np.float64),
+            "bid_q": np.zeros(shape, dtype=np.int64),
+            "ask_p": np.zeros(shape, dtype=np.float64),
+            "ask_q": np.zeros(shape, dtype=np.int64),
+            "depth": np.zeros(capacity, dtype=np.int16),
+            "tbq": np.zeros(capacity, dtype=np.float64),
+            "tsq": np.zeros(capacity, dtype=np.float64),
+            "has_book": np.zeros(capacity, dtype=bool),
+            "dirty": np.zeros(capacity, dtype=bool),
+        }
+        for name, arr in fresh.items():
+            old = getattr(self, name, None)
+            if old is not None:
+                arr[: self.capacity] = old
+            setattr(self, name, arr)
+        self.capacity = capacity
+
+    # 🧩 Feed hook (called by TickTable.apply under table.lock)
+    def on_feed(self, slot: int, kind: str, body):
+        if kind != FEED_MARKET:
+            return
+        if slot >= self.capacity:
+            self._alloc(self.table.capacity)
+        quotes = body.marketLevel.bidAskQuote
+        n = min(len(quotes), self.levels)
+        prev = self.depth[slot]
+        if n:
+            q = quotes[:n]
+            self.bid_p[slot, :n] = [x.bidP for x in q]
+            self.bid_q[slot, :n] = [x.bidQ for x in q]
+            self.ask_p[slot, :n] = [x.askP for x in q]
+            self.ask_q[slot, :n] = [x.askQ for x in q]
+        if prev > n:
+            # Book got shallower — clear the stale tail
+            self.bid_p[slot, n:prev] = 0
+            self.bid_q[slot, n:prev] = 0
+            self.ask_p[slot, n:prev] = 0
+            self.ask_q[slot, n:prev] = 0
+        self.depth[slot] = n
+        self.tbq[slot] = body.tbq
+        self.tsq[slot] = body.tsq
+        self.has_book[slot] = True
+        self.dirty[slot] = True
+
+    # 📊 Derived metrics
+    def metrics(self, slots) -> dict:
+        """Vectorized top-of-book metrics for an array of slots."""
+        slots = np.asarray(slots, dtype=np.int64)
+        best_bid = self.bid_p[slots, 0]
+        best_ask = self.ask_p[slots, 0]
+        bq = self.bid_q[slots].sum(axis=1)
+        aq = self.ask_q[slots].sum(axis=1)
+        total = bq + aq
+        imbalance = np.divide(bq - aq, total, out=np.zeros(len(slots)), where=total > 0)
+        both = (best_bid > 0) & (best_ask > 0)
+        spread = np.where(both, best_ask - best_bid, np.nan)
+        mid = np.where(both, (best_ask + best_bid) / 2, np.nan)
+        spread_bps = np.divide(spread * 1e4, mid, out=np.full(len(slots), np.nan), where=both)
+        return {
+            "best_bid": best_bid, "best_bid_qty": self.bid_q[slots, 0],
+            "best_ask": best_ask, "best_ask_qty": self.ask_q[slots, 0],
+            "spread": spread, "spread_bps": spread_bps, "mid": mid,
+            "imbalance": imbalance, "tbq": self.tbq[slots], "tsq": self.tsq[slots],
+        }
+
+    def _rows(self, slots) -> dict:
+        m = {k: np.round(v, 4).tolist() for k, v in self.metrics(slots).items()}
+        keys = self.table.keys
+        out = {}
+        for i, s in enumerate(slots.tolist()):
+            out[keys[s]] = {
+                k: (None if isinstance(v[i], float) and v[i] != v[i] else v[i])
+                for k, v in m.items()
+            }
+        return out
+
+    # 📦 Payloads
+    def payload(self) -> dict:
+        """Top-of-book summary for every slot whose book changed; clears dirty flags."""
+        slots = np.flatnonzero(self.dirty[: min(len(self.table.keys), self.capacity)])
+        if len(slots) == 0:
+            return {}
+        self.dirty[slots] = False
+        return self._rows(slots)
+
+    def snapshot(self, keys, levels: int = None) -> dict:
+        """Full ladders plus metrics for the requested keys (unknown keys are skipped)."""
+        levels = min(int(levels or self.levels), self.levels)
+        slots = [self.table.slots[k] for k in keys if k in self.table.slots]
+        slots = np.array([s for s in slots if s < self.capacity and self.has_book[s]], dtype=np.int64)
+        if len(slots) == 0:
+            return {}
+        out = self._rows(slots)
+        for s in slots.tolist():
+            n = min(int(self.depth[s]), levels)
+            row = out[self.table.keys[s]]
+            row["bids"] = list(zip(self.bid_p[s, :n].tolist(), self.bid_q[s, :n].tolist()))
+            row["asks"] = list(zip(self.ask_p[s, :n].tolist(), self.ask_q[s, :n].tolist()))
+        return out
@@ -0,0 +1,180 @@
+"""
+Upstream subscription bookkeeping.
+
+Several Socket.IO sessions and HTTP callers can watch the same instrument;
+the registry reference-counts each key so the upstream feed is only told
+to ``sub`` on the first watcher and ``unsub`` when the last one leaves.
+The command queue then coalesces those changes into as few upstream
+frames as possible.
+"""
+import queue
+import threading
+import time
+from collections import deque
+
+
+class SubscriptionRegistry:
+    """Reference-counts instrument keys per owner (Socket.IO sid or HTTP caller)."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.owners: dict[str, set] = {}
+        self.counts: dict[str, int] = {}
+
+    def acquire(self, owner: str, keys, on_added=None) -> list[str]:
+        """
+        Add keys for an owner. Returns keys that just became active (0 → 1).
+        ``on_added(keys)`` runs under the registry lock, so upstream commands
+        are queued in the same order as the count changes that caused them.
+        """
+        added = []
+        with self.lock:
+            held = self.owners.setdefault(owner, set())
+            for k in keys:
+                if not k or k in held:
+                    continue
+                held.add(k)
+                n = self.counts.get(k, 0) + 1
+                self.counts[k] = n
+                if n == 1:
+                    added.append(k)
+            if added and on_added:
+                on_added(added)
+        return added
+
+    def release(self, owner: str, keys, on_removed=None) -> list[str]:
+        """
+        Drop keys for an owner. Returns keys nobody watches any more (1 → 0).
+        ``on_removed(keys)`` runs under the registry lock, like ``on_added``.
+        """
+        removed = []
+        with self.lock:
+            held = self.owners.get(owner)
+            if not held:
+                return removed
+            for k in keys:
+                if k not in held:
+                    continue
+                held.discard(k)
+                n = self.counts.get(k, 0) - 1
+                if n <= 0:
+                    self.counts.pop(k, None)
+                    removed.append(k)
+                else:
+                    self.counts[k] = n
+            if not held:
+                self.owners.pop(owner, None)
+            if removed and on_removed:
+                on_removed(removed)
+        return removed
+
+    def release_owner(self, owner: str, on_removed=None) -> list[str]:
+        """Drop everything an owner holds (e.g. on Socket.IO disconnect)."""
+        with self.lock:
+            held = list(self.owners.get(owner, ()))
+        return self.release(owner, held, on_removed)
+
+    def owned(self, owner: str) -> set:
+        with self.lock:
+            return set(self.owners.get(owner, ()))
+
+    def active_keys(self) -> list[str]:
+        with self.lock:
+            return list(self.counts)
+
+    def stats(self) -> dict:
+        with self.lock:
+            return {"owners": len(self.owners), "active_keys": len(self.counts)}
+
+
+class SubscriptionCommandQueue:
+    """
+    Batches sub/unsub commands for the streamer thread.
+
+    ``next_batch()`` drains everything queued so far, cancels opposing ops
+    on the same key (sub then unsub never reaches upstream) and returns the
+    net key lists, ready to be split into per-message chunks.
+    """
+
+    def __init__(self, chunk_size: int = 100, latency_window: int = 512):
+        self.q = queue.Queue()
+        self.chunk_size = max(int(chunk_size), 1)
+        self.latencies = deque(maxlen=latency_window)
+
+        # 📊 Counters
+        self.commands_in = 0
+        self.keys_cancelled = 0
+        self.frames_out = 0
+        self.batches_out = 0
+
+    def put(self, op: str, keys):
+        self.q.put((op, list(keys), time.monotonic()))
+        self.commands_in += 1
+
+    def clear(self):
+        """Drop queued commands (the caller is about to resend its full state)."""
+        try:
+            while True:
+                self.q.get_nowait()
+        except queue.Empty:
+            pass
+
+    def next_batch(self, timeout: float = 0.2):
+        """
+        Block up to ``timeout`` for the first command, then drain the rest.
+        Returns (sub_keys, unsub_keys, oldest_enqueue_ts) or None when idle.
+        """
+        try:
+            first = self.q.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+        pending: dict[str, str] = {}
+        oldest = first[2]
+        cmd = first
+        while True:
+            op, keys, ts = cmd
+            oldest = min(oldest, ts)
+            for k in keys:
+                prev = pending.get(k)
+                if prev is None:
+                    pending[k] = op
+                elif prev != op:
+                    # sub + unsub (or the reverse) cancel out
+                    del pending[k]
+                    self.keys_cancelled += 2
+            try:
+                cmd = self.q.get_nowait()
+            except queue.Empty:
+                break
+
+        subs = [k for k, op in pending.items() if op == "sub"]
+        unsubs = [k for k, op in pending.items() if op == "unsub"]
+        return subs, unsubs, oldest
+
+    def chunks(self, keys: list):
+        for i in range(0, len(keys), self.chunk_size):
+            yield keys[i:i + self.chunk_size]
+
+    def record_sent(self, enqueued_ts: float, frames: int):
+        self.latencies.append(time.monotonic() - enqueued_ts)
+        self.frames_out += frames
+        self.batches_out += 1
+
+    def stats(self) -> dict:
+        lat = sorted(self.latencies)
+
+        def pct(p):
+            return round(lat[min(int(p * len(lat)), len(lat) - 1)] * 1000, 2) if lat else None
+
+        return {
+            "queue_depth": self.q.qsize(),
+            "commands_in": self.commands_in,
+            "keys_cancelled": self.keys_cancelled,
+            "batches_out": self.batches_out,
+            "frames_out": self.frames_out,
+            "chunk_size": self.chunk_size,
+            "latency_ms_p50": pct(0.50),
+            "latency_ms_p99": pct(0.99),
+            "latency_ms_max": round(lat[-1] * 1000, 2) if lat else None,
+        }
@@ -0,0 +1,197 @@
+"""
+Bounded intraday tick history per instrument.
+
+Each instrument gets one row in a per-segment ring pool: preallocated 2-D
+NumPy arrays (timestamp, ltp, ltq, cumulative volume) of fixed capacity.
+``append()`` is a TickTable batch hook and writes a whole frame with fancy
+indexing — no Python object per tick — so memory is fixed no matter how
+long the session runs.
+
+Eviction per segment:
+  * ``overwrite`` — classic ring, oldest ticks are dropped.
+  * ``decimate``  — when a row fills up every other sample is dropped and
+                    the row keeps only every 2nd, 4th, ... tick from then on,
+                    so the whole session survives at lower resolution.
+"""
+import numpy as np
+
+POLICIES = ("overwrite", "decimate")
+
+
+def parse_segments(spec: str, default_capacity: int = 1024, default_policy: str = "decimate") -> dict:
+    """
+    Parse ``"NSE_INDEX=8192:decimate,NSE_EQ=2048,default=1024:overwrite"``
+    into {segment: (capacity, policy)}. ``default`` covers unlisted segments.
+    """
+    out = {"default": (default_capacity, default_policy)}
+    for part in (spec or "").split(","):
+        if "=" not in part:
+            continue
+        seg, _, rest = part.partition("=")
+        cap, _, policy = rest.partition(":")
+        policy = policy.strip() or default_policy
+        if policy not in POLICIES:
+            raise ValueError(f"Unknown history eviction policy: {policy}")
+        out[seg.strip()] = (max(int(cap), 2), policy)
+    return out
+
+
+class _RingPool:
+    """Fixed-capacity rings for every instrument of one segment."""
+
+    def __init__(self, capacity: int, policy: str, rows: int = 16):
+        self.capacity = capacity
+        self.policy = policy
+        self.rows = 0
+        self.used = 0
+        self._alloc(rows)
+
+    def _alloc(self, rows: int):
+        shape = (rows, self.capacity)
+        fresh = {
+            "ts": np.zeros(shape, dtype=np.int64),
+            "ltp": np.zeros(shape, dtype=np.float64),
+            "ltq": np.zeros(shape, dtype=np.int64),
+            "vtt": np.zeros(shape, dtype=np.int64),
+            "head": np.zeros(rows, dtype=np.int64),
+            "count": np.zeros(rows, dtype=np.int64),
+            "seen": np.zeros(rows, dtype=np.int64),
+            "stride": np.ones(rows, dtype=np.int64),
+        }
+        for name, arr in fresh.items():
+            old = getattr(self, name, None)
+            if old is not None:
+                arr[: self.rows] = old
+            setattr(self, name, arr)
+        self.rows = rows
+
+    def new_row(self) -> int:
+        if self.used >= self.rows:
+            self._alloc(self.rows * 2)
+        self.used += 1
+        return self.used - 1
+
+    def append(self, rows, ts, ltp, ltq, vtt):
+        self.seen[rows] += 1
+        if self.policy == "decimate":
+            keep = (self.seen[rows] - 1) % self.stride[rows] == 0
+            if not keep.all():
+                rows, ts, ltp, ltq, vtt = rows[keep], ts[keep], ltp[keep], ltq[keep], vtt[keep]
+            if len(rows) == 0:
+                return
+        pos = self.head[rows]
+        self.ts[rows, pos] = ts
+        self.ltp[rows, pos] = ltp
+        self.ltq[rows, pos] = ltq
+        self.vtt[rows, pos] = vtt
+        self.head[rows] = (pos + 1) % self.capacity
+        self.count[rows] = np.minimum(self.count[rows] + 1, self.capacity)
+
+        if self.policy == "decimate":
+            full = rows[self.count[rows] == self.capacity]
+            for r in full.tolist():
+                self._decimate(r)
+
+    def _decimate(self, r: int):
+        """Halve a full row's resolution in place; it is always unwrapped when full."""
+        half = self.capacity // 2
+        for arr in (self.ts, self.ltp, self.ltq, self.vtt):
+            arr[r, :half] = arr[r, 1::2][:half]
+        self.head[r] = half
+        self.count[r] = half
+        self.stride[r] *= 2
+        self.seen[r] = 0
+
+    def read(self, r: int) -> dict:
+        n, h = int(self.count[r]), int(self.head[r])
+        cols = {}
+        for name in ("ts", "ltp", "ltq", "vtt"):
+            arr = getattr(self, name)[r]
+            # A row only wraps once it is full; before that it sits in [h - n, h)
+            cols[name] = arr[h - n:h].copy() if n < self.capacity else np.concatenate((arr[h:], arr[:h]))
+        cols["stride"] = int(self.stride[r])
+        return cols
+
+
+class TickHistory:
+    """Per-instrument tick rings, grouped in pools by segment (``NSE_EQ``, ``NSE_INDEX``, ...)."""
+
+    def __init__(self, table, segments: dict):
+        self.table = table
+        self.segments = segments
+        self.pools: dict[str, int] = {}
+        self.pool_list: list[_RingPool] = []
+        self.capacity = 0
+        self._alloc(table.capacity)
+        table.batch_hooks.append(self.append)
+
+    def _alloc(self, capacity: int):
+        pool_id = np.full(capacity, -1, dtype=np.int32)
+        row = np.full(capacity, -1, dtype=np.int64)
+        if self.capacity:
+            pool_id[: self.capacity] = self.pool_id
+            row[: self.capacity] = self.row
+        self.pool_id, self.row, self.capacity = pool_id, row, capacity
+
+    def _pool_for(self, key: str) -> int:
+        seg = key.split("|", 1)[0]
+        if seg not in self.segments:
+            seg = "default"
+        p = self.pools.get(seg)
+        if p is None:
+            cap, policy = self.segments[seg]
+            p = len(self.pool_list)
+            self.pools[seg] = p
+            self.pool_list.append(_RingPool(cap, policy))
+        return p
+
+    def _assign(self, slots):
+        if self.table.capacity > self.capacity:
+            self._alloc(self.table.capacity)
+        for s in slots[self.pool_id[slots] < 0].tolist():
+            p = self._pool_for(self.table.keys[s])
+            self.pool_id[s] = p
+            self.row[s] = self.pool_list[p].new_row()
+
+    # 🧩 TickTable batch hook (called under table.lock)
+    def append(self, slots):
+        if self.table.capacity > self.capacity or (self.pool_id[slots] < 0).any():
+            self._assign(slots)
+        t = self.table
+        pids = self.pool_id[slots]
+        for p in np.unique(pids).tolist():
+            sel = slots if len(self.pool_list) == 1 else slots[pids == p]
+            self.pool_list[p].append(self.row[sel], t.ltt[sel], t.ltp[sel], t.ltq[sel], t.vtt[sel])
+
+    def read(self, key: str, since: int = None, limit: int = None) -> dict:
+        """Ordered history for one key as compact arrays (call under table.lock)."""
+        s = self.table.slots.get(key)
+        if s is None or s >= self.capacity or self.pool_id[s] < 0:
+            return None
+        cols = self.pool_list[self.pool_id[s]].read(int(self.row[s]))
+        if since:
+            start = int(np.searchsorted(cols["ts"], since, side="right"))
+            for name in ("ts", "ltp", "ltq", "vtt"):
+                cols[name] = cols[name][start:]
+        if limit:
+            for name in ("ts", "ltp", "ltq", "vtt"):
+                cols[name] = cols[name][-limit:]
+        return {
+            "key": key,
+            "stride": cols["stride"],
+            "ts": cols["ts"].tolist(),
+            "ltp": cols["ltp"].tolist(),
+            "ltq": cols["ltq"].tolist(),
+            "vtt": cols["vtt"].tolist(),
+        }
+
+    def stats(self) -> dict:
+        return {
+            seg: {
+                "capacity": pool.capacity,
+                "policy": pool.policy,
+                "instruments": pool.used,
+                "bytes": sum(getattr(pool, n).nbytes for n in ("ts", "ltp", "ltq", "vtt")),
+            }
+            for seg, pool in ((seg, self.pool_list[p]) for seg, p in self.pools.items())
+        }
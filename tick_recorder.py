@@ -0,0 +1,193 @@
+"""
+Append-only recorder for raw feed frames.
+
+Every binary websocket frame is stored exactly as received, prefixed with
+the receive time and its length:
+
+    segment  := MAGIC record*
+    record   := <q recv_ns> <I length> <length bytes of FeedResponse protobuf>
+
+Files live under ``<root>/<YYYY-MM-DD>/seg-00001.bin`` (trading day in
+IST). ``record()`` only enqueues — a background writer thread does all
+disk I/O, so the websocket callback never blocks; when the queue is full
+the frame is dropped and counted. A segment rotates when it reaches
+``segment_bytes``; when the trading day changes the day's segments are
+closed and gzipped in the background.
+"""
+import gzip
+import os
+import queue
+import shutil
+import struct
+import threading
+import time
+from datetime import datetime, timedelta
+
+MAGIC = b"UPXTICK1"
+RECORD_HEADER = struct.Struct("<qI")
+
+
+class TickRecorder:
+    """Buffered, segmented per-day writer for raw protobuf frames."""
+
+    def __init__(self, root: str, tz, queue_size: int = 65536,
+                 segment_bytes: int = 256 * 1024 * 1024, flush_ms: int = 1000):
+        self.root = root
+        self.tz = tz
+        self.segment_bytes = max(int(segment_bytes), 1024)
+        self.flush_every = max(int(flush_ms), 0) / 1000.0
+        self.q: queue.Queue = queue.Queue(maxsize=max(int(queue_size), 1))
+        self.stop_event = threading.Event()
+        self.thread = None
+
+        self.day = None
+        self.day_end_ns = 0
+        self.fh = None
+        self.seg_no = 0
+        self.seg_size = 0
+        self.path = None
+
+        # 📊 Counters
+        self.frames_in = 0
+        self.frames_written = 0
+        self.frames_dropped = 0
+        self.bytes_written = 0
+        self.segments = 0
+        self.compressed = 0
+
+    # 🧩 Input side (websocket callback threads)
+    def record(self, raw: bytes, recv_ns: int = None):
+        """Queue one frame; never blocks. Frames are dropped (and counted) when the writer lags."""
+        self.frames_in += 1
+        try:
+            self.q.put_nowait((recv_ns or time.time_ns(), bytes(raw)))
+        except queue.Full:
+            self.frames_dropped += 1
+
+    # 🗂️ Segments
+    def _day_for(self, ns: int):
+        now = datetime.fromtimestamp(ns / 1e9, self.tz)
+        midnight = (now + timedelta(days=1)).replace(hour=0, minute=0, second=0, microsecond=0)
+        return now.date().isoformat(), int(midnight.timestamp() * 1e9)
+
+    def _open_segment(self):
+        day_dir = os.path.join(self.root, self.day)
+        os.makedirs(day_dir, exist_ok=True)
+        while True:
+            self.seg_no += 1
+            path = os.path.join(day_dir, f"seg-{self.seg_no:05d}.bin")
+            if not os.path.exists(path) and not os.path.exists(path + ".gz"):
+                break
+        self.fh = open(path, "ab", buffering=1024 * 1024)
+        self.fh.write(MAGIC)
+        self.seg_size = len(MAGIC)
+        self.path = path
+        self.segments += 1
+
+    def _close_segment(self):
+        if self.fh:
+            self.fh.close()
+            self.fh = None
+
+    def _roll_day(self, ns: int):
+        old_day = self.day
+        self._close_segment()
+        self.day, self.day_end_ns = self._day_for(ns)
+        self.seg_no = 0
+        if old_day:
+            print(f"🗜️ Tick recorder: trading day {old_day} closed — compressing segments")
+            threading.Thread(target=self.compress_day, args=(old_day,), daemon=True).start()
+
+    def compress_day(self, day: str):
+        """Gzip every finished ``.bin`` segment of a day and remove the original."""
+        day_dir = os.path.join(self.root, day)
+        if not os.path.isdir(day_dir):
+            return
+        for name in sorted(os.listdir(day_dir)):
+            if not name.endswith(".bin"):
+                continue
+            src = os.path.join(day_dir, name)
+            try:
+                with open(src, "rb") as fin, gzip.open(src + ".gz", "wb") as fout:
+                    shutil.copyfileobj(fin, fout, 1024 * 1024)
+                os.remove(src)
+                self.compressed += 1
+            except Exception as e:
+                print(f"⚠️ Tick recorder: failed to compress {src}:", e)
+
+    def _compress_leftovers(self):
+        """Compress segments of earlier days left uncompressed (e.g. after a crash)."""
+        if not os.path.isdir(self.root):
+            return
+        for day in sorted(os.listdir(self.root)):
+            if day != self.day and os.path.isdir(os.path.join(self.root, day)):
+                self.compress_day(day)
+
+    # ✍️ Writer thread
+    def _write_batch(self, batch: list):
+        for ns, raw in batch:
+            if ns >= self.day_end_ns:
+                self._roll_day(ns)
+            if self.fh is None or self.seg_size >= self.segment_bytes:
+                self._close_segment()
+                self._open_segment()
+            self.fh.write(RECORD_HEADER.pack(ns, len(raw)))
+            self.fh.write(raw)
+            n = RECORD_HEADER.size + len(raw)
+            self.seg_size += n
+            self.bytes_written += n
+        self.frames_written += len(batch)
+
+    def _run(self):
+        self.day, self.day_end_ns = self._day_for(time.time_ns())
+        threading.Thread(target=self._compress_leftovers, daemon=True).start()
+        last_flush = time.monotonic()
+        while not (self.stop_event.is_set() and self.q.empty()):
+            batch = []
+            try:
+                batch.append(self.q.get(timeout=0.2))
+                while len(batch) < 4096:
+                    batch.append(self.q.get_nowait())
+            except queue.Empty:
+                pass
+            try:
+                if batch:
+                    self._write_batch(batch)
+                elif time.time_ns() >= self.day_end_ns:
+                    # Quiet after the close — still rotate and compress at end of day
+                    self._roll_day(time.time_ns())
+                if self.fh and time.monotonic() - last_flush >= self.flush_every:
+                    self.fh.flush()
+                    last_flush = time.monotonic()
+            except Exception as e:
+                print("⚠️ Tick recorder write error:", e)
+        self._close_segment()
+
+    def start(self):
+        if self.thread and self.thread.is_alive():
+            return
+        os.makedirs(self.root, exist_ok=True)
+        self.stop_event.clear()
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+        print(f"🎙️ Tick recorder writing raw frames to {self.root}")
+
+    def stop(self, timeout: float = 5.0):
+        """Drain the queue and close the open segment."""
+        self.stop_event.set()
+        if self.thread:
+            self.thread.join(timeout)
+
+    def stats(self) -> dict:
+        return {
+            "root": self.root,
+            "day": self.day,
+            "segment": self.path,
+            "queue_depth": self.q.qsize(),
+            "frames_in": self.frames_in,
+            "frames_written": self.frames_written,
+            "frames_dropped": self.frames_dropped,
+            "bytes_written": self.bytes_written,
+            "segments": self.segments,
+            "compressed": self.compressed,
+        }
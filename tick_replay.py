@@ -0,0 +1,276 @@
+"""
+Replay recorded feed frames through the live decode → TickTable → emit pipeline.
+
+Reads segments written by ``tick_recorder`` (plain ``.bin`` segments are
+memory-mapped and handed to ``ParseFromString`` as zero-copy memoryviews;
+``.bin.gz`` segments are inflated into memory first). Every frame goes
+through the same stages as ``UpstoxStreamer._on_message``:
+
+  decode — ``FeedResponse.ParseFromString``
+  apply  — ``FeedWiring.apply`` (columns + order book / history / bars /
+           indicators / greeks hooks and stage metrics)
+  emit   — the conflated ``tick_update`` / ``index_update`` flush plus the
+           depth / bar / indicator / greeks / alert / slow-client periodic
+           jobs, routed through the same rooms and outbound queues as
+           app.py into a stub socket that JSON-encodes each emit, clocked
+           by the *recorded* receive time
+
+The pipeline is built by ``feed_wiring`` from the same UPSTOX_* settings
+app.py reads, so a replay runs with the server's cadences and capacities.
+
+Pacing: ``--speed 1`` is real time, ``--speed N`` N× faster, ``--speed 0``
+as fast as possible. Reports frames/s, ticks/s and p50/p90/p99/max per stage.
+
+Usage:
+    python tick_replay.py recordings/2025-01-10 [--speed 0] [--interval-ms 250] [--json]
+"""
+import argparse
+import gzip
+import json
+import mmap
+import os
+import sys
+import time
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.join(ROOT, "src", "pages"))
+
+from tick_recorder import MAGIC, RECORD_HEADER  # noqa: E402
+
+
+def recording_files(paths) -> list[str]:
+    """Expand files / day directories / recorder roots into ordered segment paths."""
+    out = []
+    for p in paths:
+        if os.path.isdir(p):
+            for d, _, files in sorted(os.walk(p)):
+                out += [os.path.join(d, f) for f in sorted(files) if f.endswith((".bin", ".bin.gz"))]
+        else:
+            out.append(p)
+    return out
+
+
+def iter_frames(path: str):
+    """Yield (recv_ns, memoryview) for every record in one segment."""
+    if path.endswith(".gz"):
+        with gzip.open(path, "rb") as f:
+            buf = memoryview(f.read())
+        mm = None
+    else:
+        fh = open(path, "rb")
+        if os.fstat(fh.fileno()).st_size == 0:
+            fh.close()
+            return
+        mm = mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ)
+        fh.close()
+        buf = memoryview(mm)
+    try:
+        if bytes(buf[: len(MAGIC)]) != MAGIC:
+            raise ValueError(f"{path}: not a tick recording")
+        pos, end, hdr = len(MAGIC), len(buf), RECORD_HEADER.size
+        while pos + hdr <= end:
+            ns, n = RECORD_HEADER.unpack_from(buf, pos)
+            pos += hdr
+            if pos + n > end:
+                break  # truncated tail (writer was killed mid-record)
+            yield ns, buf[pos:pos + n]
+            pos += n
+    finally:
+        del buf
+        if mm is not None:
+            try:
+                mm.close()
+            except BufferError:
+                pass  # a caller still holds a view; the map is released with it
+
+
+def _pct(samples: list) -> dict:
+    if not samples:
+        return {"count": 0}
+    a = np.asarray(samples, dtype=np.float64) / 1e3
+    p50, p90, p99 = np.percentile(a, [50, 90, 99])
+    return {
+        "count": len(a),
+        "p50_us": round(float(p50), 2),
+        "p90_us": round(float(p90), 2),
+        "p99_us": round(float(p99), 2),
+        "max_us": round(float(a.max()), 2),
+        "mean_us": round(float(a.mean()), 2),
+    }
+
+
+class RecordingSocket:
+    """Stands in for Flask-SocketIO: counts emits and the JSON bytes each would put on the wire."""
+
+    def __init__(self):
+        self.events: dict[str, list] = {}  # event → [emits, bytes]
+        self.server = None  # no transport, so nothing is ever slow enough to evict
+
+    def emit(self, event, data, to=None, skip_sid=None):
+        ev = self.events.setdefault(event, [0, 0])
+        ev[0] += 1
+        ev[1] += len(json.dumps(data))
+
+
+class ReplayPipeline:
+    """
+    app.py's ``FeedWiring`` (same settings, stores, periodic emitters and
+    room / slow-client routing) with a RecordingSocket, and one session
+    watching every instrument the recording contains.
+    """
+
+    SID = "replay"
+
+    def __init__(self, settings: dict = None):
+        from feed_wiring import FeedWiring, pipeline_settings
+
+        self.socket = RecordingSocket()
+        # Not started: replay drives flushes and periodic emitters itself on recorded time
+        self.feed = FeedWiring(self.socket, settings or pipeline_settings())
+        self.table = self.feed.table
+        self.conflator = self.feed.conflator
+        self.interval_ns = max(self.feed.settings["emit_interval_ms"], 1) * 1_000_000
+        self.feed.outbound.add(self.SID)
+        self.watched = 0
+
+    def apply(self, msg, received_ns: int = None) -> int:
+        n = self.feed.apply(msg, received_ns=received_ns)
+        if len(self.table.keys) != self.watched:
+            self.watched = len(self.table.keys)
+            self.feed.rooms.set_keys(self.SID, self.table.keys)
+        return n
+
+    def flush(self, now_s: float = None):
+        self.conflator.flush()
+        self.feed.run_periodic(now_s)
+
+    @property
+    def emits(self) -> int:
+        return sum(n for n, _ in self.socket.events.values())
+
+    @property
+    def emit_bytes(self) -> int:
+        return sum(b for _, b in self.socket.events.values())
+
+    def metrics(self) -> dict:
+        """Stage histograms; exchange-clock stages compare recorded stamps with today's clock, so they are left out."""
+        if self.feed.metrics is None:
+            return {}
+        return {k: v for k, v in self.feed.metrics.stats().items() if not k.startswith("exchange_")}
+
+
+class Replayer:
+    """Feeds recorded frames into a ReplayPipeline and times each stage."""
+
+    def __init__(self, pipeline: ReplayPipeline, speed: float = 0.0):
+        from MarketDataFeedV3_pb2 import FeedResponse
+        self.FeedResponse = FeedResponse
+        self.pipeline = pipeline
+        self.speed = max(float(speed), 0.0)
+
+    def run(self, files: list[str], limit: int = None) -> dict:
+        p = self.pipeline
+        decode_ns, apply_ns, emit_ns = [], [], []
+        frames = ticks = nbytes = 0
+        first_ns = last_ns = None
+        next_flush = 0
+        clock = time.perf_counter_ns
+        wall0 = clock()
+
+        for path in files:
+            for recv_ns, view in iter_frames(path):
+                if first_ns is None:
+                    first_ns = recv_ns
+                    next_flush = recv_ns + p.interval_ns
+                if self.speed:
+                    ahead = (recv_ns - first_ns) / self.speed - (clock() - wall0)
+                    if ahead > 0:
+                        time.sleep(ahead / 1e9)
+
+                received = time.time_ns()
+                t0 = clock()
+                msg = self.FeedResponse()
+                msg.ParseFromString(view)
+                t1 = clock()
+                ticks += p.apply(msg, received_ns=received)
+                t2 = clock()
+                decode_ns.append(t1 - t0)
+                apply_ns.append(t2 - t1)
+
+                if recv_ns >= next_flush:
+                    p.flush(recv_ns / 1e9)
+                    emit_ns.append(clock() - t2)
+                    next_flush = recv_ns + p.interval_ns
+
+                frames += 1
+                nbytes += len(view)
+                last_ns = recv_ns
+                del view
+                if limit and frames >= limit:
+                    break
+            if limit and frames >= limit:
+                break
+
+        p.flush((last_ns or 0) / 1e9)
+        wall = (clock() - wall0) / 1e9
+        span = ((last_ns or 0) - (first_ns or 0)) / 1e9
+        return {
+            "files": len(files),
+            "frames": frames,
+            "ticks": ticks,
+            "bytes": nbytes,
+            "wall_s": round(wall, 3),
+            "recorded_span_s": round(span, 3),
+            "speed": self.speed or "max",
+            "speedup_vs_realtime": round(span / wall, 1) if wall else None,
+            "frames_per_s": round(frames / wall, 1) if wall else None,
+            "ticks_per_s": round(ticks / wall, 1) if wall else None,
+            "emits": p.emits,
+            "emit_bytes": p.emit_bytes,
+            "events": {ev: {"emits": n, "bytes": b} for ev, (n, b) in sorted(p.socket.events.items())},
+            "ticks_conflated": p.conflator.ticks_conflated,
+            "stages": {"decode": _pct(decode_ns), "apply": _pct(apply_ns), "emit": _pct(emit_ns)},
+            "metrics": p.metrics(),
+        }
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("recording", nargs="+", help="segment files or recorder day/root directories")
+    ap.add_argument("--speed", type=float, default=0.0, help="1 = real time, N = N× faster, 0 = max")
+    ap.add_argument("--interval-ms", type=int, default=None, help="tick_update window (default UPSTOX_EMIT_INTERVAL_MS)")
+    ap.add_argument("--depth-levels", type=int, default=None, help="default UPSTOX_DEPTH_LEVELS")
+    ap.add_argument("--limit", type=int, default=None, help="stop after N frames")
+    ap.add_argument("--json", action="store_true", help="print machine-readable results")
+    args = ap.parse_args()
+
+    files = recording_files(args.recording)
+    if not files:
+        sys.exit("No recording segments found")
+    from feed_wiring import pipeline_settings
+    settings = pipeline_settings()  # the same UPSTOX_* env (and defaults) app.py runs with
+    if args.interval_ms is not None:
+        settings["emit_interval_ms"] = args.interval_ms
+    if args.depth_levels is not None:
+        settings["depth_levels"] = args.depth_levels
+    pipeline = ReplayPipeline(settings)
+    res = Replayer(pipeline, speed=args.speed).run(files, limit=args.limit)
+    if args.json:
+        print(json.dumps(res, indent=2))
+        return
+    print(f"▶️ {res['frames']} frames / {res['ticks']} ticks from {res['files']} segment(s) "
+          f"in {res['wall_s']} s ({res['speedup_vs_realtime']}× real time)")
+    print(f"   {res['frames_per_s']} frames/s, {res['ticks_per_s']} ticks/s, "
+          f"{res['emits']} emits ({res['emit_bytes']} JSON bytes)")
+    for ev, st in res["events"].items():
+        print(f"   {ev:<16} {st['emits']:>7} emits {st['bytes']:>12} bytes")
+    for name, st in res["stages"].items():
+        if st["count"]:
+            print(f"   {name:<7} p50 {st['p50_us']:>8} µs  p90 {st['p90_us']:>8} µs  "
+                  f"p99 {st['p99_us']:>8} µs  max {st['max_us']:>9} µs")
+
+
+if __name__ == "__main__":
+    main()
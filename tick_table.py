@@ -0,0 +1,268 @@
+"""
+Columnar last-tick storage for the Upstox market data feed.
+
+Every instrument key gets a fixed slot in a set of preallocated NumPy
+columns. ``apply()`` writes a decoded ``FeedResponse`` straight into those
+columns (no per-tick dicts); JSON-friendly payloads are only built by
+``payload()`` when something is actually emitted.
+
+Side stores (order books, greeks, ...) share the same slot numbering and
+register a hook that receives every non-LTPC feed body during ``apply()``;
+per-frame consumers (tick history, ...) register a batch hook that gets the
+array of slots written once the columns are updated.
+"""
+import threading
+
+import numpy as np
+
+from feed_decoder import FEED_LTPC, FEED_GREEKS, FEED_MARKET, feed_kind
+
+# Column name → dtype. All columns share the same slot index.
+COLUMNS = {
+    "ltp": np.float64,
+    "ltt": np.int64,
+    "ltq": np.int64,
+    "cp": np.float64,
+    "vtt": np.int64,
+    "open": np.float64,
+    "high": np.float64,
+    "low": np.float64,
+    "close": np.float64,
+}
+
+
+class TickTable:
+    """Preallocated NumPy columns holding the latest tick per instrument slot."""
+
+    def __init__(self, capacity: int = 4096):
+        self.capacity = max(int(capacity), 1)
+        self.slots: dict[str, int] = {}
+        self.keys: list[str] = []
+        # Guards the columns and every hooked store; held by writers and readers alike
+        self.lock = threading.RLock()
+        # Callables (slot, kind, body) run for marketFF / indexFF / firstLevelWithGreeks feeds
+        self.hooks: list = []
+        # Callables (slots: np.ndarray) run once per frame after the columns are written
+        self.batch_hooks: list = []
+        for name, dtype in COLUMNS.items():
+            setattr(self, name, np.zeros(self.capacity, dtype=dtype))
+        self.has_ohlc = np.zeros(self.capacity, dtype=bool)
+        self.dirty = np.zeros(self.capacity, dtype=bool)
+        # Ticks that replaced a not-yet-emitted tick for the same slot
+        self.overwrites = 0
+        # Latest FeedResponse.currentTs seen (exchange clock, epoch ms)
+        self.exchange_ts = 0
+        # Ticks dropped by apply(dedup=True) as not newer than the stored one
+        self.duplicates = 0
+
+    # 🧮 Slot management
+    def slot(self, key: str) -> int:
+        """Return the slot for an instrument key, assigning one if needed."""
+        s = self.slots.get(key)
+        if s is None:
+            s = len(self.keys)
+            if s >= self.capacity:
+                self._grow(self.capacity * 2)
+            self.slots[key] = s
+            self.keys.append(key)
+        return s
+
+    def _grow(self, new_capacity: int):
+        for name in (*COLUMNS, "has_ohlc", "dirty"):
+            old = getattr(self, name)
+            new = np.zeros(new_capacity, dtype=old.dtype)
+            new[: self.capacity] = old
+            setattr(self, name, new)
+        print(f"📐 TickTable grown {self.capacity} → {new_capacity} slots")
+        self.capacity = new_capacity
+
+    # 🧩 Decode
+    def apply(self, msg, dedup: bool = False) -> int:
+        """
+        Write a parsed FeedResponse into the columns. Returns tick count.
+        ``dedup`` drops ticks the slot already holds, for frames from
+        overlapping upstream sockets.
+        """
+        slot = self.slot
+        hooks = self.hooks
+        idx, ltp, ltt, ltq, cp = [], [], [], [], []
+        o_idx, o_open, o_high, o_low, o_close = [], [], [], [], []
+        v_idx, vtt = [], []
+
+        for key, feed in msg.feeds.items():
+            kind, body = feed_kind(feed)
+            if kind is None:
+                continue
+            if kind == FEED_LTPC:
+                lt, ohlc, vol = body, None, 0
+            elif kind == FEED_GREEKS:
+                lt, ohlc, vol = body.ltpc, None, body.vtt
+            elif kind == FEED_MARKET:
+                lt, ohlc, vol = body.ltpc, body.marketOHLC.ohlc, body.vtt
+            else:
+                lt, ohlc, vol = body.ltpc, body.marketOHLC.ohlc, 0
+
+            if not lt.ltp:
+                continue
+            s = slot(key)
+            if dedup and lt.ltt and self._seen(s, lt):
+                self.duplicates += 1
+                continue
+            if hooks and kind != FEED_LTPC:
+                for hook in hooks:
+                    hook(s, kind, body)
+            idx.append(s)
+            ltp.append(lt.ltp)
+            ltt.append(lt.ltt)
+            ltq.append(lt.ltq)
+            cp.append(lt.cp)
+            if vol:
+                v_idx.append(s)
+                vtt.append(vol)
+            if ohlc:
+                bar = ohlc[0]
+                o_idx.append(s)
+                o_open.append(bar.open)
+                o_high.append(bar.high)
+                o_low.append(bar.low)
+                o_close.append(bar.close)
+
+        if msg.currentTs > self.exchange_ts:
+            self.exchange_ts = msg.currentTs
+        if not idx:
+            return 0
+        self.ltp[idx] = ltp
+        self.ltt[idx] = ltt
+        self.ltq[idx] = ltq
+        self.cp[idx] = cp
+        self.overwrites += int(np.count_nonzero(self.dirty[idx]))
+        self.dirty[idx] = True
+        if o_idx:
+            self.open[o_idx] = o_open
+            self.high[o_idx] = o_high
+            self.low[o_idx] = o_low
+            self.close[o_idx] = o_close
+            self.has_ohlc[o_idx] = True
+        if v_idx:
+            self.vtt[v_idx] = vtt
+        if self.batch_hooks:
+            slots = np.array(idx, dtype=np.int64)
+            for hook in self.batch_hooks:
+                hook(slots)
+        return len(idx)
+
+    def apply_records(self, slots: np.ndarray, rec: np.ndarray, current_ts: int = 0, dedup: bool = False) -> int:
+        """
+        Vectorized ``apply()`` for one frame already decoded into
+        ``decode_pool.RECORD`` rows; ``slots`` is the slot of each row.
+        """
+        if current_ts > self.exchange_ts:
+            self.exchange_ts = current_ts
+        if dedup and len(slots):
+            ltt = rec["ltt"]
+            held = self.ltt[slots]
+            dup = (ltt > 0) & ((ltt < held) | (
+                (ltt == held) & (rec["ltp"] == self.ltp[slots]) & (rec["ltq"] == self.ltq[slots])))
+            if dup.any():
+                self.duplicates += int(np.count_nonzero(dup))
+                slots, rec = slots[~dup], rec[~dup]
+        if not len(slots):
+            return 0
+        self.ltp[slots] = rec["ltp"]
+        self.ltt[slots] = rec["ltt"]
+        self.ltq[slots] = rec["ltq"]
+        self.cp[slots] = rec["cp"]
+        self.overwrites += int(np.count_nonzero(self.dirty[slots]))
+        self.dirty[slots] = True
+        o = rec["has_ohlc"]
+        if o.any():
+            o_idx = slots[o]
+            self.open[o_idx] = rec["open"][o]
+            self.high[o_idx] = rec["high"][o]
+            self.low[o_idx] = rec["low"][o]
+            self.close[o_idx] = rec["close"][o]
+            self.has_ohlc[o_idx] = True
+        v = rec["has_vtt"]
+        if v.any():
+            self.vtt[slots[v]] = rec["vtt"][v]
+        if self.batch_hooks:
+            slots = np.asarray(slots, dtype=np.int64)
+            for hook in self.batch_hooks:
+                hook(slots)
+        return len(slots)
+
+    def run_hooks(self, msg, dedup: bool = False):
+        """Run only the per-feed hooks for a frame whose columns arrive via ``apply_records()``."""
+        if not self.hooks:
+            return
+        for key, feed in msg.feeds.items():
+            kind, body = feed_kind(feed)
+            if kind is None or kind == FEED_LTPC:
+                continue
+            lt = body.ltpc
+            if not lt.ltp:
+                continue
+            s = self.slot(key)
+            if dedup and lt.ltt and self._seen(s, lt):
+                continue
+            for hook in self.hooks:
+                hook(s, kind, body)
+
+    def _seen(self, s: int, lt) -> bool:
+        """Tick older than, or identical to, what the slot already holds (overlap duplicate)."""
+        held = self.ltt[s]
+        return lt.ltt < held or (lt.ltt == held and lt.ltp == self.ltp[s] and lt.ltq == self.ltq[s])
+
+    # 📦 Payloads
+    def dirty_slots(self) -> np.ndarray:
+        """Slots written since they were last emitted."""
+        return np.flatnonzero(self.dirty[: len(self.keys)])
+
+    def payload(self, slots=None) -> dict:
+        """
+        Build the ``tick_update`` dict for the given slots (default: every
+        dirty slot) and clear their dirty flags.
+        """
+        if slots is None:
+            slots = self.dirty_slots()
+        if len(slots) == 0:
+            return {}
+        self.dirty[slots] = False
+        return self._rows(slots)
+
+    def snapshot(self, keys=None) -> dict:
+        """
+        Last value per instrument key (default: all known keys), in the
+        ``tick_update`` shape. Unknown or never-ticked keys are skipped and
+        dirty flags are left alone. Call under ``self.lock``.
+        """
+        if keys is None:
+            slots = np.arange(len(self.keys))
+        else:
+            slots = np.array([self.slots[k] for k in keys if k in self.slots], dtype=np.int64)
+        if len(slots) == 0:
+            return {}
+        return self._rows(slots[self.ltp[slots] != 0])
+
+    def _rows(self, slots) -> dict:
+        if len(slots) == 0:
+            return {}
+        keys = self.keys
+        ltp = np.round(self.ltp[slots], 2).tolist()
+        ltt = self.ltt[slots].tolist()
+        ltq = self.ltq[slots].tolist()
+        cp = np.round(self.cp[slots], 2).tolist()
+        vtt = self.vtt[slots].tolist()
+        out = {}
+        for i, s in enumerate(slots.tolist()):
+            out[keys[s]] = {"ltp": ltp[i], "ltt": ltt[i], "ltq": ltq[i], "cp": cp[i], "vtt": vtt[i]}
+
+        with_ohlc = slots[self.has_ohlc[slots]]
+        if len(with_ohlc):
+            o = self.open[with_ohlc].tolist()
+            h = self.high[with_ohlc].tolist()
+            lo = self.low[with_ohlc].tolist()
+            c = self.close[with_ohlc].tolist()
+            for i, s in enumerate(with_ohlc.tolist()):
+                out[keys[s]].update({"open": o[i], "high": h[i], "low": lo[i], "close": c[i]})
+        return out
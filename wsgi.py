@@ -0,0 +1,6 @@
+"""
+WSGI entry point for production servers (see docs/production.md).
+
+    UPSTOX_ASYNC_MODE=eventlet gunicorn -c gunicorn.conf.py wsgi:app
+"""
+from app import app, socketio  # noqa: F401